@@ -8,7 +8,11 @@ using System.IO;
 using System.Diagnostics;
 using System.Text.RegularExpressions;
 using System.Linq;
+using System.Net.WebSockets;
+using System.Text;
+using System.Collections.Concurrent;
 using Newtonsoft.Json;
+using Newtonsoft.Json.Linq;
 
 namespace Agent;
 
@@ -33,6 +37,14 @@ class Program
     private static string agentVersion = "1.0.0";
     private static string agentId = "";
     private static bool running = true;
+    private static readonly CancellationTokenSource shutdown = new CancellationTokenSource();
+    private const int HeartbeatIntervalMs = 10000;
+    private const int LongPollWaitSeconds = 30;
+    private const int ChannelReconnectDelayMs = 5000;
+    // Push channel state: heartbeat interval sent by Master, resume cursor and cancelled deployments
+    private static int channelHeartbeatIntervalMs = HeartbeatIntervalMs;
+    private static string? lastEventId = null;
+    private static readonly ConcurrentDictionary<string, bool> cancelledDeployments = new ConcurrentDictionary<string, bool>();
 
     static void LogDebug(string message)
     {
@@ -83,35 +95,274 @@ class Program
         {
             e.Cancel = true;
             running = false;
+            shutdown.Cancel();
             Console.WriteLine("\n⏹️  Shutting down...");
         };
 
         // Register with Master
         await RegisterToMaster();
 
-        // Send heartbeat and check for deployments periodically (every 10 seconds)
+        Console.WriteLine("✓ Connected to Master. Sending heartbeat...");
+        Console.WriteLine("  (Press Ctrl+C to exit)");
+
+        // Prefer the push channel: one connection for heartbeats, deployments and cancel signals
+        var channelConnected = false;
+        while (running)
+        {
+            if (await RunPushChannel())
+            {
+                channelConnected = true;
+            }
+            else if (!channelConnected)
+            {
+                // Master without push channel support
+                break;
+            }
+
+            if (running)
+            {
+                try
+                {
+                    await Task.Delay(ChannelReconnectDelayMs, shutdown.Token);
+                }
+                catch (OperationCanceledException) { }
+            }
+        }
+
+        if (running)
+        {
+            await RunPollingLoops();
+        }
+        
+        // Unregister on exit
+        await UnregisterFromMaster();
+        Console.WriteLine("✅ Agent stopped");
+    }
+
+    /// <summary>
+    /// Heartbeat every 10 seconds and long-poll for deployments (fallback when the push channel is unavailable)
+    /// </summary>
+    static async Task RunPollingLoops()
+    {
+        Console.WriteLine("ℹ️  Push channel unavailable, falling back to polling");
+
+        // Send heartbeat periodically (every 10 seconds)
         var heartbeatTask = Task.Run(async () =>
         {
             while (running)
             {
-                await Task.Delay(10000);
+                await Task.Delay(HeartbeatIntervalMs);
                 if (running)
                 {
                     await SendHeartbeat();
-                    await CheckForDeployment();
                 }
             }
         });
 
-        // Main loop
-        Console.WriteLine("✓ Connected to Master. Sending heartbeat...");
-        Console.WriteLine("  (Press Ctrl+C to exit)");
+        // Wait for deployments with long-polling (Master answers as soon as one is queued)
+        var deploymentTask = Task.Run(async () =>
+        {
+            while (running)
+            {
+                var startedAt = DateTime.UtcNow;
+                var receivedDeployment = await CheckForDeployment(LongPollWaitSeconds);
+                var elapsed = DateTime.UtcNow - startedAt;
 
-        await heartbeatTask;
-        
-        // Unregister on exit
-        await UnregisterFromMaster();
-        Console.WriteLine("✅ Agent stopped");
+                // Back off when the request failed or the Master does not support long-polling
+                if (running && !receivedDeployment && elapsed.TotalSeconds < LongPollWaitSeconds / 2.0)
+                {
+                    await Task.Delay(HeartbeatIntervalMs);
+                }
+            }
+        });
+
+        await Task.WhenAll(heartbeatTask, deploymentTask);
+    }
+
+    /// <summary>
+    /// Connect the push channel and process events until it closes.
+    /// Returns false if the connection could not be established.
+    /// </summary>
+    static async Task<bool> RunPushChannel()
+    {
+        if (string.IsNullOrEmpty(agentId))
+        {
+            return false;
+        }
+
+        var channelUrl = masterUrl.Replace("https://", "wss://").Replace("http://", "ws://")
+            + $"/api/agents/{agentId}/channel";
+        if (!string.IsNullOrEmpty(lastEventId))
+        {
+            // Resume after the last event received on the previous connection
+            channelUrl += $"?last_event_id={Uri.EscapeDataString(lastEventId)}";
+        }
+
+        using var socket = new ClientWebSocket();
+        try
+        {
+            await socket.ConnectAsync(new Uri(channelUrl), shutdown.Token);
+        }
+        catch (Exception ex)
+        {
+            LogDebug($"Push channel connection failed: {ex.Message}");
+            return false;
+        }
+        Console.WriteLine("✓ Push channel connected");
+
+        using var stopChannel = CancellationTokenSource.CreateLinkedTokenSource(shutdown.Token);
+        var sendLock = new SemaphoreSlim(1, 1);
+
+        // Heartbeats flow over the same connection
+        var heartbeatTask = Task.Run(async () =>
+        {
+            try
+            {
+                while (!stopChannel.IsCancellationRequested)
+                {
+                    await Task.Delay(channelHeartbeatIntervalMs, stopChannel.Token);
+                    var heartbeat = new
+                    {
+                        type = "heartbeat",
+                        name = agentName,
+                        platform = agentPlatform,
+                        version = agentVersion,
+                        ip_address = GetLocalIPAddress()
+                    };
+                    await SendChannelMessage(socket, sendLock, heartbeat, stopChannel.Token);
+                }
+            }
+            catch (OperationCanceledException) { }
+            catch (WebSocketException ex)
+            {
+                LogDebug($"Push channel heartbeat failed: {ex.Message}");
+            }
+        });
+
+        // Deployments run one at a time so the receive loop stays responsive to cancel events
+        var deployments = System.Threading.Channels.Channel.CreateUnbounded<DeploymentResponse>();
+        var deploymentTask = Task.Run(async () =>
+        {
+            await foreach (var deployment in deployments.Reader.ReadAllAsync())
+            {
+                await ExecuteDeployment(deployment);
+            }
+        });
+
+        try
+        {
+            while (running && socket.State == WebSocketState.Open)
+            {
+                var message = await ReceiveChannelMessage(socket, shutdown.Token);
+                if (message == null)
+                {
+                    break;
+                }
+                HandleChannelEvent(message, deployments.Writer);
+            }
+        }
+        catch (OperationCanceledException) { }
+        catch (Exception ex)
+        {
+            Console.WriteLine($"⚠️  Push channel error: {ex.Message}");
+        }
+        finally
+        {
+            stopChannel.Cancel();
+            deployments.Writer.TryComplete();
+            await heartbeatTask;
+            // Let a running deployment finish and report before reconnecting
+            await deploymentTask;
+            if (socket.State == WebSocketState.Open || socket.State == WebSocketState.CloseReceived)
+            {
+                try
+                {
+                    await socket.CloseAsync(WebSocketCloseStatus.NormalClosure, "Agent stopping", CancellationToken.None);
+                }
+                catch (Exception) { }
+            }
+        }
+
+        Console.WriteLine("⚠️  Push channel disconnected");
+        return true;
+    }
+
+    static void HandleChannelEvent(JObject message, System.Threading.Channels.ChannelWriter<DeploymentResponse> deployments)
+    {
+        var eventName = message.Value<string>("event");
+        var data = message["data"] as JObject;
+        switch (eventName)
+        {
+            case "config":
+                var intervalSeconds = data?.Value<int?>("heartbeat_interval_seconds");
+                if (intervalSeconds.HasValue && intervalSeconds.Value > 0)
+                {
+                    channelHeartbeatIntervalMs = intervalSeconds.Value * 1000;
+                }
+                LogDebug($"Push channel config: heartbeat every {channelHeartbeatIntervalMs} ms");
+                break;
+
+            case "deployment":
+                var deployment = data?.ToObject<DeploymentResponse>();
+                if (deployment != null && !string.IsNullOrEmpty(deployment.id))
+                {
+                    Console.WriteLine($"📦 Received deployment: {deployment.id}");
+                    Console.WriteLine($"   Releases: {string.Join(", ", deployment.release_tags ?? new List<string>())}");
+                    deployments.TryWrite(deployment);
+                }
+                lastEventId = message.Value<string>("id") ?? lastEventId;
+                break;
+
+            case "cancel":
+                var deploymentId = data?.Value<string>("deployment_id");
+                if (!string.IsNullOrEmpty(deploymentId))
+                {
+                    cancelledDeployments[deploymentId] = true;
+                    Console.WriteLine($"⏹️  Deployment cancelled by Master: {deploymentId}");
+                }
+                break;
+
+            default:
+                LogDebug($"Ignoring unknown push channel event: {eventName}");
+                break;
+        }
+    }
+
+    static async Task SendChannelMessage(ClientWebSocket socket, SemaphoreSlim sendLock, object message, CancellationToken cancellationToken)
+    {
+        var payload = Encoding.UTF8.GetBytes(JsonConvert.SerializeObject(message));
+        await sendLock.WaitAsync(cancellationToken);
+        try
+        {
+            await socket.SendAsync(new ArraySegment<byte>(payload), WebSocketMessageType.Text, true, cancellationToken);
+        }
+        finally
+        {
+            sendLock.Release();
+        }
+    }
+
+    /// <summary>
+    /// Read one complete text message. Returns null when the Master closes the connection.
+    /// </summary>
+    static async Task<JObject?> ReceiveChannelMessage(ClientWebSocket socket, CancellationToken cancellationToken)
+    {
+        var buffer = new byte[8192];
+        using var stream = new MemoryStream();
+        while (true)
+        {
+            var result = await socket.ReceiveAsync(new ArraySegment<byte>(buffer), cancellationToken);
+            if (result.MessageType == WebSocketMessageType.Close)
+            {
+                return null;
+            }
+            stream.Write(buffer, 0, result.Count);
+            if (result.EndOfMessage)
+            {
+                break;
+            }
+        }
+        return JObject.Parse(Encoding.UTF8.GetString(stream.ToArray()));
     }
 
     static async Task RegisterToMaster()
@@ -188,16 +439,25 @@ class Program
         }
     }
 
-    static async Task CheckForDeployment()
+    /// <summary>
+    /// Ask Master for a pending deployment and execute it.
+    /// Returns true if a deployment was received.
+    /// </summary>
+    static async Task<bool> CheckForDeployment(int waitSeconds = 0)
     {
         if (string.IsNullOrEmpty(agentId))
         {
-            return;
+            return false;
         }
 
         try
         {
-            var response = await httpClient.GetAsync($"{masterUrl}/api/deployments/pending/{agentId}");
+            var url = $"{masterUrl}/api/deployments/pending/{agentId}";
+            if (waitSeconds > 0)
+            {
+                url += $"?wait={waitSeconds}";
+            }
+            var response = await httpClient.GetAsync(url);
             
             if (response.IsSuccessStatusCode)
             {
@@ -206,7 +466,7 @@ class Program
                 // Check if response is null or empty (no pending deployment)
                 if (string.IsNullOrWhiteSpace(content) || content == "null")
                 {
-                    return;
+                    return false;
                 }
 
                 var deployment = JsonConvert.DeserializeObject<DeploymentResponse>(content);
@@ -216,6 +476,7 @@ class Program
                     Console.WriteLine($"📦 Received deployment: {deployment.id}");
                     Console.WriteLine($"   Releases: {string.Join(", ", deployment.release_tags ?? new List<string>())}");
                     await ExecuteDeployment(deployment);
+                    return true;
                 }
             }
         }
@@ -223,6 +484,7 @@ class Program
         {
             Console.WriteLine($"⚠️  Failed to check for deployment: {ex.Message}");
         }
+        return false;
     }
 
     static async Task ExecuteDeployment(DeploymentResponse deployment)
@@ -240,6 +502,10 @@ class Program
             for (int i = 0; i < deployment.release_ids.Count; i++)
             {
                 var releaseId = deployment.release_ids[i];
+                if (cancelledDeployments.ContainsKey(deployment.id))
+                {
+                    throw new OperationCanceledException($"Deployment {deployment.id} was cancelled");
+                }
                 // Get the corresponding tag from release_tags (deployment creation time selected tag)
                 var selectedTag = deployment.release_tags != null && i < deployment.release_tags.Count 
                     ? deployment.release_tags[i] 
@@ -326,6 +592,11 @@ class Program
             Console.WriteLine($"✅ Deployment {deployment.id} completed successfully");
             await ReportDeploymentComplete(deployment.id, "success", string.Empty);
         }
+        catch (OperationCanceledException) when (cancelledDeployments.ContainsKey(deployment.id))
+        {
+            // Master already marked the deployment as failed
+            Console.WriteLine($"⏹️  Deployment {deployment.id} stopped");
+        }
         catch (Exception ex)
         {
             LogError($"Deployment execution failed: {ex.Message}", ex);
@@ -382,6 +653,51 @@ class Program
         }
     }
     
+    static async Task<GitHubReleaseResponse?> FetchReleaseVersion(ReleaseResponse release, string owner, string repo, string tag)
+    {
+        // Master keeps a catalog of release versions, so deployments normally do not call GitHub
+        var catalogUrl = $"{masterUrl}/api/releases/{Uri.EscapeDataString(release.id)}/versions/{Uri.EscapeDataString(tag)}";
+        try
+        {
+            if (IsDebugMode)
+            {
+                LogDebug($"Release catalog URL: {catalogUrl}");
+            }
+            var catalogResponse = await httpClient.GetAsync(catalogUrl);
+            if (catalogResponse.IsSuccessStatusCode)
+            {
+                var catalogContent = await catalogResponse.Content.ReadAsStringAsync();
+                return JsonConvert.DeserializeObject<GitHubReleaseResponse>(catalogContent);
+            }
+            LogInfo($"⚠️  Release catalog lookup failed ({catalogResponse.StatusCode}), asking GitHub directly");
+        }
+        catch (Exception ex)
+        {
+            LogInfo($"⚠️  Release catalog lookup failed ({ex.Message}), asking GitHub directly");
+        }
+        
+        var githubApiUrl = $"https://api.github.com/repos/{owner}/{repo}/releases/tags/{tag}";
+        if (IsDebugMode)
+        {
+            LogDebug($"GitHub API URL: {githubApiUrl}");
+        }
+        
+        // GitHub API requires User-Agent header (already set on httpClient)
+        var githubResponse = await httpClient.GetAsync(githubApiUrl);
+        if (!githubResponse.IsSuccessStatusCode)
+        {
+            var errorContent = await githubResponse.Content.ReadAsStringAsync();
+            if (IsDebugMode)
+            {
+                LogDebug($"GitHub API error response: {errorContent}");
+            }
+            throw new Exception($"Failed to fetch release from GitHub API: {githubResponse.StatusCode}");
+        }
+        
+        var githubContent = await githubResponse.Content.ReadAsStringAsync();
+        return JsonConvert.DeserializeObject<GitHubReleaseResponse>(githubContent);
+    }
+    
     static async Task<string?> DownloadReleaseArtifacts(ReleaseResponse release, string tag)
     {
         try
@@ -425,27 +741,8 @@ class Program
                 LogDebug($"Downloads directory: {downloadsDir}");
             }
             
-            // Fetch release details from GitHub API to get assets using the selected tag
-            var githubApiUrl = $"https://api.github.com/repos/{owner}/{repo}/releases/tags/{tag}";
-            if (IsDebugMode)
-            {
-                LogDebug($"GitHub API URL: {githubApiUrl}");
-            }
-            
-            // GitHub API requires User-Agent header (already set on httpClient)
-            var githubResponse = await httpClient.GetAsync(githubApiUrl);
-            if (!githubResponse.IsSuccessStatusCode)
-            {
-                var errorContent = await githubResponse.Content.ReadAsStringAsync();
-                if (IsDebugMode)
-                {
-                    LogDebug($"GitHub API error response: {errorContent}");
-                }
-                throw new Exception($"Failed to fetch release from GitHub API: {githubResponse.StatusCode}");
-            }
-            
-            var githubContent = await githubResponse.Content.ReadAsStringAsync();
-            var githubRelease = JsonConvert.DeserializeObject<GitHubReleaseResponse>(githubContent);
+            // Asset list of the selected tag: Master release catalog first, GitHub API as fallback
+            var githubRelease = await FetchReleaseVersion(release, owner, repo, tag);
             
             if (githubRelease == null || githubRelease.assets == null || githubRelease.assets.Count == 0)
             {
@@ -516,13 +813,6 @@ class Program
             
             LogInfo($"📦 Downloading asset: {selectedAsset.name}");
             
-            // Download the asset
-            var downloadResponse = await httpClient.GetAsync(selectedAsset.browser_download_url);
-            if (!downloadResponse.IsSuccessStatusCode)
-            {
-                throw new Exception($"Failed to download asset: {downloadResponse.StatusCode}");
-            }
-            
             // Determine file extension from content type or file name
             var fileExtension = Path.GetExtension(selectedAsset.name);
             if (string.IsNullOrEmpty(fileExtension))
@@ -539,10 +829,23 @@ class Program
             var fileName = $"{repo}-{tag}{fileExtension}";
             var downloadPath = Path.Combine(downloadsDir, fileName);
             
-            // Save the downloaded file
-            using (var fileStream = new FileStream(downloadPath, FileMode.Create, FileAccess.Write))
+            // Master artifact cache first (downloads GitHub assets once for all agents), GitHub as fallback
+            var artifactUrl = $"{masterUrl}/api/artifacts/{Uri.EscapeDataString(release.id)}/{Uri.EscapeDataString(tag)}/{Uri.EscapeDataString(selectedAsset.name)}";
+            var downloaded = await DownloadDelta(artifactUrl, downloadsDir, $"{repo}-", fileExtension, downloadPath)
+                || await DownloadFromArtifactCache(artifactUrl, downloadPath);
+            if (!downloaded)
             {
-                await downloadResponse.Content.CopyToAsync(fileStream);
+                var downloadResponse = await httpClient.GetAsync(selectedAsset.browser_download_url, HttpCompletionOption.ResponseHeadersRead);
+                if (!downloadResponse.IsSuccessStatusCode)
+                {
+                    throw new Exception($"Failed to download asset: {downloadResponse.StatusCode}");
+                }
+                
+                // Save the downloaded file
+                using (var fileStream = new FileStream(downloadPath, FileMode.Create, FileAccess.Write))
+                {
+                    await downloadResponse.Content.CopyToAsync(fileStream);
+                }
             }
             
             if (IsDebugMode)
@@ -569,6 +872,195 @@ class Program
         }
     }
     
+    static async Task<bool> DownloadDelta(string artifactUrl, string downloadsDir, string filePrefix, string fileExtension, string downloadPath)
+    {
+        // The previously downloaded version of the same asset is the delta base
+        var basePath = Directory.GetFiles(downloadsDir, $"{filePrefix}*{fileExtension}")
+            .Where(path => path != downloadPath && path.EndsWith(fileExtension))
+            .Where(path => !path.EndsWith(".part") && !path.EndsWith(".delta") && !path.EndsWith(".rebuilt"))
+            .OrderByDescending(path => File.GetLastWriteTimeUtc(path))
+            .FirstOrDefault();
+        if (basePath == null)
+        {
+            return false;
+        }
+        
+        var deltaPath = downloadPath + ".delta";
+        var outputPath = downloadPath + ".rebuilt";
+        try
+        {
+            var baseSha256 = await ComputeSha256(basePath);
+            var deltaUrl = $"{artifactUrl}/delta?base_sha256={baseSha256}";
+            if (IsDebugMode)
+            {
+                LogDebug($"Delta base: {basePath} ({baseSha256})");
+                LogDebug($"Delta URL: {deltaUrl}");
+            }
+            
+            using var response = await httpClient.GetAsync(deltaUrl, HttpCompletionOption.ResponseHeadersRead);
+            if (!response.IsSuccessStatusCode
+                || !response.Headers.TryGetValues("X-Delta-Target-Sha256", out var targetValues))
+            {
+                // No delta for this base (or an older master); download the full file
+                return false;
+            }
+            using (var fileStream = new FileStream(deltaPath, FileMode.Create, FileAccess.Write))
+            {
+                await response.Content.CopyToAsync(fileStream);
+            }
+            
+            ApplyDelta(basePath, deltaPath, outputPath);
+            if (await ComputeSha256(outputPath) != targetValues.First())
+            {
+                LogInfo("⚠️  Delta result checksum mismatch, downloading the full file");
+                return false;
+            }
+            
+            File.Move(outputPath, downloadPath, true);
+            LogInfo($"✓ Applied delta ({new FileInfo(deltaPath).Length} bytes) to {Path.GetFileName(basePath)}");
+            return true;
+        }
+        catch (Exception ex)
+        {
+            LogInfo($"⚠️  Delta download failed ({ex.Message}), downloading the full file");
+            return false;
+        }
+        finally
+        {
+            File.Delete(deltaPath);
+            File.Delete(outputPath);
+        }
+    }
+    
+    static void ApplyDelta(string basePath, string deltaPath, string outputPath)
+    {
+        // Format written by master/backend/artifact_delta.py: zlib stream of
+        // "ADELTA01", target size (u64), then C offset(u64) length(u32) | A length(u32) data | E
+        using var deltaFile = File.OpenRead(deltaPath);
+        using var delta = new System.IO.Compression.ZLibStream(deltaFile, System.IO.Compression.CompressionMode.Decompress);
+        using var baseFile = File.OpenRead(basePath);
+        using var output = new FileStream(outputPath, FileMode.Create, FileAccess.Write);
+        
+        if (Encoding.ASCII.GetString(ReadExactly(delta, 8)) != "ADELTA01")
+        {
+            throw new Exception("Not an artifact delta");
+        }
+        var targetSize = System.Buffers.Binary.BinaryPrimitives.ReadUInt64BigEndian(ReadExactly(delta, 8));
+        var buffer = new byte[81920];
+        while (true)
+        {
+            var op = (char)ReadExactly(delta, 1)[0];
+            if (op == 'E')
+            {
+                break;
+            }
+            Stream source;
+            long length;
+            if (op == 'C')
+            {
+                var offset = System.Buffers.Binary.BinaryPrimitives.ReadUInt64BigEndian(ReadExactly(delta, 8));
+                length = System.Buffers.Binary.BinaryPrimitives.ReadUInt32BigEndian(ReadExactly(delta, 4));
+                baseFile.Seek((long)offset, SeekOrigin.Begin);
+                source = baseFile;
+            }
+            else if (op == 'A')
+            {
+                length = System.Buffers.Binary.BinaryPrimitives.ReadUInt32BigEndian(ReadExactly(delta, 4));
+                source = delta;
+            }
+            else
+            {
+                throw new Exception($"Unknown delta operation '{op}'");
+            }
+            while (length > 0)
+            {
+                var read = source.Read(buffer, 0, (int)Math.Min(buffer.Length, length));
+                if (read == 0)
+                {
+                    throw new Exception("Delta does not match the base file");
+                }
+                output.Write(buffer, 0, read);
+                length -= read;
+            }
+        }
+        if ((ulong)output.Length != targetSize)
+        {
+            throw new Exception("Delta output has the wrong size");
+        }
+    }
+    
+    static byte[] ReadExactly(Stream stream, int count)
+    {
+        var data = new byte[count];
+        stream.ReadExactly(data, 0, count);
+        return data;
+    }
+    
+    static async Task<string> ComputeSha256(string path)
+    {
+        using var stream = File.OpenRead(path);
+        using var sha256 = System.Security.Cryptography.SHA256.Create();
+        return Convert.ToHexString(await sha256.ComputeHashAsync(stream)).ToLowerInvariant();
+    }
+    
+    static async Task<bool> DownloadFromArtifactCache(string artifactUrl, string downloadPath)
+    {
+        // Interrupted downloads are kept as .part and resumed with a Range request
+        var partPath = downloadPath + ".part";
+        try
+        {
+            if (IsDebugMode)
+            {
+                LogDebug($"Artifact cache URL: {artifactUrl}");
+            }
+            
+            var request = new HttpRequestMessage(HttpMethod.Get, artifactUrl);
+            long offset = File.Exists(partPath) ? new FileInfo(partPath).Length : 0;
+            if (offset > 0)
+            {
+                request.Headers.Range = new System.Net.Http.Headers.RangeHeaderValue(offset, null);
+                LogInfo($"↻ Resuming download at byte {offset}");
+            }
+            
+            using var response = await httpClient.SendAsync(request, HttpCompletionOption.ResponseHeadersRead);
+            if (response.StatusCode == System.Net.HttpStatusCode.RequestedRangeNotSatisfiable)
+            {
+                // The partial file does not belong to the cached artifact; start over next time
+                File.Delete(partPath);
+                return false;
+            }
+            if (!response.IsSuccessStatusCode)
+            {
+                LogInfo($"⚠️  Master artifact cache unavailable ({response.StatusCode}), downloading from GitHub");
+                return false;
+            }
+            
+            var resumed = response.StatusCode == System.Net.HttpStatusCode.PartialContent;
+            using (var fileStream = new FileStream(partPath, resumed ? FileMode.Append : FileMode.Create, FileAccess.Write))
+            {
+                await response.Content.CopyToAsync(fileStream);
+            }
+            
+            if (response.Headers.TryGetValues("X-Artifact-Sha256", out var values))
+            {
+                if (await ComputeSha256(partPath) != values.First())
+                {
+                    File.Delete(partPath);
+                    LogInfo("⚠️  Artifact checksum mismatch, downloading from GitHub");
+                    return false;
+                }
+            }
+            
+            File.Move(partPath, downloadPath, true);
+            return true;
+        }
+        catch (Exception ex)
+        {
+            LogInfo($"⚠️  Master artifact cache download failed ({ex.Message}), downloading from GitHub");
+            return false;
+        }
+    }
+    
     static async Task<bool> InstallSoftware(string filePath, ReleaseResponse release)
     {
         try
@@ -0,0 +1,112 @@
+"""
+Agent push channel registry
+Keeps one WebSocket connection per agent and sends events to it
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import WebSocket
+
+from logging_config import app_logger
+from config import AGENT_CHANNEL_MAX_CONNECTIONS
+
+
+class ChannelCapacityError(Exception):
+    """Raised when the maximum number of push channel connections is reached"""
+    pass
+
+
+class AgentConnection:
+    """A connected agent; sends are serialized so events are never interleaved"""
+
+    def __init__(self, agent_id: str, websocket: WebSocket):
+        self.agent_id = agent_id
+        self.websocket = websocket
+        self.connected_at = datetime.now()
+        self._send_lock = asyncio.Lock()
+
+    async def send_event(self, event: str, data: Any, event_id: Optional[str] = None):
+        """Send one event: {"event": ..., "id": ..., "data": ...}"""
+        message = {"event": event, "data": data}
+        if event_id is not None:
+            message["id"] = event_id
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(message, default=str))
+
+
+class AgentConnectionRegistry:
+    """Connection registry keyed by agent_id"""
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._connections: Dict[str, AgentConnection] = {}
+        self._stats = {
+            "connects": 0,
+            "replaced": 0,
+            "rejected": 0,
+            "events_sent": 0,
+            "send_errors": 0,
+        }
+
+    def get(self, agent_id: str) -> Optional[AgentConnection]:
+        return self._connections.get(agent_id)
+
+    async def register(self, agent_id: str, websocket: WebSocket) -> AgentConnection:
+        """Register a new connection, closing any previous one of the same agent"""
+        previous = self._connections.get(agent_id)
+        if previous is None and len(self._connections) >= self.max_connections:
+            self._stats["rejected"] += 1
+            raise ChannelCapacityError(f"Too many push channel connections ({len(self._connections)})")
+
+        connection = AgentConnection(agent_id, websocket)
+        self._connections[agent_id] = connection
+        self._stats["connects"] += 1
+        if previous is not None:
+            self._stats["replaced"] += 1
+            try:
+                await previous.websocket.close(code=4000, reason="Replaced by a newer connection")
+            except Exception:
+                pass
+        return connection
+
+    def unregister(self, connection: AgentConnection):
+        """Remove a connection (only if it is still the current one for its agent)"""
+        if self._connections.get(connection.agent_id) is connection:
+            del self._connections[connection.agent_id]
+
+    async def send(self, agent_id: str, event: str, data: Any, event_id: Optional[str] = None) -> bool:
+        """Send an event to an agent if it is connected; returns True if sent"""
+        connection = self._connections.get(agent_id)
+        if connection is None:
+            return False
+        try:
+            await connection.send_event(event, data, event_id)
+        except Exception as e:
+            self._stats["send_errors"] += 1
+            app_logger.warning(f"Failed to push '{event}' to agent {agent_id}: {e}")
+            return False
+        self._stats["events_sent"] += 1
+        return True
+
+    async def close_all(self):
+        """Close every connection (application shutdown)"""
+        for connection in list(self._connections.values()):
+            try:
+                await connection.websocket.close(code=1001, reason="Server shutting down")
+            except Exception:
+                pass
+        self._connections.clear()
+
+    def get_stats(self) -> Dict:
+        """Get push channel metrics"""
+        return {
+            "connected": len(self._connections),
+            "max_connections": self.max_connections,
+            **self._stats,
+        }
+
+
+agent_channels = AgentConnectionRegistry(max_connections=AGENT_CHANNEL_MAX_CONNECTIONS)
@@ -0,0 +1,82 @@
+"""
+Agent status sweeper
+Periodically marks agents OFFLINE when their heartbeat timed out
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from background import PeriodicTask
+from database import AsyncSessionLocal
+from db_models import AgentDB, AgentStatusEnum
+from logging_config import app_logger
+from resource_versions import resource_versions, AGENTS
+from config import HEARTBEAT_TIMEOUT_SECONDS, AGENT_SWEEP_INTERVAL_SECONDS
+
+
+class AgentStatusSweeper:
+    """Marks stale ONLINE agents OFFLINE with one set-based UPDATE per sweep"""
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        timeout_seconds: float,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.session_factory = session_factory
+        self._task = PeriodicTask("agent-status-sweeper", interval_seconds, self.sweep)
+        self._stats = {
+            "sweeps": 0,
+            "agents_marked_offline": 0,
+            "last_sweep_at": None,
+            "last_sweep_marked_offline": 0,
+        }
+
+    async def sweep(self) -> int:
+        """Mark agents OFFLINE whose last_seen is older than the heartbeat timeout"""
+        cutoff = datetime.now() - timedelta(seconds=self.timeout_seconds)
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(AgentDB)
+                .where(AgentDB.status == AgentStatusEnum.ONLINE)
+                .where(AgentDB.last_seen < cutoff)
+                .values(status=AgentStatusEnum.OFFLINE)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+        marked = result.rowcount or 0
+        self._stats["sweeps"] += 1
+        self._stats["agents_marked_offline"] += marked
+        self._stats["last_sweep_at"] = datetime.now().isoformat()
+        self._stats["last_sweep_marked_offline"] = marked
+        if marked:
+            resource_versions.bump(AGENTS)
+            app_logger.info(f"Marked {marked} agent(s) OFFLINE after {self.timeout_seconds}s without heartbeat")
+        return marked
+
+    def start(self):
+        """Start the periodic sweep loop"""
+        self._task.start()
+
+    async def stop(self):
+        """Stop the sweep loop"""
+        await self._task.stop()
+
+    def get_stats(self) -> Dict:
+        """Get sweeper metrics"""
+        return {
+            "interval_seconds": self._task.interval_seconds,
+            "timeout_seconds": self.timeout_seconds,
+            **self._stats,
+        }
+
+
+agent_sweeper = AgentStatusSweeper(
+    interval_seconds=AGENT_SWEEP_INTERVAL_SECONDS,
+    timeout_seconds=HEARTBEAT_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,356 @@
+"""
+Artifact deltas
+Binary deltas between two cached artifacts, so agents that have the previous version of an
+asset download only what changed
+"""
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from artifact_store import ArtifactStore, StoredArtifact, artifact_store
+from database import AsyncSessionLocal, dialect_insert
+from db_models import ArtifactDeltaDB
+from logging_config import app_logger
+from config import (
+    ARTIFACT_DELTA_WORKERS, ARTIFACT_DELTA_BLOCK_SIZE, ARTIFACT_DELTA_MAX_RATIO, ARTIFACT_DELTA_MAX_INPUT_BYTES
+)
+
+# Delta format (the whole file is one zlib stream):
+#   MAGIC, target size (u64)
+#   then operations until END:
+#     COPY  b"C" base offset (u64) length (u32)  - bytes from the base file
+#     ADD   b"A" length (u32) data              - literal bytes
+#     END   b"E"
+# All integers are big-endian. The agent applies it in ApplyDelta (agent/Program/Program.cs).
+MAGIC = b"ADELTA01"
+DELTA_CONTENT_TYPE = "application/x-artifact-delta"
+MAX_OP_LENGTH = 0xFFFFFFFF
+
+
+class DeltaFormatError(Exception):
+    """The delta is malformed or does not fit the base"""
+
+
+def _weak_checksum(window: bytes) -> Tuple[int, int]:
+    """rsync weak checksum (a, b) of a window"""
+    return sum(window) & 0xFFFF, sum(accumulate(window)) & 0xFFFF
+
+
+def encode_delta(base: bytes, target: bytes, block_size: int, max_literal_bytes: int) -> Optional[bytes]:
+    """
+    Delta that turns base into target, None if it would carry more than max_literal_bytes
+    of literal data (the delta would not be worth sending).
+    Base blocks are indexed by the rsync rolling checksum; the target is scanned byte by
+    byte only where it differs, matching runs are skipped a block at a time.
+    """
+    index: Dict[int, int] = {}
+    for offset in range(0, len(base) - block_size + 1, block_size):
+        a, b = _weak_checksum(base[offset:offset + block_size])
+        index.setdefault(a | (b << 16), offset)
+
+    ops: List[bytes] = [MAGIC, struct.pack(">Q", len(target))]
+    copy: Optional[List[int]] = None  # Pending [offset, length], merged while contiguous
+    literal_total = 0
+    literal_start = 0
+
+    def flush_copy():
+        nonlocal copy
+        if copy is not None:
+            offset, length = copy
+            while length:
+                chunk = min(length, MAX_OP_LENGTH)
+                ops.append(b"C" + struct.pack(">QI", offset, chunk))
+                offset += chunk
+                length -= chunk
+            copy = None
+
+    def add_literal(data: bytes):
+        flush_copy()
+        for start in range(0, len(data), MAX_OP_LENGTH):
+            chunk = data[start:start + MAX_OP_LENGTH]
+            ops.append(b"A" + struct.pack(">I", len(chunk)) + chunk)
+
+    size = len(target)
+    position = 0
+    a = b = None
+    while position + block_size <= size:
+        if a is None:
+            a, b = _weak_checksum(target[position:position + block_size])
+        offset = index.get(a | (b << 16))
+        if offset is not None and base[offset:offset + block_size] == target[position:position + block_size]:
+            length = block_size
+            while (
+                position + length + block_size <= size
+                and base[offset + length:offset + length + block_size]
+                == target[position + length:position + length + block_size]
+            ):
+                length += block_size
+            # Grow the match backwards into the literal run before it
+            back = 0
+            while back < position - literal_start and back < offset and base[offset - back - 1] == target[position - back - 1]:
+                back += 1
+            if position - back > literal_start:
+                literal_total += position - back - literal_start
+                add_literal(target[literal_start:position - back])
+            if copy is not None and copy[0] + copy[1] == offset - back:
+                copy[1] += length + back
+            else:
+                flush_copy()
+                copy = [offset - back, length + back]
+            position += length
+            literal_start = position
+            a = b = None
+            continue
+
+        if position + block_size >= size:
+            break
+        outgoing = target[position]
+        a = (a - outgoing + target[position + block_size]) & 0xFFFF
+        b = (b - block_size * outgoing + a) & 0xFFFF
+        position += 1
+        if literal_total + position - literal_start > max_literal_bytes:
+            return None
+
+    if literal_start < size:
+        literal_total += size - literal_start
+        if literal_total > max_literal_bytes:
+            return None
+        add_literal(target[literal_start:])
+    flush_copy()
+    ops.append(b"E")
+    return zlib.compress(b"".join(ops), 6)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuild the target from base and a delta produced by encode_delta"""
+    try:
+        data = zlib.decompress(delta)
+    except zlib.error as e:
+        raise DeltaFormatError(f"Delta is not a zlib stream: {e}")
+    if not data.startswith(MAGIC):
+        raise DeltaFormatError("Not an artifact delta")
+    parts = []
+    try:
+        (target_size,) = struct.unpack_from(">Q", data, len(MAGIC))
+        position = len(MAGIC) + 8
+        while True:
+            op = data[position:position + 1]
+            position += 1
+            if op == b"C":
+                offset, length = struct.unpack_from(">QI", data, position)
+                position += 12
+                if offset + length > len(base):
+                    raise DeltaFormatError("Copy outside of the base file")
+                parts.append(base[offset:offset + length])
+            elif op == b"A":
+                (length,) = struct.unpack_from(">I", data, position)
+                position += 4
+                parts.append(data[position:position + length])
+                position += length
+            elif op == b"E":
+                break
+            else:
+                raise DeltaFormatError(f"Unknown delta operation {op!r}")
+    except struct.error:
+        raise DeltaFormatError("Delta is truncated")
+    target = b"".join(parts)
+    if len(target) != target_size:
+        raise DeltaFormatError("Delta output has the wrong size")
+    return target
+
+
+def build_delta_file(
+    base_path: str,
+    target_path: str,
+    output_dir: str,
+    block_size: int,
+    max_ratio: float,
+) -> Optional[Tuple[str, str, int]]:
+    """
+    Write the delta between two stored files to a temporary file in output_dir
+    Returns (temp path, sha256, size), or None when the delta is not smaller than
+    max_ratio of the target. Runs in a worker process.
+    """
+    with open(base_path, "rb") as file:
+        base = file.read()
+    with open(target_path, "rb") as file:
+        target = file.read()
+    max_bytes = int(len(target) * max_ratio)
+    delta = encode_delta(base, target, block_size, max_literal_bytes=max_bytes)
+    if delta is None or len(delta) > max_bytes:
+        return None
+    fd, temp_name = tempfile.mkstemp(dir=output_dir)
+    with os.fdopen(fd, "wb") as file:
+        file.write(delta)
+    return temp_name, hashlib.sha256(delta).hexdigest(), len(delta)
+
+
+class ArtifactDeltaStore:
+    """
+    Deltas between stored artifacts, kept in the artifact store like any other file.
+    - Computed in the background in a process pool (CPU bound; does not block the event loop)
+      once a pair is first requested. That request and any made during the build get None
+      (the agent downloads the full file), later ones the stored delta; no request waits
+      for a build or holds a database connection meanwhile
+    - The artifact_deltas table remembers each pair, including pairs whose delta is not
+      smaller than max_ratio of the full file, so those are not computed again
+    """
+
+    def __init__(
+        self,
+        store: ArtifactStore,
+        workers: int,
+        block_size: int,
+        max_ratio: float,
+        max_input_bytes: int,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+    ):
+        self.store = store
+        self.workers = workers
+        self.block_size = block_size
+        self.max_ratio = max_ratio
+        self.max_input_bytes = max_input_bytes
+        self.session_factory = session_factory
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._builds: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._stats = {
+            "hits": 0,
+            "builds": 0,
+            "not_smaller": 0,
+            "skipped_too_large": 0,
+            "build_errors": 0,
+            "bytes_saved": 0,
+        }
+
+    async def get(self, session: AsyncSession, base_sha256: str, target: StoredArtifact) -> Optional[StoredArtifact]:
+        """
+        Stored delta from base_sha256 to target, None when the full file should be sent
+        A pair that has not been computed yet starts a background build and gets None.
+        The transaction of `session` is committed before returning.
+        """
+        if base_sha256 == target.sha256:
+            return None
+        delta_db = await session.get(ArtifactDeltaDB, (base_sha256, target.sha256))
+        await session.commit()
+        if delta_db is not None:
+            if delta_db.delta_sha256 is None:
+                return None
+            if self.store.path_for(delta_db.delta_sha256).exists():
+                self._stats["hits"] += 1
+                self._stats["bytes_saved"] += target.size - delta_db.delta_size
+                return StoredArtifact(delta_db.delta_sha256, delta_db.delta_size, DELTA_CONTENT_TYPE)
+
+        base_path = self.store.path_for(base_sha256)
+        if not base_path.exists():
+            return None
+        if max(base_path.stat().st_size, target.size) > self.max_input_bytes:
+            self._stats["skipped_too_large"] += 1
+            return None
+
+        key = (base_sha256, target.sha256)
+        if key not in self._builds:
+            task = asyncio.create_task(self._build_and_record(base_sha256, target.sha256))
+            self._builds[key] = task
+            task.add_done_callback(lambda _: self._builds.pop(key, None))
+        return None
+
+    async def close(self):
+        """Stop pending builds and the worker processes"""
+        for task in list(self._builds.values()):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict:
+        """Get delta metrics"""
+        return {
+            "building": len(self._builds),
+            **self._stats,
+        }
+
+    async def _build_and_record(self, base_sha256: str, target_sha256: str):
+        """Build the delta of a pair and remember the result for later requests"""
+        try:
+            built = await self._build(self.store.path_for(base_sha256), self.store.path_for(target_sha256))
+        except Exception as e:
+            app_logger.warning(f"Delta {base_sha256[:12]} -> {target_sha256[:12]} failed: {e}")
+            return
+
+        async with self.session_factory() as session:
+            await self._record(session, base_sha256, target_sha256, built)
+
+    @staticmethod
+    async def _record(
+        session: AsyncSession,
+        base_sha256: str,
+        target_sha256: str,
+        built: Optional[Tuple[str, int]],
+    ):
+        """Remember the delta of a pair, or that it is not worth sending"""
+        insert_stmt = dialect_insert(session, ArtifactDeltaDB).values(
+            base_sha256=base_sha256,
+            target_sha256=target_sha256,
+            delta_sha256=built[0] if built else None,
+            delta_size=built[1] if built else None,
+            created_at=datetime.now(),
+        )
+        await session.execute(insert_stmt.on_conflict_do_update(
+            index_elements=[ArtifactDeltaDB.base_sha256, ArtifactDeltaDB.target_sha256],
+            set_={
+                "delta_sha256": insert_stmt.excluded.delta_sha256,
+                "delta_size": insert_stmt.excluded.delta_size,
+                "created_at": insert_stmt.excluded.created_at,
+            },
+        ))
+        await session.commit()
+
+    async def _build(self, base_path: Path, target_path: Path) -> Optional[Tuple[str, int]]:
+        if self._executor is None:
+            # spawn: forking a process that runs threads (the event loop's thread pool) is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self._stats["builds"] += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                build_delta_file,
+                str(base_path),
+                str(target_path),
+                str(self.store.incoming_dir()),
+                self.block_size,
+                self.max_ratio,
+            )
+        except Exception:
+            self._stats["build_errors"] += 1
+            raise
+        if result is None:
+            self._stats["not_smaller"] += 1
+            return None
+        temp_name, sha256, size = result
+        await self.store.put_file(temp_name, sha256, size)
+        app_logger.info(f"Stored delta {base_path.name[:12]} -> {target_path.name[:12]} ({size} bytes)")
+        return sha256, size
+
+
+artifact_deltas = ArtifactDeltaStore(
+    store=artifact_store,
+    workers=ARTIFACT_DELTA_WORKERS,
+    block_size=ARTIFACT_DELTA_BLOCK_SIZE,
+    max_ratio=ARTIFACT_DELTA_MAX_RATIO,
+    max_input_bytes=ARTIFACT_DELTA_MAX_INPUT_BYTES,
+)
@@ -0,0 +1,315 @@
+"""
+Artifact prefetch
+Downloads the release assets of new deployments into the artifact cache before agents claim them
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from artifact_store import ArtifactStore, artifact_store
+from database import AsyncSessionLocal
+from db_models import AgentDB, DeploymentDB, DeploymentStatusEnum, ReleaseVersionDB
+from deployment_notifier import deployment_notifier
+from logging_config import app_logger
+from resource_versions import resource_versions, DEPLOYMENTS
+from config import ARTIFACT_PREFETCH_WORKERS, ARTIFACT_PREFETCH_RETENTION_SECONDS
+
+AssetKey = Tuple[str, str, str]  # (release_id, tag, asset_name)
+
+# Asset selection of the agent (DownloadReleaseArtifacts in agent/Program/Program.cs)
+SOURCE_CODE_KEYWORDS = ("source", "src", "sourcecode")
+PLATFORM_EXTENSIONS = {
+    "windows": (".exe", ".msi", ".zip"),
+    "macos": (".dmg", ".pkg", ".app.zip", ".zip"),
+}
+DEFAULT_EXTENSIONS = (".deb", ".rpm", ".tar.gz", ".zip")
+
+
+def select_agent_asset(assets: Optional[List[dict]], platform: str) -> Optional[dict]:
+    """The asset an agent of this platform downloads: first platform match, else the largest"""
+    candidates = [
+        asset for asset in assets or []
+        if asset.get("name") and not any(keyword in asset["name"].lower() for keyword in SOURCE_CODE_KEYWORDS)
+    ]
+    if not candidates:
+        return None
+    extensions = PLATFORM_EXTENSIONS.get(platform, DEFAULT_EXTENSIONS)
+    for asset in candidates:
+        if asset["name"].lower().endswith(extensions):
+            return asset
+    return max(candidates, key=lambda asset: asset.get("size") or 0)
+
+
+@dataclass
+class WarmupPlan:
+    """Assets a deployment waits for"""
+    deployment_id: str
+    agent_id: str
+    assets: Dict[AssetKey, dict]
+
+
+@dataclass
+class PrefetchJob:
+    """Download of one asset; shared by every deployment that needs it"""
+    key: AssetKey
+    size: Optional[int]
+    status: str = "queued"  # queued, downloading, ready, failed
+    sha256: Optional[str] = None
+    error: Optional[str] = None
+    deployment_ids: Set[str] = field(default_factory=set)
+    queued_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    finished_monotonic: Optional[float] = None
+
+
+class ArtifactPrefetcher:
+    """
+    Bounded pool of workers filling the artifact cache for new deployments.
+    - Deployments whose assets are not cached are created with artifacts_ready = False;
+      the claim query skips them, so agents are told to retry instead of waiting on GitHub
+    - Each asset is queued once however many deployments need it (a rollout queues one
+      job per asset, not per agent); downloads started by agents are shared by the store
+    - When the last asset of a deployment is done, the deployment is marked ready and its
+      agent is notified, which wakes long-polls and push channels
+    A failed download releases the deployment as well: the agent then falls back to GitHub.
+    Finished jobs are kept for retention_seconds for the progress endpoint.
+    """
+
+    def __init__(
+        self,
+        store: ArtifactStore,
+        workers: int,
+        retention_seconds: float,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+    ):
+        self.store = store
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.session_factory = session_factory
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._jobs: Dict[AssetKey, PrefetchJob] = {}
+        self._waiting: Dict[str, Tuple[str, Set[AssetKey]]] = {}  # deployment_id -> (agent_id, remaining)
+        self._tasks: List[asyncio.Task] = []
+        self._resume_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "jobs_queued": 0,
+            "jobs_deduplicated": 0,
+            "jobs_ready": 0,
+            "jobs_failed": 0,
+            "deployments_gated": 0,
+            "deployments_released": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self):
+        """Start the workers and pick up deployments left waiting by a previous run"""
+        if not self.running:
+            self._queue = asyncio.Queue()
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"artifact-prefetch-{index}")
+                for index in range(self.workers)
+            ]
+        if self._resume_task is None or self._resume_task.done():
+            self._resume_task = asyncio.create_task(self._resume(), name="artifact-prefetch-resume")
+        app_logger.info(f"Artifact prefetch started ({self.workers} workers)")
+
+    async def stop(self):
+        tasks = self._tasks + ([self._resume_task] if self._resume_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._resume_task = None
+
+    async def plan(
+        self,
+        db: AsyncSession,
+        targets: Iterable[Tuple[str, str, str]],
+        release_ids: List[str],
+        release_tags: List[str],
+    ) -> List[WarmupPlan]:
+        """
+        Uncached assets of new deployments; deployments not listed can be claimed right away
+        - targets: (deployment_id, agent_id, agent platform)
+        Empty when the prefetcher is not running.
+        """
+        if not self.running:
+            return []
+        pairs = [(release_id, tag) for release_id, tag in zip(release_ids, release_tags) if tag]
+        if not pairs:
+            return []
+        result = await db.execute(
+            select(ReleaseVersionDB.release_id, ReleaseVersionDB.tag, ReleaseVersionDB.assets)
+            .where(tuple_(ReleaseVersionDB.release_id, ReleaseVersionDB.tag).in_(pairs))
+        )
+        versions = result.all()
+
+        plans = []
+        for deployment_id, agent_id, platform in targets:
+            assets = {}
+            for release_id, tag, version_assets in versions:
+                asset = select_agent_asset(version_assets, platform)
+                if asset is not None and asset.get("browser_download_url"):
+                    assets[(release_id, tag, asset["name"])] = asset
+            if assets:
+                plans.append(WarmupPlan(deployment_id, agent_id, assets))
+
+        wanted = {key: asset for plan in plans for key, asset in plan.assets.items()}
+        cached = await self.store.cached_keys(db, wanted)
+        for plan in plans:
+            plan.assets = {key: asset for key, asset in plan.assets.items() if key not in cached}
+        return [plan for plan in plans if plan.assets]
+
+    def enqueue(self, plans: List[WarmupPlan]):
+        """Queue the assets of committed deployments, joining downloads already queued"""
+        self._prune()
+        for plan in plans:
+            self._waiting[plan.deployment_id] = (plan.agent_id, set(plan.assets))
+            self._stats["deployments_gated"] += 1
+            for key, asset in plan.assets.items():
+                job = self._jobs.get(key)
+                if job is not None and job.status in ("queued", "downloading"):
+                    self._stats["jobs_deduplicated"] += 1
+                else:
+                    job = self._jobs[key] = PrefetchJob(key=key, size=asset.get("size"))
+                    self._queue.put_nowait(key)
+                    self._stats["jobs_queued"] += 1
+                job.deployment_ids.add(plan.deployment_id)
+
+    def jobs(self, deployment_id: Optional[str] = None) -> List[PrefetchJob]:
+        """Current and recently finished jobs, optionally only those of one deployment"""
+        self._prune()
+        return [
+            job for job in self._jobs.values()
+            if deployment_id is None or deployment_id in job.deployment_ids
+        ]
+
+    def downloaded_bytes(self, job: PrefetchJob) -> int:
+        if job.status == "ready":
+            return job.size or 0
+        return self.store.download_progress(job.key) or 0
+
+    def waiting_deployment_ids(self) -> List[str]:
+        return list(self._waiting)
+
+    def get_stats(self) -> Dict:
+        """Get prefetch metrics"""
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": statuses.count("queued"),
+            "downloading": statuses.count("downloading"),
+            "deployments_waiting": len(self._waiting),
+            **self._stats,
+        }
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            job = self._jobs.get(key)
+            if job is None or job.status != "queued":
+                continue
+            job.status = "downloading"
+            try:
+                async with self.session_factory() as session:
+                    stored = await self.store.get(session, *key)
+                job.status = "ready"
+                job.sha256 = stored.sha256
+                self._stats["jobs_ready"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = getattr(e, "detail", None) or str(e)
+                self._stats["jobs_failed"] += 1
+                app_logger.warning(f"Prefetch of {key[2]} ({key[0]} {key[1]}) failed: {job.error}")
+            job.finished_at = datetime.now()
+            job.finished_monotonic = time.monotonic()
+            await self._finish(key)
+
+    async def _finish(self, key: AssetKey):
+        """Release the deployments that were waiting only for this asset"""
+        released = []
+        for deployment_id, (agent_id, remaining) in list(self._waiting.items()):
+            remaining.discard(key)
+            if not remaining:
+                released.append((deployment_id, agent_id))
+                del self._waiting[deployment_id]
+        if released:
+            await self._release([deployment_id for deployment_id, _ in released])
+            for _, agent_id in released:
+                deployment_notifier.notify(agent_id)
+
+    async def _release(self, deployment_ids: List[str]):
+        try:
+            async with self.session_factory() as session:
+                await session.execute(
+                    update(DeploymentDB)
+                    .where(DeploymentDB.id.in_(deployment_ids))
+                    .values(artifacts_ready=True)
+                )
+                await session.commit()
+        except Exception:
+            app_logger.exception("Failed to mark deployments as ready")
+            return
+        resource_versions.bump(DEPLOYMENTS)
+        self._stats["deployments_released"] += len(deployment_ids)
+
+    async def _resume(self):
+        """Queue pending deployments that are still waiting (restart, or prefetch just disabled)"""
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(
+                        DeploymentDB.id, DeploymentDB.agent_id, AgentDB.platform,
+                        DeploymentDB.release_ids, DeploymentDB.release_tags,
+                    )
+                    .join(AgentDB, AgentDB.id == DeploymentDB.agent_id)
+                    .where(DeploymentDB.status == DeploymentStatusEnum.PENDING)
+                    .where(DeploymentDB.artifacts_ready.is_(False))
+                    .where(DeploymentDB.id.not_in(list(self._waiting)))
+                )
+                targets = result.all()
+                if not targets:
+                    return
+                plans = []
+                for deployment_id, agent_id, platform, release_ids, release_tags in targets:
+                    plans += await self.plan(
+                        session, [(deployment_id, agent_id, platform)], release_ids or [], release_tags or []
+                    )
+            planned = {plan.deployment_id for plan in plans}
+            ready = [(target.id, target.agent_id) for target in targets if target.id not in planned]
+            self.enqueue(plans)
+            if ready:
+                await self._release([deployment_id for deployment_id, _ in ready])
+                for _, agent_id in ready:
+                    deployment_notifier.notify(agent_id)
+            app_logger.info(f"Artifact prefetch resumed {len(plans)} deployment(s), released {len(ready)}")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            app_logger.exception("Failed to resume artifact prefetch")
+
+    def _prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.monotonic() - self.retention_seconds
+        for key, job in list(self._jobs.items()):
+            if job.finished_monotonic is not None and job.finished_monotonic < cutoff:
+                del self._jobs[key]
+
+
+artifact_prefetcher = ArtifactPrefetcher(
+    store=artifact_store,
+    workers=ARTIFACT_PREFETCH_WORKERS,
+    retention_seconds=ARTIFACT_PREFETCH_RETENTION_SECONDS,
+)
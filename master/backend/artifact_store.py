@@ -0,0 +1,323 @@
+"""
+Artifact store
+Content-addressed on-disk cache of release assets, downloaded from GitHub once and served to agents
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Set, Tuple
+
+import anyio
+import httpx
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import AsyncSessionLocal, dialect_insert
+from db_models import ArtifactDB, ReleaseVersionDB
+from github_releases import GitHubAPIError
+from http_client import OutboundHTTPClient, http_client
+from logging_config import app_logger
+from release_catalog import load_github_token
+from config import ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES, ARTIFACT_DOWNLOAD_TIMEOUT_SECONDS
+
+CHUNK_SIZE = 256 * 1024
+
+
+class ArtifactNotFound(Exception):
+    """The requested asset is not in the release catalog"""
+
+
+@dataclass
+class StoredArtifact:
+    """An asset available in the store"""
+    sha256: str
+    size: int
+    content_type: str
+
+
+class ArtifactStore:
+    """
+    Release assets stored under root_dir/<sha256[:2]>/<sha256>.
+    - Each asset is downloaded once; concurrent requests for the same asset share the download
+    - Files are written to a temporary name and renamed into place, so readers never see
+      partial files, and a reader keeps its open file even if the file is evicted meanwhile
+    - Least recently used files (by mtime, touched on every read) are evicted once the
+      store grows past max_bytes
+    The artifacts table maps (release, tag, asset name) to the content hash.
+    No database connection is held while a download runs: get() ends the caller's
+    transaction once it has read the catalog, and records the download with its own
+    short session (session_factory).
+    """
+
+    def __init__(
+        self,
+        root_dir: Path,
+        max_bytes: int,
+        client: OutboundHTTPClient,
+        timeout_seconds: float,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+    ):
+        self.root_dir = Path(root_dir)
+        self.max_bytes = max_bytes
+        self.client = client
+        self.timeout_seconds = timeout_seconds
+        self.session_factory = session_factory
+        self._total_bytes: Optional[int] = None
+        self._downloads: Dict[Tuple[str, str, str], asyncio.Task] = {}
+        self._progress: Dict[Tuple[str, str, str], int] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "downloads": 0,
+            "download_errors": 0,
+            "bytes_downloaded": 0,
+            "evictions": 0,
+            "bytes_evicted": 0,
+        }
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root_dir / sha256[:2] / sha256
+
+    def incoming_dir(self) -> Path:
+        """Directory for files being written; on the same file system so they can be renamed into place"""
+        incoming = self.root_dir / ".incoming"
+        incoming.mkdir(parents=True, exist_ok=True)
+        return incoming
+
+    async def get(self, session: AsyncSession, release_id: str, tag: str, asset_name: str) -> StoredArtifact:
+        """
+        Make sure an asset of a catalogued release version is in the store
+        Raises ArtifactNotFound for assets the catalog does not list and
+        GitHubAPIError when the download fails.
+        The transaction of `session` is committed before returning or downloading, so its
+        connection goes back to the pool while the caller waits or streams the file.
+        """
+        version_db = await session.get(ReleaseVersionDB, (release_id, tag))
+        asset = None
+        if version_db is not None:
+            asset = next((item for item in version_db.assets or [] if item.get("name") == asset_name), None)
+        if asset is None or not asset.get("browser_download_url"):
+            raise ArtifactNotFound(f"Asset {asset_name} of {release_id} {tag} is not in the release catalog")
+
+        artifact_db = await session.get(ArtifactDB, (release_id, tag, asset_name))
+        if (
+            artifact_db is not None
+            and artifact_db.source_updated_at == asset.get("updated_at")
+            and self.path_for(artifact_db.sha256).exists()
+        ):
+            self._stats["hits"] += 1
+            stored = StoredArtifact(artifact_db.sha256, artifact_db.size, artifact_db.content_type)
+            await session.commit()
+            return stored
+
+        self._stats["misses"] += 1
+        token = await load_github_token(session)
+        await session.commit()  # Do not hold a connection for the length of the download
+        key = (release_id, tag, asset_name)
+        task = self._downloads.get(key)
+        if task is None:
+            task = asyncio.create_task(self._download(key, asset["browser_download_url"], token))
+            self._downloads[key] = task
+            task.add_done_callback(lambda _: self._downloads.pop(key, None))
+        sha256, size = await asyncio.shield(task)
+
+        stored = StoredArtifact(sha256, size, asset.get("content_type") or "application/octet-stream")
+        async with self.session_factory() as record_session:
+            await self._record(record_session, release_id, tag, asset_name, stored, asset)
+        return stored
+
+    @staticmethod
+    async def _record(
+        session: AsyncSession,
+        release_id: str,
+        tag: str,
+        asset_name: str,
+        stored: StoredArtifact,
+        asset: dict,
+    ):
+        """Map a catalogued asset to the downloaded file"""
+        insert_stmt = dialect_insert(session, ArtifactDB).values(
+            release_id=release_id,
+            tag=tag,
+            asset_name=asset_name,
+            sha256=stored.sha256,
+            size=stored.size,
+            content_type=stored.content_type,
+            source_url=asset["browser_download_url"],
+            source_updated_at=asset.get("updated_at"),
+            fetched_at=datetime.now(),
+        )
+        await session.execute(insert_stmt.on_conflict_do_update(
+            index_elements=[ArtifactDB.release_id, ArtifactDB.tag, ArtifactDB.asset_name],
+            set_={
+                "sha256": insert_stmt.excluded.sha256,
+                "size": insert_stmt.excluded.size,
+                "content_type": insert_stmt.excluded.content_type,
+                "source_url": insert_stmt.excluded.source_url,
+                "source_updated_at": insert_stmt.excluded.source_updated_at,
+                "fetched_at": insert_stmt.excluded.fetched_at,
+            },
+        ))
+        await session.commit()
+
+    async def cached_keys(self, session: AsyncSession, assets: Dict[Tuple[str, str, str], dict]) -> Set[Tuple[str, str, str]]:
+        """
+        Keys of assets (release_id, tag, asset_name) -> catalog asset that get() would serve
+        without downloading
+        """
+        if not assets:
+            return set()
+        result = await session.execute(
+            select(ArtifactDB.release_id, ArtifactDB.tag, ArtifactDB.asset_name,
+                   ArtifactDB.sha256, ArtifactDB.source_updated_at)
+            .where(tuple_(ArtifactDB.release_id, ArtifactDB.tag, ArtifactDB.asset_name).in_(list(assets)))
+        )
+        return {
+            (release_id, tag, asset_name)
+            for release_id, tag, asset_name, sha256, source_updated_at in result.all()
+            if source_updated_at == assets[(release_id, tag, asset_name)].get("updated_at")
+            and self.path_for(sha256).exists()
+        }
+
+    def download_progress(self, key: Tuple[str, str, str]) -> Optional[int]:
+        """Bytes received so far of an asset being downloaded, None when it is not downloading"""
+        return self._progress.get(key)
+
+    def open(self, sha256: str) -> Optional[Tuple[BinaryIO, int]]:
+        """Open a stored file for reading and mark it recently used; None if it is not stored"""
+        path = self.path_for(sha256)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # Evicted after opening; the open file stays readable
+        return file, os.fstat(file.fileno()).st_size
+
+    def get_stats(self) -> Dict:
+        """Get store metrics"""
+        return {
+            "max_bytes": self.max_bytes,
+            "total_bytes": self._total_bytes,
+            "downloading": len(self._downloads),
+            **self._stats,
+        }
+
+    async def put_file(self, temp_name: str, sha256: str, size: int):
+        """Move a complete file from incoming_dir() into the store"""
+        if self._total_bytes is None:
+            self._total_bytes = await anyio.to_thread.run_sync(self._scan_total_bytes)
+        path = self.path_for(sha256)
+        path.parent.mkdir(exist_ok=True)
+        if path.exists():
+            os.unlink(temp_name)  # Same content is already stored
+        else:
+            os.replace(temp_name, path)
+            self._total_bytes += size
+        await self._evict(keep=sha256)
+
+    async def _download(self, key: Tuple[str, str, str], url: str, token: Optional[str]) -> Tuple[str, int]:
+        """Download url into the store; returns (sha256, size)"""
+        headers = {"Accept": "application/octet-stream"}
+        if token:
+            headers["Authorization"] = f"token {token}"
+        fd, temp_name = tempfile.mkstemp(dir=self.incoming_dir())
+        digest = hashlib.sha256()
+        size = 0
+        self._stats["downloads"] += 1
+        self._progress[key] = 0
+        try:
+            with os.fdopen(fd, "wb") as file:
+                async with self.client.stream(
+                    "GET", url, headers=headers, follow_redirects=True, timeout=self.timeout_seconds
+                ) as response:
+                    if response.status_code == 404:
+                        raise GitHubAPIError(404, "Asset not found on GitHub")
+                    if not response.is_success:
+                        raise GitHubAPIError(502, f"Failed to download asset: HTTP {response.status_code}")
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        await anyio.to_thread.run_sync(_write_chunk, file, digest, chunk)
+                        size += len(chunk)
+                        self._progress[key] = size
+        except httpx.TimeoutException:
+            self._stats["download_errors"] += 1
+            _remove(temp_name)
+            raise GitHubAPIError(504, "Asset download timeout")
+        except httpx.RequestError as e:
+            self._stats["download_errors"] += 1
+            _remove(temp_name)
+            raise GitHubAPIError(503, f"Failed to download asset: {str(e)}")
+        except BaseException:
+            self._stats["download_errors"] += 1
+            _remove(temp_name)
+            raise
+        finally:
+            self._progress.pop(key, None)
+
+        sha256 = digest.hexdigest()
+        self._stats["bytes_downloaded"] += size
+        app_logger.info(f"Stored artifact {sha256} ({size} bytes) from {url}")
+        await self.put_file(temp_name, sha256, size)
+        return sha256, size
+
+    async def _evict(self, keep: str):
+        """Delete least recently used files until the store fits in max_bytes"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        files = await anyio.to_thread.run_sync(self._list_files)
+        for mtime, size, path in sorted(files):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if path.name == keep:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self._total_bytes -= size
+            self._stats["evictions"] += 1
+            self._stats["bytes_evicted"] += size
+            app_logger.info(f"Evicted artifact {path.name} ({size} bytes)")
+
+    def _list_files(self) -> List[Tuple[float, int, Path]]:
+        files = []
+        if not self.root_dir.exists():
+            return files
+        for directory in self.root_dir.iterdir():
+            if not directory.is_dir() or directory.name == ".incoming":
+                continue
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        return files
+
+    def _scan_total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._list_files())
+
+
+def _write_chunk(file: BinaryIO, digest, chunk: bytes):
+    digest.update(chunk)
+    file.write(chunk)
+
+
+def _remove(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+artifact_store = ArtifactStore(
+    root_dir=ARTIFACT_CACHE_DIR,
+    max_bytes=ARTIFACT_CACHE_MAX_BYTES,
+    client=http_client,
+    timeout_seconds=ARTIFACT_DOWNLOAD_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,52 @@
+"""
+Background task helpers
+Small utilities for running periodic work inside the FastAPI event loop
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from logging_config import app_logger
+
+
+class PeriodicTask:
+    """Run an async callback at a fixed interval until stopped"""
+
+    def __init__(self, name: str, interval_seconds: float, callback: Callable[[], Awaitable[None]]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.callback = callback
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background loop (no-op if already running)"""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run(), name=self.name)
+        app_logger.info(f"Started background task '{self.name}' (interval: {self.interval_seconds}s)")
+
+    async def stop(self):
+        """Cancel the background loop and wait for it to finish"""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        app_logger.info(f"Stopped background task '{self.name}'")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.callback()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                app_logger.exception(f"Background task '{self.name}' failed")
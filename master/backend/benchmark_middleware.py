@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Request middleware benchmark
+Per-request cost of the instrumentation middleware, before and after RequestInstrumentationMiddleware
+"""
+
+import sys
+import time
+import asyncio
+import logging
+from pathlib import Path
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+# Add parent directory to path to import modules
+sys.path.insert(0, str(Path(__file__).parent))
+
+from logging_config import request_logger
+from metrics_collector import route_template
+from request_instrumentation import RequestInstrumentationMiddleware
+import metrics_collector
+
+
+class Heartbeat(BaseModel):
+    id: str
+    name: str
+    platform: str
+    version: str
+
+
+# The two BaseHTTPMiddleware layers main.py used to stack, kept here for comparison
+class LegacyMetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start = time.time()
+        status_code = 200
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            elapsed_time = (time.time() - start) * 1000
+            endpoint = f"{request.method} {route_template(request.scope)}"
+            metrics_collector.request_counts[endpoint] += 1
+            metrics_collector.response_times[endpoint].record(elapsed_time)
+            if status_code >= 400:
+                metrics_collector.error_counts[endpoint][str(status_code)] += 1
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        path = request.url.path
+        method = request.method
+        request_logger.info(f"{method} {path} - Client: {request.client.host if request.client else 'unknown'}")
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        request_logger.info(f"{method} {path} - Status: {response.status_code} - Time: {process_time:.3f}s")
+        return response
+
+
+def build_app(setup=None) -> FastAPI:
+    """A heartbeat-sized endpoint: parse a small JSON body and answer with it"""
+    app = FastAPI()
+
+    @app.post("/api/agents/{agent_id}/heartbeat")
+    async def heartbeat(agent_id: str, body: Heartbeat):
+        return body
+
+    if setup:
+        setup(app)
+    return app
+
+
+def legacy(app: FastAPI):
+    app.add_middleware(LegacyMetricsMiddleware)
+    app.add_middleware(LegacyLoggingMiddleware)
+
+
+def instrumented(metrics_enabled: bool, access_log_enabled: bool):
+    def setup(app: FastAPI):
+        app.add_middleware(
+            RequestInstrumentationMiddleware,
+            metrics_enabled=metrics_enabled,
+            access_log_enabled=access_log_enabled,
+        )
+    return setup
+
+
+SCENARIOS = [
+    ("no middleware", None),
+    ("legacy: 2x BaseHTTPMiddleware", legacy),
+    ("instrumentation: metrics + log", instrumented(True, True)),
+    ("instrumentation: metrics only", instrumented(True, False)),
+    ("instrumentation: log only", instrumented(False, True)),
+    ("instrumentation: both off", instrumented(False, False)),
+]
+
+BODY = b'{"id": "agent-1", "name": "Agent 1", "platform": "windows", "version": "1.0.0"}'
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "POST",
+    "scheme": "http",
+    "path": "/api/agents/agent-1/heartbeat",
+    "raw_path": b"/api/agents/agent-1/heartbeat",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(BODY)).encode())],
+    "client": ("127.0.0.1", 50000),
+    "server": ("test", 80),
+}
+
+
+async def call(app: FastAPI):
+    """One request straight through the ASGI interface (no HTTP client or server)"""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": BODY, "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(dict(SCOPE), receive, send)
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    """Mean microseconds per request"""
+    for _ in range(min(requests // 10, 1000)):
+        await call(app)
+    start = time.perf_counter_ns()
+    for _ in range(requests):
+        await call(app)
+    return (time.perf_counter_ns() - start) / requests / 1000
+
+
+async def run(requests: int, rounds: int):
+    # Measure formatting and record creation, not console or file I/O
+    request_logger.handlers = [logging.NullHandler()]
+    request_logger.propagate = False
+
+    apps = [(name, build_app(setup)) for name, setup in SCENARIOS]
+    results = {name: [] for name, _ in apps}
+    for _ in range(rounds):
+        for name, app in apps:
+            results[name].append(await measure(app, requests))
+
+    baseline = min(results["no middleware"])
+    print(f"{requests} requests x {rounds} rounds, best round per scenario")
+    print(f"{'scenario':<34}{'us/request':>12}{'overhead us':>14}")
+    for name, timings in results.items():
+        best = min(timings)
+        print(f"{name:<34}{best:>12.1f}{best - baseline:>14.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the request instrumentation middleware')
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per round (default: 5000)')
+    parser.add_argument('--rounds', type=int, default=5, help='Rounds per scenario (default: 5)')
+
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.rounds))
@@ -15,6 +15,7 @@ CORS_ORIGINS: List[str] = ["*"]  # In production, restrict to specific domains
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_METHODS = ["*"]
 CORS_ALLOW_HEADERS = ["*"]
+CORS_EXPOSE_HEADERS = ["X-Next-Cursor"]  # Pagination cursor of list endpoints
 
 # Static files paths (frontend build)
 FRONTEND_DIST_PATHS = [
@@ -34,3 +35,98 @@ HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
 RELOAD = os.getenv("RELOAD", "true").lower() == "true"  # Development mode
 
+# Heartbeat ingestion settings
+# "direct": every heartbeat is written to the database immediately
+# "buffered": heartbeats are kept in memory and flushed to the agents table in bulk
+HEARTBEAT_INGEST_MODE = os.getenv("HEARTBEAT_INGEST_MODE", "direct").lower()
+HEARTBEAT_FLUSH_INTERVAL_SECONDS = float(os.getenv("HEARTBEAT_FLUSH_INTERVAL_SECONDS", "5"))
+
+# Agent liveness settings
+# Agent sends heartbeat every 10 seconds, so 30 seconds gives 3 missed heartbeats tolerance
+HEARTBEAT_TIMEOUT_SECONDS = int(os.getenv("HEARTBEAT_TIMEOUT_SECONDS", "30"))
+# How often the background sweeper marks timed-out agents OFFLINE
+AGENT_SWEEP_INTERVAL_SECONDS = float(os.getenv("AGENT_SWEEP_INTERVAL_SECONDS", "10"))
+
+# Long-polling settings for GET /api/deployments/pending/{agent_id}?wait=N
+LONG_POLL_MAX_WAIT_SECONDS = int(os.getenv("LONG_POLL_MAX_WAIT_SECONDS", "30"))
+LONG_POLL_MAX_WAITERS = int(os.getenv("LONG_POLL_MAX_WAITERS", "5000"))  # Cap on parked requests
+LONG_POLL_DISCONNECT_CHECK_SECONDS = float(os.getenv("LONG_POLL_DISCONNECT_CHECK_SECONDS", "1"))
+
+# Agent push channel (WebSocket) settings
+AGENT_CHANNEL_MAX_CONNECTIONS = int(os.getenv("AGENT_CHANNEL_MAX_CONNECTIONS", "10000"))
+AGENT_CHANNEL_HEARTBEAT_INTERVAL_SECONDS = int(os.getenv("AGENT_CHANNEL_HEARTBEAT_INTERVAL_SECONDS", "10"))
+
+# Conditional GET (ETag / If-None-Match) settings
+# Heartbeats do not bump the agents version; last_seen and timeout-derived status changes
+# reach cached agent lists after at most this many seconds
+AGENT_LIST_ETAG_BUCKET_SECONDS = float(os.getenv("AGENT_LIST_ETAG_BUCKET_SECONDS", "10"))
+
+# GitHub API settings
+# Base URL is configurable for GitHub Enterprise and for local stub servers in tests
+GITHUB_API_BASE_URL = os.getenv("GITHUB_API_BASE_URL", "https://api.github.com")
+GITHUB_API_TIMEOUT_SECONDS = float(os.getenv("GITHUB_API_TIMEOUT_SECONDS", "10"))
+# Release lists are served from memory for the TTL, then served stale for up to
+# GITHUB_RELEASES_STALE_SECONDS while a conditional request revalidates them
+GITHUB_RELEASES_CACHE_TTL_SECONDS = float(os.getenv("GITHUB_RELEASES_CACHE_TTL_SECONDS", "60"))
+GITHUB_RELEASES_STALE_SECONDS = float(os.getenv("GITHUB_RELEASES_STALE_SECONDS", "3600"))
+# Release lists are read page by page (GitHub allows at most 100 per page); pages after
+# the first are fetched concurrently, at most GITHUB_RELEASES_PAGE_CONCURRENCY at a time
+GITHUB_RELEASES_PER_PAGE = int(os.getenv("GITHUB_RELEASES_PER_PAGE", "100"))
+GITHUB_RELEASES_MAX_PAGES = int(os.getenv("GITHUB_RELEASES_MAX_PAGES", "20"))
+GITHUB_RELEASES_PAGE_CONCURRENCY = int(os.getenv("GITHUB_RELEASES_PAGE_CONCURRENCY", "4"))
+# An unchanged first page only proves no release was added; every page is revalidated (each
+# with its own ETag) once the older pages were last checked GITHUB_RELEASES_FULL_REVALIDATE_SECONDS ago
+GITHUB_RELEASES_FULL_REVALIDATE_SECONDS = float(os.getenv("GITHUB_RELEASES_FULL_REVALIDATE_SECONDS", "600"))
+# GitHub API requests are scheduled against the X-RateLimit budget of their token. Background
+# requests (catalog sync) leave GITHUB_RATE_LIMIT_INTERACTIVE_RESERVE_RATIO of the limit to
+# interactive ones, which wait at most GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS for the budget to reset
+GITHUB_RATE_LIMIT_INTERACTIVE_RESERVE_RATIO = float(os.getenv("GITHUB_RATE_LIMIT_INTERACTIVE_RESERVE_RATIO", "0.2"))
+GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS", "30"))
+GITHUB_RATE_LIMIT_MAX_ATTEMPTS = int(os.getenv("GITHUB_RATE_LIMIT_MAX_ATTEMPTS", "3"))
+
+# Shared outbound HTTP client (all GitHub traffic)
+OUTBOUND_HTTP_MAX_CONNECTIONS = int(os.getenv("OUTBOUND_HTTP_MAX_CONNECTIONS", "50"))
+OUTBOUND_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OUTBOUND_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OUTBOUND_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("OUTBOUND_HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+OUTBOUND_HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("OUTBOUND_HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+OUTBOUND_HTTP_TIMEOUT_SECONDS = float(os.getenv("OUTBOUND_HTTP_TIMEOUT_SECONDS", "10"))
+# HTTP/2 needs the 'h2' package (httpx[http2]); without it HTTP/1.1 is used
+OUTBOUND_HTTP2 = os.getenv("OUTBOUND_HTTP2", "true").lower() == "true"
+
+# Release catalog sync: GitHub releases of every release repository are copied into
+# release_versions, so version lists and deployments do not call GitHub
+RELEASE_CATALOG_SYNC_INTERVAL_SECONDS = float(os.getenv("RELEASE_CATALOG_SYNC_INTERVAL_SECONDS", "300"))
+RELEASE_CATALOG_SYNC_CONCURRENCY = int(os.getenv("RELEASE_CATALOG_SYNC_CONCURRENCY", "4"))
+
+# Artifact cache: release assets are downloaded from GitHub once and served to agents
+# from ARTIFACT_CACHE_DIR; least recently used files are evicted above ARTIFACT_CACHE_MAX_BYTES
+ARTIFACT_CACHE_DIR = Path(os.getenv("ARTIFACT_CACHE_DIR", "./artifacts"))
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+ARTIFACT_DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv("ARTIFACT_DOWNLOAD_TIMEOUT_SECONDS", "300"))
+
+# Artifact prefetch: assets of new deployments are downloaded into the artifact cache by
+# ARTIFACT_PREFETCH_WORKERS workers before agents can claim them (0 disables the gate)
+ARTIFACT_PREFETCH_WORKERS = int(os.getenv("ARTIFACT_PREFETCH_WORKERS", "4"))
+ARTIFACT_PREFETCH_RETENTION_SECONDS = float(os.getenv("ARTIFACT_PREFETCH_RETENTION_SECONDS", "3600"))
+# Retry-After sent to agents polling while their deployment is still warming up
+ARTIFACT_PREFETCH_RETRY_AFTER_SECONDS = int(os.getenv("ARTIFACT_PREFETCH_RETRY_AFTER_SECONDS", "5"))
+
+# Artifact deltas: agents that have the previous version of an asset can download a binary
+# delta instead, when it is at most ARTIFACT_DELTA_MAX_RATIO of the full file
+ARTIFACT_DELTA_WORKERS = int(os.getenv("ARTIFACT_DELTA_WORKERS", "2"))
+ARTIFACT_DELTA_BLOCK_SIZE = int(os.getenv("ARTIFACT_DELTA_BLOCK_SIZE", "2048"))
+ARTIFACT_DELTA_MAX_RATIO = float(os.getenv("ARTIFACT_DELTA_MAX_RATIO", "0.5"))
+ARTIFACT_DELTA_MAX_INPUT_BYTES = int(os.getenv("ARTIFACT_DELTA_MAX_INPUT_BYTES", str(512 * 1024 ** 2)))
+
+# Request metrics are keyed by route template (e.g. "GET /api/deployments/pending/{agent_id}"),
+# so their number does not grow with the fleet. Requests per agent are tracked separately for
+# at most METRICS_TOP_AGENTS agents per route (the busiest ones)
+METRICS_TOP_AGENTS = int(os.getenv("METRICS_TOP_AGENTS", "20"))
+
+# Event loop lag: a probe sleeps EVENT_LOOP_LAG_INTERVAL_SECONDS and records how late it wakes up
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+# Request instrumentation (one ASGI middleware): per-route metrics and the access log can be
+# switched off independently, e.g. to drop per-request log lines on busy heartbeat paths
+REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "true").lower() == "true"
+ACCESS_LOG_ENABLED = os.getenv("ACCESS_LOG_ENABLED", "true").lower() == "true"
@@ -0,0 +1,25 @@
+"""
+Opaque cursors over the deployments table
+A cursor encodes the (created_at, id) position of a deployment
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+def encode_cursor(created_at: datetime, deployment_id: str) -> str:
+    """Encode a deployment position as a URL-safe opaque token"""
+    raw = json.dumps([created_at.isoformat(), deployment_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, str]]:
+    """Decode a cursor token, returning None if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, deployment_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(deployment_id)
+    except (ValueError, TypeError):
+        return None
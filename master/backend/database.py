@@ -5,6 +5,8 @@ Uses SQLite3 for development, PostgreSQL for production
 import os
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import AsyncGenerator
 
 # Database URL from environment variable
@@ -64,6 +66,16 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+def dialect_insert(session: AsyncSession, model):
+    """
+    Create a dialect-specific INSERT for the session's database
+    Supports on_conflict_do_update / on_conflict_do_nothing on SQLite and PostgreSQL
+    """
+    if session.bind.dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return postgresql_insert(model)
+
+
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
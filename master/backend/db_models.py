@@ -1,7 +1,7 @@
 """
 SQLAlchemy database models
 """
-from sqlalchemy import Column, String, DateTime, Text, JSON, Enum as SQLEnum, Index, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Text, JSON, Enum as SQLEnum, Index, ForeignKey, true
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -31,11 +31,12 @@ class AgentDB(Base):
     __tablename__ = "agents"
 
     id = Column(String, primary_key=True, index=True)
-    name = Column(String, nullable=False, index=True)
+    name = Column(String, nullable=False, unique=True, index=True)  # Registration upserts on name
     platform = Column(String, nullable=False)  # "windows" or "macos"
     version = Column(String, nullable=False)
     status = Column(SQLEnum(AgentStatusEnum), nullable=False, default=AgentStatusEnum.OFFLINE)
-    last_seen = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
+    # Set explicitly by heartbeats only; indexed for the offline sweeper
+    last_seen = Column(DateTime, nullable=False, default=func.now(), index=True)
     ip_address = Column(String, nullable=True)
 
     def __repr__(self):
@@ -72,22 +73,133 @@ class DeploymentDB(Base):
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     error_message = Column(Text, nullable=True)
+    rollout_id = Column(String, nullable=True, index=True)  # Fleet rollout this deployment belongs to
+    # False while the master prefetches the release assets; agents cannot claim it until then
+    artifacts_ready = Column(Boolean, nullable=False, default=True, server_default=true())
     
     # Relationship to Agent
     agent = relationship("AgentDB", backref="deployments")
     
     # Indexes for efficient querying
     # Composite index for common query: WHERE agent_id = ? AND status = ? ORDER BY created_at
+    # The (…, created_at, id) indexes serve keyset pagination (ORDER BY created_at DESC, id DESC)
+    # without sorting, with or without an agent_id / status filter
     __table_args__ = (
-        Index('idx_deployment_agent_status_created', 'agent_id', 'status', 'created_at'),
-        Index('idx_deployment_status', 'status'),  # For filtering by status
-        Index('idx_deployment_created_at', 'created_at'),  # For ordering by created_at
+        Index('idx_deployment_agent_status_created', 'agent_id', 'status', 'created_at', 'id'),
+        Index('idx_deployment_agent_created', 'agent_id', 'created_at', 'id'),  # For listing by agent
+        Index('idx_deployment_status', 'status', 'created_at', 'id'),  # For filtering by status
+        Index('idx_deployment_created_at', 'created_at', 'id'),  # For ordering by created_at
     )
 
     def __repr__(self):
         return f"<DeploymentDB(id={self.id}, agent_id={self.agent_id}, status={self.status})>"
 
 
+class DeploymentItemDB(Base):
+    """
+    One release of a deployment (normalized copy of release_ids / release_tags)
+    Lets "deployments that included release X / tag Y" use an index instead of decoding JSON
+    """
+    __tablename__ = "deployment_items"
+
+    deployment_id = Column(String, ForeignKey('deployments.id', ondelete='CASCADE'), primary_key=True)
+    position = Column(Integer, primary_key=True)  # Index in release_ids
+    release_id = Column(String, nullable=False)
+    tag = Column(String, nullable=False)
+    status = Column(SQLEnum(DeploymentStatusEnum), nullable=False, default=DeploymentStatusEnum.PENDING)
+
+    __table_args__ = (
+        Index('idx_deployment_item_release_tag', 'release_id', 'tag'),  # For release / tag filters
+        Index('idx_deployment_item_tag', 'tag'),  # For tag-only filters
+    )
+
+    def __repr__(self):
+        return f"<DeploymentItemDB(deployment_id={self.deployment_id}, release_id={self.release_id}, tag={self.tag})>"
+
+
+class ReleaseVersionDB(Base):
+    """
+    Version (GitHub release) of a release repository, kept by the release catalog sync
+    Version lists and deployment creation read this table instead of calling GitHub
+    """
+    __tablename__ = "release_versions"
+
+    release_id = Column(String, ForeignKey('releases.id', ondelete='CASCADE'), primary_key=True)
+    tag = Column(String, primary_key=True)  # GitHub tag_name
+    name = Column(String, nullable=False)
+    published_at = Column(DateTime, nullable=True)  # UTC; drafts have none
+    html_url = Column(String, nullable=False, default="")
+    assets = Column(JSON, default=list)  # [{id, name, size, content_type, updated_at, browser_download_url}]
+    synced_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_release_version_published', 'release_id', 'published_at'),  # Newest-first listing, latest version
+    )
+
+    def __repr__(self):
+        return f"<ReleaseVersionDB(release_id={self.release_id}, tag={self.tag})>"
+
+
+class ArtifactDB(Base):
+    """
+    Release asset cached on the master's disk
+    Files are stored by content (sha256); several assets with the same content share one file
+    """
+    __tablename__ = "artifacts"
+
+    release_id = Column(String, ForeignKey('releases.id', ondelete='CASCADE'), primary_key=True)
+    tag = Column(String, primary_key=True)
+    asset_name = Column(String, primary_key=True)
+    sha256 = Column(String, nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=False, default="application/octet-stream")
+    source_url = Column(String, nullable=False)
+    source_updated_at = Column(String, nullable=True)  # GitHub asset updated_at; a change means re-fetch
+    fetched_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<ArtifactDB(release_id={self.release_id}, tag={self.tag}, asset_name={self.asset_name}, sha256={self.sha256})>"
+
+
+class ArtifactDeltaDB(Base):
+    """
+    Binary delta between two cached artifacts (by content hash)
+    delta_sha256 is NULL when the delta is not small enough to be worth sending
+    """
+    __tablename__ = "artifact_deltas"
+
+    base_sha256 = Column(String, primary_key=True)
+    target_sha256 = Column(String, primary_key=True)
+    delta_sha256 = Column(String, nullable=True)
+    delta_size = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<ArtifactDeltaDB(base_sha256={self.base_sha256}, target_sha256={self.target_sha256}, delta_sha256={self.delta_sha256})>"
+
+
+class AgentInstalledReleaseDB(Base):
+    """
+    Release version currently installed on an agent
+    Maintained by deployment completion (one row per agent and release), so the
+    fleet version matrix never has to scan deployment history
+    """
+    __tablename__ = "agent_installed_releases"
+
+    agent_id = Column(String, ForeignKey('agents.id', ondelete='CASCADE'), primary_key=True)
+    release_id = Column(String, ForeignKey('releases.id', ondelete='CASCADE'), primary_key=True)
+    tag = Column(String, nullable=False)  # Installed release tag
+    deployment_id = Column(String, nullable=False)  # Deployment that installed it
+    installed_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_installed_release_tag', 'release_id', 'tag'),  # For "which agents run release X / tag Y"
+    )
+
+    def __repr__(self):
+        return f"<AgentInstalledReleaseDB(agent_id={self.agent_id}, release_id={self.release_id}, tag={self.tag})>"
+
+
 class SettingsDB(Base):
     """Settings database model (for GitHub token storage)"""
     __tablename__ = "settings"
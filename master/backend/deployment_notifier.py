@@ -0,0 +1,135 @@
+"""
+Deployment notifier
+Wakes up long-polling agents as soon as a deployment is queued for them
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from config import LONG_POLL_MAX_WAITERS, LONG_POLL_DISCONNECT_CHECK_SECONDS
+
+
+class LongPollCapacityError(Exception):
+    """Raised when the maximum number of parked long-poll requests is reached"""
+    pass
+
+
+class DeploymentNotifier:
+    """
+    Per-agent notification for parked long-poll requests.
+    Each agent has a generation counter that is bumped on every notify(); a waiter
+    passes the generation it observed before querying the database, so a deployment
+    queued between the query and the wait is never missed.
+    """
+
+    def __init__(self, max_waiters: int, disconnect_check_seconds: float):
+        self.max_waiters = max_waiters
+        self.disconnect_check_seconds = disconnect_check_seconds
+        self._generations: Dict[str, int] = {}
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+        self._parked = 0
+        self._closed = False
+        self._stats = {
+            "notifications": 0,
+            "woken": 0,
+            "timed_out": 0,
+            "disconnected": 0,
+            "rejected": 0,
+        }
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def generation(self, agent_id: str) -> int:
+        """Current notification generation for an agent"""
+        return self._generations.get(agent_id, 0)
+
+    def notify(self, agent_id: str):
+        """Signal that new work is available for an agent"""
+        self._generations[agent_id] = self.generation(agent_id) + 1
+        self._stats["notifications"] += 1
+        for future in self._waiters.get(agent_id, ()):
+            if not future.done():
+                future.set_result(True)
+
+    async def wait(
+        self,
+        agent_id: str,
+        since_generation: int,
+        timeout: float,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        limited: bool = True,
+    ) -> bool:
+        """
+        Park until the agent is notified, the timeout expires or the client disconnects
+        Returns True if new work was signalled since since_generation
+        Push channel connections pass limited=False; they are capped separately.
+        """
+        if self._closed:
+            return False
+        if self.generation(agent_id) != since_generation:
+            return True
+        if limited and self._parked >= self.max_waiters:
+            self._stats["rejected"] += 1
+            raise LongPollCapacityError(f"Too many parked long-poll requests ({self._parked})")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters.setdefault(agent_id, set()).add(future)
+        if limited:
+            self._parked += 1
+        deadline = loop.time() + timeout
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self._stats["timed_out"] += 1
+                    return False
+                try:
+                    # shield() keeps the future alive across wait_for timeouts
+                    await asyncio.wait_for(
+                        asyncio.shield(future),
+                        timeout=min(remaining, self.disconnect_check_seconds),
+                    )
+                except asyncio.TimeoutError:
+                    if is_disconnected and await is_disconnected():
+                        self._stats["disconnected"] += 1
+                        return False
+                    continue
+                if self._closed:
+                    return False
+                self._stats["woken"] += 1
+                return True
+        finally:
+            if limited:
+                self._parked -= 1
+            waiters = self._waiters.get(agent_id)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[agent_id]
+            if not future.done():
+                future.cancel()
+
+    def close(self):
+        """Release all parked requests (application shutdown)"""
+        self._closed = True
+        for waiters in self._waiters.values():
+            for future in waiters:
+                if not future.done():
+                    future.set_result(False)
+
+    def get_stats(self) -> Dict:
+        """Get long-poll metrics"""
+        return {
+            "parked": self._parked,
+            "max_waiters": self.max_waiters,
+            **self._stats,
+        }
+
+
+deployment_notifier = DeploymentNotifier(
+    max_waiters=LONG_POLL_MAX_WAITERS,
+    disconnect_check_seconds=LONG_POLL_DISCONNECT_CHECK_SECONDS,
+)
@@ -0,0 +1,61 @@
+"""
+Event loop lag monitor
+Measures how late a periodic probe wakes up; blocking calls in handlers show up as lag
+"""
+
+import asyncio
+from typing import Dict, Optional
+
+from latency_histogram import LatencyHistogram
+from logging_config import app_logger
+from config import EVENT_LOOP_LAG_INTERVAL_SECONDS
+
+
+class EventLoopLagMonitor:
+    """
+    Sleeps interval_seconds in a loop and records the overshoot of every wake-up (ms)
+    in a latency histogram; the last lag is kept as a gauge.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.histogram = LatencyHistogram()
+        self.last_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run(), name="event-loop-lag")
+        app_logger.info(f"Event loop lag monitor started (interval: {self.interval_seconds}s)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def get_stats(self) -> Dict:
+        """Get lag metrics (ms)"""
+        return {
+            "running": self.running,
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "samples": self.histogram.count,
+            **{name: round(value, 3) for name, value in self.histogram.summary().items()},
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            self.last_lag_ms = max(0.0, loop.time() - expected) * 1000
+            self.histogram.record(self.last_lag_ms)
+
+
+event_loop_monitor = EventLoopLagMonitor(interval_seconds=EVENT_LOOP_LAG_INTERVAL_SECONDS)
@@ -0,0 +1,271 @@
+"""
+GitHub rate limit scheduler
+Tracks the X-RateLimit budget of each token and schedules outbound GitHub API requests
+so the budget is never overrun; interactive requests go before background sync
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from logging_config import app_logger
+from config import (
+    GITHUB_RATE_LIMIT_INTERACTIVE_RESERVE_RATIO, GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS, GITHUB_RATE_LIMIT_MAX_ATTEMPTS
+)
+
+
+class Priority(IntEnum):
+    """Lower values are scheduled first"""
+    INTERACTIVE = 0  # A dashboard user or agent is waiting for the response
+    BACKGROUND = 1  # Catalog sync, stale cache revalidation
+
+
+class RateLimitWaitTimeout(Exception):
+    """The budget does not recover within the caller's maximum wait"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"GitHub rate limit exhausted, retry in {math.ceil(retry_after)}s")
+        self.retry_after = retry_after
+
+
+class PriorityHolder:
+    """Priority of a piece of work; can be raised while its requests are queued"""
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+
+
+@dataclass
+class RateLimitBudget:
+    """Last known budget of one token"""
+    limit: Optional[int] = None
+    remaining: Optional[int] = None  # None until GitHub has reported it
+    reset_at: float = 0.0  # Epoch seconds (X-RateLimit-Reset)
+    blocked_until: float = 0.0  # Epoch seconds, from Retry-After of a secondary rate limit
+    in_flight: int = 0
+    waiters: List[Tuple[int, int, PriorityHolder, asyncio.Future]] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class GitHubRateLimiter:
+    """
+    Request scheduler keyed by GitHub token.
+    - A request starts when the remaining budget (minus requests in flight) allows it;
+      background requests leave interactive_reserve_ratio of the limit for interactive ones
+    - Otherwise it waits in a priority queue until the budget resets; interactive requests
+      wait at most max_wait_seconds, background requests until the reset
+    - Responses rejected by a primary or secondary rate limit (403/429) update the budget
+      and are retried after the wait instead of being returned
+    """
+
+    def __init__(self, interactive_reserve_ratio: float, max_wait_seconds: float, max_attempts: int):
+        self.interactive_reserve_ratio = interactive_reserve_ratio
+        self.max_wait_seconds = max_wait_seconds
+        self.max_attempts = max_attempts
+        self._budgets: Dict[str, RateLimitBudget] = {}
+        self._sequence = itertools.count()
+        self._stats = {
+            "requests": 0,
+            "delayed": 0,
+            "rate_limited_responses": 0,
+            "retried": 0,
+            "wait_timeouts": 0,
+        }
+
+    async def run(
+        self,
+        token: Optional[str],
+        priority: PriorityHolder,
+        send: Callable[[], Awaitable[httpx.Response]],
+    ) -> httpx.Response:
+        """
+        Send a request when the budget of token allows it
+        Raises RateLimitWaitTimeout when an interactive request would wait too long.
+        """
+        key = _token_key(token)
+        budget = self._budgets.setdefault(key, RateLimitBudget())
+        for attempt in range(1, self.max_attempts + 1):
+            await self._acquire(key, budget, priority)
+            self._stats["requests"] += 1
+            try:
+                response = await send()
+            finally:
+                budget.in_flight -= 1
+            limited = self._update(key, budget, response)
+            self._wake(key, budget)
+            if not limited or attempt == self.max_attempts:
+                return response
+            self._stats["retried"] += 1
+        return response
+
+    def promote(self, token: Optional[str], priority: PriorityHolder, new_priority: Priority):
+        """Raise the priority of queued work (an interactive caller joined a background refresh)"""
+        if new_priority >= priority.priority:
+            return
+        priority.priority = new_priority
+        budget = self._budgets.get(_token_key(token))
+        if budget is None or not budget.waiters:
+            return
+        budget.waiters = [
+            (holder.priority, sequence, holder, future) for _, sequence, holder, future in budget.waiters
+        ]
+        heapq.heapify(budget.waiters)
+        self._wake(_token_key(token), budget)
+
+    def retry_after(self, token: Optional[str]) -> float:
+        """Seconds until requests with token can be sent again"""
+        budget = self._budgets.get(_token_key(token))
+        if budget is None:
+            return 0.0
+        return max(0.0, self._resume_at(budget) - time.time())
+
+    def get_stats(self) -> Dict:
+        """Budget and queue depth per token (tokens are identified by a hash prefix)"""
+        now = time.time()
+        return {
+            "budgets": {
+                key: {
+                    "limit": budget.limit,
+                    "remaining": budget.remaining,
+                    "reset_in_seconds": max(0, round(budget.reset_at - now)) if budget.reset_at else None,
+                    "blocked_for_seconds": max(0, round(budget.blocked_until - now)),
+                    "in_flight": budget.in_flight,
+                    "queued_interactive": sum(1 for waiter in budget.waiters if waiter[0] == Priority.INTERACTIVE),
+                    "queued_background": sum(1 for waiter in budget.waiters if waiter[0] == Priority.BACKGROUND),
+                }
+                for key, budget in self._budgets.items()
+            },
+            "queued": sum(len(budget.waiters) for budget in self._budgets.values()),
+            **self._stats,
+        }
+
+    async def _acquire(self, key: str, budget: RateLimitBudget, priority: PriorityHolder):
+        ahead = budget.waiters and budget.waiters[0][0] <= priority.priority
+        if not ahead and self._can_start(budget, priority.priority):
+            budget.in_flight += 1
+            return
+
+        self._stats["delayed"] += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(budget.waiters, (priority.priority, next(self._sequence), priority, future))
+        self._wake(key, budget)
+        timeout = self.max_wait_seconds if priority.priority == Priority.INTERACTIVE else None
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._withdraw(key, budget, future)
+                self._stats["wait_timeouts"] += 1
+                raise RateLimitWaitTimeout(self._resume_at(budget) - time.time())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                budget.in_flight -= 1  # Granted while being cancelled; give the slot back
+                self._wake(key, budget)
+            else:
+                self._withdraw(key, budget, future)
+            raise
+        # Granted: _wake counted the request in flight
+
+    def _withdraw(self, key: str, budget: RateLimitBudget, future: asyncio.Future):
+        """Take a request that gave up waiting out of the queue"""
+        future.cancel()
+        budget.waiters = [waiter for waiter in budget.waiters if waiter[3] is not future]
+        heapq.heapify(budget.waiters)
+        self._wake(key, budget)
+
+    def _can_start(self, budget: RateLimitBudget, priority: Priority) -> bool:
+        now = time.time()
+        if now < budget.blocked_until:
+            return False
+        if budget.remaining is None:
+            return True
+        if budget.reset_at and now >= budget.reset_at and budget.limit is not None:
+            budget.remaining = budget.limit  # The window has reset; the next response corrects it
+            budget.reset_at = 0.0
+        reserve = 0
+        if priority != Priority.INTERACTIVE and budget.limit:
+            reserve = math.ceil(budget.limit * self.interactive_reserve_ratio)
+        return budget.remaining - budget.in_flight > reserve
+
+    def _wake(self, key: str, budget: RateLimitBudget):
+        """Start queued requests in priority order while the budget allows"""
+        while budget.waiters:
+            _, _, holder, future = budget.waiters[0]
+            if future.done():
+                heapq.heappop(budget.waiters)  # Timed out or cancelled
+                continue
+            if not self._can_start(budget, holder.priority):
+                break
+            heapq.heappop(budget.waiters)
+            budget.in_flight += 1
+            future.set_result(None)
+
+        if budget.timer is not None:
+            budget.timer.cancel()
+            budget.timer = None
+        if budget.waiters:
+            delay = max(0.0, self._resume_at(budget) - time.time())
+            budget.timer = asyncio.get_running_loop().call_later(delay + 0.05, self._wake, key, budget)
+
+    @staticmethod
+    def _resume_at(budget: RateLimitBudget) -> float:
+        """When queued requests can go again (epoch seconds)"""
+        if budget.blocked_until > time.time():
+            return budget.blocked_until
+        if budget.reset_at:
+            return budget.reset_at
+        return time.time() + 1
+
+    def _update(self, key: str, budget: RateLimitBudget, response: httpx.Response) -> bool:
+        """Take the budget from the response headers; True if the request was rate limited"""
+        headers = response.headers
+        if all(name in headers for name in ("x-ratelimit-limit", "x-ratelimit-remaining", "x-ratelimit-reset")):
+            try:
+                limit = int(headers["x-ratelimit-limit"])
+                remaining = int(headers["x-ratelimit-remaining"])
+                reset_at = float(headers["x-ratelimit-reset"])
+            except ValueError:
+                pass
+            else:
+                if reset_at == budget.reset_at and budget.remaining is not None:
+                    # Same window: responses can arrive out of order, the budget only goes down
+                    remaining = min(remaining, budget.remaining)
+                budget.limit, budget.remaining, budget.reset_at = limit, remaining, reset_at
+
+        if response.status_code not in (403, 429):
+            return False
+        retry_after = headers.get("retry-after")
+        if retry_after is None and budget.remaining != 0:
+            return False  # A permission error, not a rate limit
+        self._stats["rate_limited_responses"] += 1
+        if retry_after is not None:
+            try:
+                budget.blocked_until = time.time() + float(retry_after)
+            except ValueError:
+                budget.blocked_until = time.time() + 60
+        app_logger.warning(
+            f"GitHub rate limit hit for {key} (remaining: {budget.remaining}, "
+            f"resume in {round(self._resume_at(budget) - time.time())}s)"
+        )
+        return True
+
+
+def _token_key(token: Optional[str]) -> str:
+    if not token:
+        return "anonymous"
+    return f"token-{hashlib.sha256(token.encode()).hexdigest()[:8]}"
+
+
+github_rate_limiter = GitHubRateLimiter(
+    interactive_reserve_ratio=GITHUB_RATE_LIMIT_INTERACTIVE_RESERVE_RATIO,
+    max_wait_seconds=GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS,
+    max_attempts=GITHUB_RATE_LIMIT_MAX_ATTEMPTS,
+)
@@ -0,0 +1,406 @@
+"""
+GitHub release cache
+Caches the release list of each owner/repo and revalidates it with ETag / If-None-Match
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from http_client import OutboundHTTPClient, http_client
+from github_rate_limit import GitHubRateLimiter, Priority, PriorityHolder, RateLimitWaitTimeout, github_rate_limiter
+from logging_config import app_logger
+from config import (
+    GITHUB_API_BASE_URL, GITHUB_API_TIMEOUT_SECONDS,
+    GITHUB_RELEASES_CACHE_TTL_SECONDS, GITHUB_RELEASES_STALE_SECONDS,
+    GITHUB_RELEASES_PER_PAGE, GITHUB_RELEASES_MAX_PAGES, GITHUB_RELEASES_PAGE_CONCURRENCY,
+    GITHUB_RELEASES_FULL_REVALIDATE_SECONDS
+)
+
+
+class GitHubAPIError(Exception):
+    """
+    A GitHub request failed; status_code is the HTTP status to report to the client
+    retry_after is set (seconds) when the request was refused because of the rate limit
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class CachedReleases:
+    """Release list of one repository as last returned by GitHub"""
+    releases: List[dict]
+    pages: List[List[dict]]  # The same releases, page by page
+    etags: List[Optional[str]]  # ETag of each page
+    fetched_at: float  # time.monotonic() of the last 200 or 304
+    pages_checked_at: float  # time.monotonic() when every page was last revalidated
+    complete: bool = True  # False when the list was cut at max_pages
+
+
+class GitHubReleaseCache:
+    """
+    Release lists keyed by owner/repo.
+    - Younger than ttl_seconds: served from memory (hit)
+    - Older, but within stale_seconds after that: served from memory while one
+      background request revalidates it (stale)
+    - Otherwise, or not cached: fetched before responding (miss)
+    Every page of the list is read (per_page releases each, up to max_pages).
+    Revalidation sends If-None-Match, so an unchanged list costs a 304 without a body,
+    which GitHub does not count against the rate limit. Usually only the first page is
+    revalidated; every page is, with its own ETag, once full_revalidate_seconds have passed
+    since they were last checked, so edits to older releases show up within that time.
+    Concurrent requests for the same repository share one GitHub request,
+    and all requests go through the shared outbound HTTP client and the rate limit
+    scheduler; revalidations of stale entries run at background priority.
+    """
+
+    def __init__(
+        self,
+        client: OutboundHTTPClient,
+        base_url: str,
+        ttl_seconds: float,
+        stale_seconds: float,
+        timeout_seconds: float,
+        per_page: int = 100,
+        max_pages: int = 20,
+        page_concurrency: int = 4,
+        full_revalidate_seconds: float = 600,
+        rate_limiter: GitHubRateLimiter = github_rate_limiter,
+    ):
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.base_url = base_url.rstrip("/")
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.timeout_seconds = timeout_seconds
+        self.per_page = per_page
+        self.max_pages = max_pages
+        self.page_concurrency = page_concurrency
+        self.full_revalidate_seconds = full_revalidate_seconds
+        self._entries: Dict[Tuple[str, str], CachedReleases] = {}
+        self._refreshes: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._priorities: Dict[Tuple[str, str], PriorityHolder] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "requests": 0,
+            "not_modified": 0,
+            "pages_fetched": 0,
+            "pages_not_modified": 0,
+            "truncated": 0,
+            "errors": 0,
+        }
+
+    async def get_releases(
+        self,
+        owner: str,
+        repo: str,
+        token: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> List[dict]:
+        """Release list of owner/repo (raw GitHub release objects, newest first)"""
+        key = (owner.lower(), repo.lower())
+        entry = self._cached(key, owner, repo, token)
+        if entry is None:
+            self._stats["misses"] += 1
+            entry = await asyncio.shield(self._start_refresh(key, owner, repo, token, priority=priority))
+        return entry.releases
+
+    async def refresh_releases(
+        self,
+        owner: str,
+        repo: str,
+        token: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> CachedReleases:
+        """
+        Release list of owner/repo revalidated with GitHub now, whatever the age of the cached copy
+        Check `complete` before treating a release missing from the list as deleted.
+        """
+        key = (owner.lower(), repo.lower())
+        return await asyncio.shield(self._start_refresh(key, owner, repo, token, priority=priority))
+
+    async def stream_releases(self, owner: str, repo: str, token: Optional[str] = None) -> AsyncIterator[List[dict]]:
+        """
+        Release list of owner/repo as a sequence of pages.
+        On a miss, pages are yielded as their requests complete (not in page order);
+        cached lists, and fetches already started by another caller, come as one page.
+        """
+        key = (owner.lower(), repo.lower())
+        entry = self._cached(key, owner, repo, token)
+        if entry is not None:
+            yield entry.releases
+            return
+
+        self._stats["misses"] += 1
+        task = self._refreshes.get(key)
+        if task is not None:
+            self.rate_limiter.promote(token, self._priorities[key], Priority.INTERACTIVE)
+            entry = await asyncio.shield(task)
+            yield entry.releases
+            return
+
+        pages: asyncio.Queue = asyncio.Queue()
+        task = self._start_refresh(key, owner, repo, token, on_page=pages.put_nowait)
+        task.add_done_callback(lambda _: pages.put_nowait(None))
+        while True:
+            page = await pages.get()
+            if page is None:
+                break
+            yield page
+        task.result()  # Raises the GitHubAPIError of a failed page
+
+    async def close(self):
+        """Cancel background revalidations"""
+        tasks = list(self._refreshes.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refreshes.clear()
+
+    def get_stats(self) -> Dict:
+        """Get cache metrics"""
+        return {
+            "repositories": len(self._entries),
+            "refreshing": len(self._refreshes),
+            **self._stats,
+        }
+
+    def _cached(self, key: Tuple[str, str], owner: str, repo: str, token: Optional[str]) -> Optional[CachedReleases]:
+        """Cached entry if it can be served, starting a revalidation when it is stale"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry.fetched_at
+        if age < self.ttl_seconds:
+            self._stats["hits"] += 1
+            return entry
+        if age < self.ttl_seconds + self.stale_seconds:
+            self._stats["stale"] += 1
+            self._start_refresh(key, owner, repo, token, priority=Priority.BACKGROUND)
+            return entry
+        return None
+
+    def _start_refresh(
+        self,
+        key: Tuple[str, str],
+        owner: str,
+        repo: str,
+        token: Optional[str],
+        on_page: Optional[Callable[[List[dict]], None]] = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> asyncio.Task:
+        """
+        Fetch owner/repo in a task, or return the fetch already in flight
+        Joining a fetch raises its priority to the caller's if that is more urgent.
+        """
+        task = self._refreshes.get(key)
+        if task is None:
+            holder = self._priorities[key] = PriorityHolder(priority)
+            task = asyncio.create_task(
+                self._refresh(key, owner, repo, token, holder, on_page),
+                name=f"github-releases-{owner}/{repo}",
+            )
+            self._refreshes[key] = task
+            task.add_done_callback(lambda done: self._on_refresh_done(key, done))
+        else:
+            self.rate_limiter.promote(token, self._priorities[key], priority)
+        return task
+
+    def _on_refresh_done(self, key: Tuple[str, str], task: asyncio.Task):
+        if self._refreshes.get(key) is task:
+            del self._refreshes[key]
+            del self._priorities[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here so background failures are not reported as never-retrieved
+            app_logger.warning(f"GitHub release refresh for {key[0]}/{key[1]} failed: {task.exception()}")
+
+    async def _refresh(
+        self,
+        key: Tuple[str, str],
+        owner: str,
+        repo: str,
+        token: Optional[str],
+        priority: PriorityHolder,
+        on_page: Optional[Callable[[List[dict]], None]] = None,
+    ) -> CachedReleases:
+        """
+        Fetch every page of the release list.
+        GitHub lists releases newest first, so a new release always changes page 1: while
+        page 1 is unchanged and the other pages were checked within full_revalidate_seconds,
+        the cached list is kept. Otherwise the remaining pages are fetched concurrently, each
+        revalidated with its own ETag when it is cached, once the Link header of page 1 (or
+        the cached page count) tells how many there are.
+        """
+        entry = self._entries.get(key)
+        url = f"{self.base_url}/repos/{owner}/{repo}/releases"
+        headers = {"Accept": "application/vnd.github+json"}
+        if token:
+            headers["Authorization"] = f"token {token}"
+
+        def conditional(page: int) -> Dict[str, str]:
+            if entry is None or page > len(entry.etags) or not entry.etags[page - 1]:
+                return headers
+            return {**headers, "If-None-Match": entry.etags[page - 1]}
+
+        response = await self._get_page(key, url, conditional(1), 1, token, priority)
+
+        if response.status_code == 304 and entry is not None:
+            if time.monotonic() - entry.pages_checked_at < self.full_revalidate_seconds:
+                self._stats["not_modified"] += 1
+                entry.fetched_at = time.monotonic()
+                if on_page:
+                    on_page(entry.releases)
+                return entry
+            pages = {1: entry.pages[0]}
+            etags = {1: entry.etags[0]}
+            last_page = len(entry.pages)
+            complete = entry.complete
+        else:
+            pages = {1: response.json()}
+            etags = {1: response.headers.get("etag")}
+            last_page = _last_page(response)
+            complete = True
+        if on_page:
+            on_page(pages[1])
+
+        if last_page > self.max_pages:
+            app_logger.warning(f"{owner}/{repo} has {last_page} release pages; reading the first {self.max_pages}")
+            self._stats["truncated"] += 1
+            last_page = self.max_pages
+            complete = False
+
+        if last_page > 1:
+            slots = asyncio.Semaphore(self.page_concurrency)
+            reported_last_page = 1
+
+            async def fetch_page(page: int):
+                nonlocal reported_last_page
+                async with slots:
+                    page_response = await self._get_page(key, url, conditional(page), page, token, priority)
+                if page_response.status_code == 304:
+                    self._stats["pages_not_modified"] += 1
+                    pages[page] = entry.pages[page - 1]
+                    etags[page] = entry.etags[page - 1]
+                else:
+                    pages[page] = page_response.json()
+                    etags[page] = page_response.headers.get("etag")
+                    reported_last_page = max(reported_last_page, _last_page(page_response))
+                if on_page:
+                    on_page(pages[page])
+
+            await self._fetch_pages([fetch_page(page) for page in range(2, last_page + 1)])
+            # Pages can only grow without changing page 1 when an older release is added
+            if reported_last_page > last_page and last_page < self.max_pages:
+                extra_pages = range(last_page + 1, min(reported_last_page, self.max_pages) + 1)
+                await self._fetch_pages([fetch_page(page) for page in extra_pages])
+            if reported_last_page > 1:
+                # A changed page links to the true last page
+                complete = reported_last_page <= self.max_pages
+
+        # Deleted releases can leave the former last pages empty
+        numbers = sorted(pages)
+        while len(numbers) > 1 and not pages[numbers[-1]]:
+            numbers.pop()
+        now = time.monotonic()
+        entry = CachedReleases(
+            releases=[release for page in numbers for release in pages[page]],
+            pages=[pages[page] for page in numbers],
+            etags=[etags[page] for page in numbers],
+            fetched_at=now,
+            pages_checked_at=now,
+            complete=complete,
+        )
+        self._entries[key] = entry
+        return entry
+
+    async def _fetch_pages(self, fetches: List):
+        """Run page fetches concurrently; if one fails the others are cancelled"""
+        tasks = [asyncio.create_task(fetch) for fetch in fetches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        self._stats["pages_fetched"] += len(tasks)
+
+    async def _get_page(
+        self,
+        key: Tuple[str, str],
+        url: str,
+        headers: Dict[str, str],
+        page: int,
+        token: Optional[str],
+        priority: PriorityHolder,
+    ) -> httpx.Response:
+        """GET one page of the release list, raising GitHubAPIError for failures (304 is returned)"""
+        self._stats["requests"] += 1
+        try:
+            response = await self.rate_limiter.run(token, priority, lambda: self.client.get(
+                url,
+                params={"per_page": self.per_page, "page": page},
+                headers=headers,
+                timeout=self.timeout_seconds,
+            ))
+        except RateLimitWaitTimeout as e:
+            self._stats["errors"] += 1
+            raise GitHubAPIError(503, str(e), retry_after=e.retry_after)
+        except httpx.TimeoutException:
+            self._stats["errors"] += 1
+            raise GitHubAPIError(504, "GitHub API request timeout")
+        except httpx.RequestError as e:
+            self._stats["errors"] += 1
+            raise GitHubAPIError(503, f"Failed to connect to GitHub API: {str(e)}")
+
+        if response.status_code == 304 or response.is_success:
+            return response
+
+        self._stats["errors"] += 1
+        if response.status_code == 404:
+            self._entries.pop(key, None)
+            raise GitHubAPIError(404, "GitHub repository not found")
+        if response.status_code == 401:
+            raise GitHubAPIError(401, "GitHub authentication failed. Please check your GitHub token.")
+        if response.status_code in (403, 429) and (
+            response.headers.get("x-ratelimit-remaining") == "0" or "retry-after" in response.headers
+        ):
+            # Still limited after the scheduler's retries
+            raise GitHubAPIError(503, "GitHub API rate limit exceeded", retry_after=self.rate_limiter.retry_after(token))
+        raise GitHubAPIError(response.status_code, f"Failed to fetch GitHub releases: {response.text}")
+
+
+def _last_page(response: httpx.Response) -> int:
+    """Page number of the rel="last" link, 1 when the list fits on one page"""
+    last = response.links.get("last")
+    if not last:
+        return 1
+    page = parse_qs(urlsplit(last.get("url", "")).query).get("page")
+    try:
+        return int(page[0]) if page else 1
+    except ValueError:
+        return 1
+
+
+github_release_cache = GitHubReleaseCache(
+    client=http_client,
+    base_url=GITHUB_API_BASE_URL,
+    ttl_seconds=GITHUB_RELEASES_CACHE_TTL_SECONDS,
+    stale_seconds=GITHUB_RELEASES_STALE_SECONDS,
+    timeout_seconds=GITHUB_API_TIMEOUT_SECONDS,
+    per_page=GITHUB_RELEASES_PER_PAGE,
+    max_pages=GITHUB_RELEASES_MAX_PAGES,
+    page_concurrency=GITHUB_RELEASES_PAGE_CONCURRENCY,
+    full_revalidate_seconds=GITHUB_RELEASES_FULL_REVALIDATE_SECONDS,
+)
@@ -0,0 +1,214 @@
+"""
+Write-behind heartbeat buffer
+Records agent heartbeats in memory and flushes them to the agents table in bulk
+"""
+
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import update, bindparam
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from background import PeriodicTask
+from database import AsyncSessionLocal
+from db_models import AgentDB, AgentStatusEnum
+from logging_config import app_logger
+from config import HEARTBEAT_INGEST_MODE, HEARTBEAT_FLUSH_INTERVAL_SECONDS
+
+
+@dataclass
+class AgentFields:
+    """Heartbeat-controlled agent fields as last written to the database"""
+    platform: str
+    version: str
+    ip_address: Optional[str]
+
+
+@dataclass
+class BufferedHeartbeat:
+    """Latest heartbeat received for an agent that has not been flushed yet"""
+    id: str
+    name: str
+    platform: str
+    version: str
+    ip_address: Optional[str]
+    last_seen: datetime
+    received_at: float  # time.monotonic() of the first unflushed heartbeat
+
+
+class HeartbeatBuffer:
+    """
+    Coalesces heartbeats per agent and writes them with one bulk UPDATE per flush.
+    Only agents already known to the buffer are handled here; the first heartbeat
+    of an agent goes through the regular database path and is then remembered.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        flush_interval_seconds: float,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+    ):
+        self.enabled = enabled
+        self.session_factory = session_factory
+        self._ids_by_name: Dict[str, str] = {}
+        self._flushed: Dict[str, AgentFields] = {}
+        self._pending: Dict[str, BufferedHeartbeat] = {}
+        self._task = PeriodicTask("heartbeat-flush", flush_interval_seconds, self.flush)
+        self._stats = {
+            "heartbeats_received": 0,  # Every heartbeat, buffered or written directly
+            "heartbeats_buffered": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "field_writes_skipped": 0,
+            "flush_errors": 0,
+            "last_flush_at": None,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_lag_seconds": 0.0,
+            "max_flush_lag_seconds": 0.0,
+            "last_flush_duration_seconds": 0.0,
+        }
+
+    def remember(self, agent_db: AgentDB):
+        """Cache an agent row so its following heartbeats can be buffered"""
+        if not self.enabled:
+            return
+        self._ids_by_name[agent_db.name] = agent_db.id
+        self._flushed[agent_db.id] = AgentFields(
+            platform=agent_db.platform,
+            version=agent_db.version,
+            ip_address=agent_db.ip_address,
+        )
+
+    def forget(self, agent_id: str):
+        """Drop an agent from the buffer (after delete or rename)"""
+        self._pending.pop(agent_id, None)
+        self._flushed.pop(agent_id, None)
+        for name, cached_id in list(self._ids_by_name.items()):
+            if cached_id == agent_id:
+                del self._ids_by_name[name]
+
+    def record(self, name: str, platform: str, version: str, ip_address: Optional[str]) -> Optional[BufferedHeartbeat]:
+        """
+        Buffer a heartbeat for a known agent
+        Returns None if the agent is unknown and must be registered through the database
+        """
+        self._stats["heartbeats_received"] += 1
+        if not self.enabled:
+            return None
+        agent_id = self._ids_by_name.get(name)
+        if agent_id is None:
+            return None
+
+        previous = self._pending.get(agent_id)
+        heartbeat = BufferedHeartbeat(
+            id=agent_id,
+            name=name,
+            platform=platform,
+            version=version,
+            ip_address=ip_address,
+            last_seen=datetime.now(),
+            received_at=previous.received_at if previous else time.monotonic(),
+        )
+        self._pending[agent_id] = heartbeat
+        self._stats["heartbeats_buffered"] += 1
+        return heartbeat
+
+    async def flush(self):
+        """Write all buffered heartbeats to the database"""
+        if not self._pending:
+            return
+
+        # Swap the buffer before awaiting so new heartbeats go into a fresh dict
+        batch, self._pending = self._pending, {}
+        started = time.monotonic()
+        oldest = min(heartbeat.received_at for heartbeat in batch.values())
+
+        # Group rows by the set of changed columns so each group is one executemany UPDATE
+        groups: Dict[tuple, list] = {}
+        skipped = 0
+        for heartbeat in batch.values():
+            row = {
+                "b_id": heartbeat.id,
+                "b_last_seen": heartbeat.last_seen,
+                "b_status": AgentStatusEnum.ONLINE,
+            }
+            flushed = self._flushed.get(heartbeat.id)
+            for field in ("platform", "version", "ip_address"):
+                value = getattr(heartbeat, field)
+                if flushed is not None and getattr(flushed, field) == value:
+                    skipped += 1
+                else:
+                    row[f"b_{field}"] = value
+            groups.setdefault(tuple(row.keys()), []).append(row)
+        row_count = len(batch)
+
+        try:
+            async with self.session_factory() as session:
+                table = AgentDB.__table__
+                for keys, rows in groups.items():
+                    stmt = (
+                        update(table)
+                        .where(table.c.id == bindparam("b_id"))
+                        .values({key[2:]: bindparam(key) for key in keys if key != "b_id"})
+                    )
+                    # Rows of agents deleted in the meantime simply match nothing
+                    await session.execute(stmt, rows)
+                await session.commit()
+        except Exception:
+            # Put the batch back unless a newer heartbeat already replaced it
+            for agent_id, heartbeat in batch.items():
+                self._pending.setdefault(agent_id, heartbeat)
+            self._stats["flush_errors"] += 1
+            app_logger.exception(f"Heartbeat flush failed ({row_count} agents)")
+            return
+
+        for heartbeat in batch.values():
+            if heartbeat.id in self._flushed:
+                self._flushed[heartbeat.id] = AgentFields(
+                    platform=heartbeat.platform,
+                    version=heartbeat.version,
+                    ip_address=heartbeat.ip_address,
+                )
+
+        finished = time.monotonic()
+        lag = finished - oldest
+        self._stats["flushes"] += 1
+        self._stats["rows_written"] += row_count
+        self._stats["field_writes_skipped"] += skipped
+        self._stats["last_flush_at"] = datetime.now().isoformat()
+        self._stats["last_batch_size"] = row_count
+        self._stats["max_batch_size"] = max(self._stats["max_batch_size"], row_count)
+        self._stats["last_flush_lag_seconds"] = lag
+        self._stats["max_flush_lag_seconds"] = max(self._stats["max_flush_lag_seconds"], lag)
+        self._stats["last_flush_duration_seconds"] = finished - started
+
+    def start(self):
+        """Start the periodic flush loop"""
+        if self.enabled:
+            self._task.start()
+
+    async def stop(self):
+        """Stop the flush loop and write any remaining heartbeats"""
+        await self._task.stop()
+        if self.enabled:
+            await self.flush()
+
+    def get_stats(self) -> Dict:
+        """Get buffer metrics"""
+        return {
+            "mode": "buffered" if self.enabled else "direct",
+            "flush_interval_seconds": self._task.interval_seconds,
+            "known_agents": len(self._ids_by_name),
+            "pending": len(self._pending),
+            **self._stats,
+        }
+
+
+heartbeat_buffer = HeartbeatBuffer(
+    enabled=HEARTBEAT_INGEST_MODE == "buffered",
+    flush_interval_seconds=HEARTBEAT_FLUSH_INTERVAL_SECONDS,
+)
@@ -0,0 +1,155 @@
+"""
+Shared outbound HTTP client
+One application-scoped httpx client so outbound calls (GitHub) reuse connections and TLS sessions
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from logging_config import app_logger
+from config import (
+    OUTBOUND_HTTP_MAX_CONNECTIONS, OUTBOUND_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    OUTBOUND_HTTP_KEEPALIVE_EXPIRY_SECONDS, OUTBOUND_HTTP_MAX_CONNECTIONS_PER_HOST,
+    OUTBOUND_HTTP2, OUTBOUND_HTTP_TIMEOUT_SECONDS
+)
+
+try:
+    import h2  # noqa: F401  (installed by httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class OutboundHTTPClient:
+    """
+    Pooled httpx.AsyncClient created on startup and closed on shutdown.
+    httpx only caps connections globally, so requests also take a per-host
+    semaphore; one slow host cannot take every pooled connection.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry_seconds: float,
+        max_connections_per_host: int,
+        http2: bool,
+        timeout_seconds: float,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_seconds,
+        )
+        self.max_connections_per_host = max_connections_per_host
+        self.http2 = http2 and HTTP2_AVAILABLE
+        if http2 and not HTTP2_AVAILABLE:
+            app_logger.warning("HTTP/2 requested for outbound requests but 'h2' is not installed; using HTTP/1.1")
+        self.timeout_seconds = timeout_seconds
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._stats = {
+            "requests": 0,
+            "request_errors": 0,
+            "waited_for_host_slot": 0,
+        }
+
+    @property
+    def started(self) -> bool:
+        return self._client is not None
+
+    def start(self):
+        """Create the pooled client (no-op if already started)"""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            limits=self.limits,
+            http2=self.http2,
+            timeout=self.timeout_seconds,
+        )
+        app_logger.info(
+            f"Outbound HTTP client started (max connections: {self.limits.max_connections}, "
+            f"per host: {self.max_connections_per_host}, http2: {self.http2})"
+        )
+
+    async def close(self):
+        """Close pooled connections"""
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+        self._host_slots.clear()
+        app_logger.info("Outbound HTTP client closed")
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """GET through the shared pool"""
+        return await self.request("GET", url, **kwargs)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request through the shared pool, holding a slot of the target host"""
+        async with self._host_slot(url) as client:
+            return await client.request(method, url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streamed request (large downloads); the host slot is held until the body is consumed"""
+        async with self._host_slot(url) as client:
+            async with client.stream(method, url, **kwargs) as response:
+                yield response
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str) -> AsyncIterator[httpx.AsyncClient]:
+        if self._client is None:
+            raise RuntimeError("Outbound HTTP client is not started")
+        host = urlsplit(url).netloc
+        slots = self._host_slots.get(host)
+        if slots is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(self.max_connections_per_host)
+        if slots.locked():
+            self._stats["waited_for_host_slot"] += 1
+
+        async with slots:
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+            self._stats["requests"] += 1
+            try:
+                yield self._client
+            except httpx.RequestError:
+                self._stats["request_errors"] += 1
+                raise
+            finally:
+                self._in_flight[host] -= 1
+
+    def get_stats(self) -> Dict:
+        """Pool utilization for /api/health"""
+        stats = {
+            "started": self.started,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "max_connections_per_host": self.max_connections_per_host,
+            "in_flight": {host: count for host, count in self._in_flight.items() if count},
+            **self._stats,
+        }
+        # httpcore pool internals; reported when available, never required
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for connection in connections if connection.is_idle())
+            stats["active_connections"] = stats["connections"] - stats["idle_connections"]
+        return stats
+
+
+http_client = OutboundHTTPClient(
+    max_connections=OUTBOUND_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=OUTBOUND_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry_seconds=OUTBOUND_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    max_connections_per_host=OUTBOUND_HTTP_MAX_CONNECTIONS_PER_HOST,
+    http2=OUTBOUND_HTTP2,
+    timeout_seconds=OUTBOUND_HTTP_TIMEOUT_SECONDS,
+)
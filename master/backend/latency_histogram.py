@@ -0,0 +1,174 @@
+"""
+Latency histograms
+Fixed-memory, mergeable log-linear histograms (HDR histogram layout) for request latencies
+"""
+
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+# Values are recorded in microseconds. Each power of two is split into SUB_BUCKETS linear
+# buckets, so a quantile is off by at most 1 / SUB_BUCKETS (about 3%) of its value.
+# Values up to SUB_BUCKETS * 2 microseconds are exact.
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_VALUE_BITS = 36  # About 19 hours; larger values are counted in the last bucket
+BUCKET_COUNT = (MAX_VALUE_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+MAX_VALUE = (1 << MAX_VALUE_BITS) - 1
+
+DEFAULT_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99, "p999": 0.999}
+
+
+def _bucket_index(micros: int) -> int:
+    if micros < SUB_BUCKETS:
+        return micros
+    exponent = micros.bit_length() - SUB_BUCKET_BITS - 1
+    return (exponent + 1) * SUB_BUCKETS + (micros >> exponent) - SUB_BUCKETS
+
+
+def _bucket_bounds(index: int):
+    """Lowest and highest value (microseconds) counted in a bucket"""
+    if index < SUB_BUCKETS:
+        return index, index
+    exponent = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return mantissa << exponent, ((mantissa + 1) << exponent) - 1
+
+
+class LatencyHistogram:
+    """
+    Counts of latencies in BUCKET_COUNT log-linear buckets, plus exact count, sum, min and max.
+    - record() is O(1) and memory does not grow with the number of samples
+    - Quantiles cover every recorded sample; they are read with one pass over the buckets
+    - Histograms merge by adding bucket counts (all endpoints matching a pattern, all instances)
+    """
+
+    __slots__ = ("counts", "count", "sum_ms", "min_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * BUCKET_COUNT))
+        self.count = 0
+        self.sum_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms: Optional[float] = None
+
+    def record(self, elapsed_ms: float):
+        """Add one latency in milliseconds"""
+        micros = min(max(int(elapsed_ms * 1000), 0), MAX_VALUE)
+        self.counts[_bucket_index(micros)] += 1
+        self.count += 1
+        self.sum_ms += elapsed_ms
+        if self.min_ms is None or elapsed_ms < self.min_ms:
+            self.min_ms = elapsed_ms
+        if self.max_ms is None or elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+
+    def merge(self, other):
+        """Add the samples of another histogram (LatencyHistogram or SparseLatencyHistogram) to this one"""
+        if not other.count:
+            return
+        counts = self.counts
+        items = other.counts.items() if isinstance(other.counts, dict) else enumerate(other.counts)
+        for index, count in items:
+            if count:
+                counts[index] += count
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+        self.min_ms = other.min_ms if self.min_ms is None else min(self.min_ms, other.min_ms)
+        self.max_ms = other.max_ms if self.max_ms is None else max(self.max_ms, other.max_ms)
+
+    @classmethod
+    def merged(cls, histograms: Iterable) -> "LatencyHistogram":
+        total = cls()
+        for histogram in histograms:
+            total.merge(histogram)
+        return total
+
+    def quantiles(self, quantiles: Dict[str, float] = DEFAULT_QUANTILES) -> Dict[str, float]:
+        """Latency (ms) at each quantile: the midpoint of its bucket, clamped to min/max"""
+        if not self.count:
+            return {name: 0 for name in quantiles}
+        ranks = sorted((max(1, math.ceil(q * self.count)), name) for name, q in quantiles.items())
+        result = {}
+        position = 0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while position < len(ranks) and ranks[position][0] <= seen:
+                rank, name = ranks[position]
+                if rank == self.count:
+                    result[name] = self.max_ms  # The highest sample is known exactly
+                else:
+                    low, high = _bucket_bounds(index)
+                    result[name] = min(max((low + high) / 2000, self.min_ms), self.max_ms)
+                position += 1
+            if position == len(ranks):
+                break
+        return result
+
+    def cumulative_counts(self, bounds_ms: List[float]) -> List[int]:
+        """
+        Number of samples at or below each bound (ascending, ms), for fixed-bucket exports
+        A bucket counts towards a bound when its midpoint is at or below it.
+        """
+        limits = [bound * 1000 for bound in bounds_ms]
+        result = [0] * len(limits)
+        position = 0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            low, high = _bucket_bounds(index)
+            while position < len(limits) and (low + high) / 2 > limits[position]:
+                result[position] = seen
+                position += 1
+            if position == len(limits):
+                return result
+            seen += count
+        while position < len(limits):
+            result[position] = seen
+            position += 1
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        """mean, min, max and the default quantiles in milliseconds"""
+        return {
+            "mean": self.sum_ms / self.count if self.count else 0,
+            "min": self.min_ms or 0,
+            "max": self.max_ms or 0,
+            **self.quantiles(),
+        }
+
+
+class SparseLatencyHistogram:
+    """
+    LatencyHistogram buckets kept in a dict (bucket index -> count), for short time slices
+    that see few distinct latencies. Memory is bounded by BUCKET_COUNT entries but is usually
+    a handful; merge into a LatencyHistogram to read quantiles.
+    """
+
+    __slots__ = ("counts", "count", "sum_ms", "min_ms", "max_ms")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.clear()
+
+    def clear(self):
+        self.counts.clear()
+        self.count = 0
+        self.sum_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms: Optional[float] = None
+
+    def record(self, elapsed_ms: float):
+        """Add one latency in milliseconds"""
+        index = _bucket_index(min(max(int(elapsed_ms * 1000), 0), MAX_VALUE))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum_ms += elapsed_ms
+        if self.min_ms is None or elapsed_ms < self.min_ms:
+            self.min_ms = elapsed_ms
+        if self.max_ms is None or elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
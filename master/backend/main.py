@@ -6,22 +6,29 @@ FastAPI-based RESTful API server
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
 from pathlib import Path
-import time
 
 from database import init_db
-from logging_config import request_logger, app_logger
-from metrics_collector import MetricsCollectorMiddleware
+from logging_config import app_logger
+from request_instrumentation import RequestInstrumentationMiddleware
+from heartbeat_buffer import heartbeat_buffer
+from agent_sweeper import agent_sweeper
+from deployment_notifier import deployment_notifier
+from agent_connections import agent_channels
+from github_releases import github_release_cache
+from http_client import http_client
+from release_catalog import release_catalog
+from artifact_prefetch import artifact_prefetcher
+from artifact_delta import artifact_deltas
+from event_loop_monitor import event_loop_monitor
 from config import (
     APP_TITLE, APP_VERSION,
-    CORS_ORIGINS, CORS_ALLOW_CREDENTIALS, CORS_ALLOW_METHODS, CORS_ALLOW_HEADERS,
-    FRONTEND_DIST_PATHS
+    CORS_ORIGINS, CORS_ALLOW_CREDENTIALS, CORS_ALLOW_METHODS, CORS_ALLOW_HEADERS, CORS_EXPOSE_HEADERS,
+    FRONTEND_DIST_PATHS, REQUEST_METRICS_ENABLED, ACCESS_LOG_ENABLED
 )
 
 # Import routers
-from routers import agents, releases, deployments, settings, health
+from routers import agents, agent_channel, releases, deployments, artifacts, settings, health
 
 app = FastAPI(title=APP_TITLE, version=APP_VERSION)
 
@@ -32,37 +39,29 @@ async def startup_event():
     app_logger.info("Starting Master Agent Manager backend")
     await init_db()
     app_logger.info("Database initialized successfully")
+    heartbeat_buffer.start()
+    agent_sweeper.start()
+    http_client.start()
+    release_catalog.start()
+    artifact_prefetcher.start()
+    event_loop_monitor.start()
     app_logger.info("Monitoring system enabled - logs in ./logs/ directory")
 
 
-# Request logging middleware
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        path = request.url.path
-        method = request.method
-        
-        # Log request
-        request_logger.info(f"{method} {path} - Client: {request.client.host if request.client else 'unknown'}")
-        
-        try:
-            response = await call_next(request)
-            process_time = time.time() - start_time
-            
-            # Log response
-            request_logger.info(
-                f"{method} {path} - Status: {response.status_code} - "
-                f"Time: {process_time:.3f}s"
-            )
-            
-            return response
-        except Exception as e:
-            process_time = time.time() - start_time
-            request_logger.error(
-                f"{method} {path} - Error: {str(e)} - Time: {process_time:.3f}s",
-                exc_info=True
-            )
-            raise
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered state before the process exits"""
+    await event_loop_monitor.stop()
+    deployment_notifier.close()
+    await agent_channels.close_all()
+    await artifact_prefetcher.stop()
+    await artifact_deltas.close()
+    await release_catalog.stop()
+    await github_release_cache.close()
+    await http_client.close()
+    await agent_sweeper.stop()
+    await heartbeat_buffer.stop()
+    app_logger.info("Master Agent Manager backend stopped")
 
 
 # CORS configuration (for frontend connection)
@@ -72,13 +71,15 @@ app.add_middleware(
     allow_credentials=CORS_ALLOW_CREDENTIALS,
     allow_methods=CORS_ALLOW_METHODS,
     allow_headers=CORS_ALLOW_HEADERS,
+    expose_headers=CORS_EXPOSE_HEADERS,
 )
 
-# Metrics collection middleware (must be before request logging to capture all requests)
-app.add_middleware(MetricsCollectorMiddleware)
-
-# Request logging middleware (must be after CORS and metrics)
-app.add_middleware(RequestLoggingMiddleware)
+# Request timing, metrics and access log in one pass (outermost, so CORS preflights are counted)
+app.add_middleware(
+    RequestInstrumentationMiddleware,
+    metrics_enabled=REQUEST_METRICS_ENABLED,
+    access_log_enabled=ACCESS_LOG_ENABLED,
+)
 
 # Serve static files (frontend build)
 frontend_dist = None
@@ -100,8 +101,10 @@ async def root():
 
 # Include routers
 app.include_router(agents.router)
+app.include_router(agent_channel.router)
 app.include_router(releases.router)
 app.include_router(deployments.router)
+app.include_router(artifacts.router)
 app.include_router(settings.router)
 app.include_router(health.router)
 
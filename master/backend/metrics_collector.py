@@ -1,65 +1,75 @@
 """
-Metrics collection middleware
-Collects API metrics for monitoring
+Metrics collection
+Per-route request metrics for monitoring, recorded by RequestInstrumentationMiddleware
 """
 
 import time
 from datetime import datetime
 from typing import Dict
-from collections import defaultdict, deque
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from collections import defaultdict
+from starlette.types import Scope
 
-# Metrics storage (in-memory)
+from latency_histogram import LatencyHistogram
+from rolling_window import RequestWindows
+from top_k import TopK
+from config import METRICS_TOP_AGENTS
+
+# Requests that matched no route share one key, so unknown URLs cannot add keys
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Metrics storage (in-memory), keyed by "METHOD /route/{template}"
 request_counts: Dict[str, int] = defaultdict(int)
-response_times: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
+response_times: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)  # endpoint -> latency histogram (ms)
 error_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+agent_requests: Dict[str, TopK] = {}  # endpoint with an {agent_id} parameter -> busiest agents
+request_windows: Dict[str, RequestWindows] = defaultdict(RequestWindows)  # endpoint -> last minute / hour
 total_requests: int = 0
 start_time: datetime = datetime.now()
 
 
-class MetricsCollectorMiddleware(BaseHTTPMiddleware):
-    """Middleware to collect API metrics"""
+def route_template(scope: Scope) -> str:
+    """Path template of the route that handled a request (available once routing has run)"""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path_format", None):
+        return route.path_format
+    if scope.get("endpoint") is not None and scope.get("root_path"):
+        return f"{scope['root_path']}/{{path}}"  # Mounted app (static files)
+    return UNMATCHED_ROUTE
+
+
+def record_request(scope: Scope, status_code: int, elapsed_ms: float):
+    """Record one finished request; called by RequestInstrumentationMiddleware after routing"""
+    global total_requests
+    endpoint = f"{scope['method']} {route_template(scope)}"
+    
+    request_counts[endpoint] += 1
+    total_requests += 1
+    response_times[endpoint].record(elapsed_ms)
+    request_windows[endpoint].record(time.monotonic(), status_code, elapsed_ms)
+    
+    if status_code >= 400:
+        error_counts[endpoint][str(status_code)] += 1
     
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        method = request.method
-        endpoint = f"{method} {path}"
-        
-        start = time.time()
-        status_code = 200
-        
-        try:
-            response = await call_next(request)
-            status_code = response.status_code
-            return response
-        except Exception:
-            status_code = 500
-            raise
-        finally:
-            # Record metrics
-            elapsed_time = (time.time() - start) * 1000  # Convert to milliseconds
-            
-            # Update request count
-            request_counts[endpoint] += 1
-            global total_requests
-            total_requests += 1
-            
-            # Record response time
-            response_times[endpoint].append(elapsed_time)
-            
-            # Record error counts
-            if status_code >= 400:
-                error_counts[endpoint][str(status_code)] += 1
+    # Per-agent drill-down, bounded to the busiest agents
+    agent_id = scope.get("path_params", {}).get("agent_id")
+    if agent_id is not None:
+        top_agents = agent_requests.get(endpoint)
+        if top_agents is None:
+            top_agents = agent_requests[endpoint] = TopK(METRICS_TOP_AGENTS)
+        top_agents.add(agent_id)
 
 
 def get_metrics() -> Dict:
-    """Get current metrics (exported for monitoring module)"""
+    """
+    Get current metrics (exported for monitoring module)
+    Histograms are the live objects, not copies; read them without awaiting in between.
+    """
     return {
         'request_counts': dict(request_counts),
-        'response_times': {k: list(v) for k, v in response_times.items()},
+        'response_times': dict(response_times),
         'error_counts': {k: dict(v) for k, v in error_counts.items()},
+        'agent_requests': dict(agent_requests),
+        'request_windows': dict(request_windows),
         'total_requests': total_requests,
         'start_time': start_time
     }
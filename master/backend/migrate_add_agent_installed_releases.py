@@ -0,0 +1,90 @@
+"""
+Migration script to create and backfill agent_installed_releases
+The table holds the installed tag of every release per agent; it is filled from
+the history of successful deployments, newest completion winning
+"""
+import asyncio
+import json
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+
+def _as_list(value):
+    """JSON columns come back as text on SQLite and decoded on PostgreSQL"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value or []
+
+
+async def migrate():
+    """Create agent_installed_releases and backfill it from successful deployments"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        # Step 1: Create table and index
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS agent_installed_releases (
+                agent_id VARCHAR NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+                release_id VARCHAR NOT NULL REFERENCES releases(id) ON DELETE CASCADE,
+                tag VARCHAR NOT NULL,
+                deployment_id VARCHAR NOT NULL,
+                installed_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (agent_id, release_id)
+            )
+        """))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_installed_release_tag ON agent_installed_releases(release_id, tag)"
+        ))
+        print("✅ Table agent_installed_releases created")
+        
+        # Step 2: Replay successful deployments of existing agents, oldest first
+        result = await conn.execute(text("SELECT id FROM releases"))
+        release_ids = {row[0] for row in result.fetchall()}
+        
+        result = await conn.execute(text("""
+            SELECT d.id, d.agent_id, d.release_ids, d.release_tags, d.completed_at
+            FROM deployments d
+            JOIN agents a ON a.id = d.agent_id
+            WHERE d.status = 'SUCCESS' AND d.completed_at IS NOT NULL
+            ORDER BY d.completed_at ASC, d.id ASC
+        """))
+        installed = {}
+        for deployment_id, agent_id, deployment_release_ids, deployment_release_tags, completed_at in result.fetchall():
+            tags = _as_list(deployment_release_tags)
+            for index, release_id in enumerate(_as_list(deployment_release_ids)):
+                if release_id not in release_ids:
+                    continue
+                installed[(agent_id, release_id)] = {
+                    "agent_id": agent_id,
+                    "release_id": release_id,
+                    "tag": tags[index] if index < len(tags) else "",
+                    "deployment_id": deployment_id,
+                    "installed_at": completed_at,
+                }
+        
+        # Step 3: Upsert the latest install per (agent, release)
+        if installed:
+            await conn.execute(text("""
+                INSERT INTO agent_installed_releases (agent_id, release_id, tag, deployment_id, installed_at)
+                VALUES (:agent_id, :release_id, :tag, :deployment_id, :installed_at)
+                ON CONFLICT (agent_id, release_id) DO UPDATE SET
+                    tag = excluded.tag,
+                    deployment_id = excluded.deployment_id,
+                    installed_at = excluded.installed_at
+                WHERE excluded.installed_at >= agent_installed_releases.installed_at
+            """), list(installed.values()))
+        print(f"✅ Backfilled {len(installed)} installed release row(s)")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Create agent_installed_releases")
+    asyncio.run(migrate())
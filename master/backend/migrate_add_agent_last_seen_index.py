@@ -0,0 +1,31 @@
+"""
+Migration script to add an index on agents.last_seen
+The background offline sweeper filters agents by last_seen on every run
+"""
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+
+async def migrate():
+    """Create ix_agents_last_seen if it does not exist"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        # Both SQLite and PostgreSQL support CREATE INDEX IF NOT EXISTS
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_agents_last_seen ON agents(last_seen)"))
+        print("✅ Index ix_agents_last_seen created")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Add index on agents.last_seen")
+    asyncio.run(migrate())
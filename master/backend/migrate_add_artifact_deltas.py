@@ -0,0 +1,39 @@
+"""
+Migration script to create the artifact_deltas table
+Rows are added when an agent first asks for a delta between two artifacts
+"""
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+
+async def migrate():
+    """Create artifact_deltas"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS artifact_deltas (
+                base_sha256 VARCHAR NOT NULL,
+                target_sha256 VARCHAR NOT NULL,
+                delta_sha256 VARCHAR,
+                delta_size INTEGER,
+                created_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (base_sha256, target_sha256)
+            )
+        """))
+        print("✅ Table artifact_deltas created")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Create artifact_deltas")
+    asyncio.run(migrate())
@@ -0,0 +1,46 @@
+"""
+Migration script to create the artifacts table
+Rows are added when agents (or prefetching) first request a release asset
+"""
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+
+async def migrate():
+    """Create artifacts and its sha256 index"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                release_id VARCHAR NOT NULL REFERENCES releases(id) ON DELETE CASCADE,
+                tag VARCHAR NOT NULL,
+                asset_name VARCHAR NOT NULL,
+                sha256 VARCHAR NOT NULL,
+                size INTEGER NOT NULL,
+                content_type VARCHAR NOT NULL,
+                source_url VARCHAR NOT NULL,
+                source_updated_at VARCHAR,
+                fetched_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (release_id, tag, asset_name)
+            )
+        """))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_artifacts_sha256 ON artifacts(sha256)"
+        ))
+        print("✅ Table artifacts created")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Create artifacts")
+    asyncio.run(migrate())
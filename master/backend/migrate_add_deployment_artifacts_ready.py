@@ -0,0 +1,48 @@
+"""
+Migration script to add deployments.artifacts_ready
+Deployments wait with artifacts_ready = FALSE until the master has prefetched their release assets
+"""
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite+aiosqlite")
+
+
+async def migrate():
+    """Add the artifacts_ready column; existing deployments are ready"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        if IS_SQLITE:
+            result = await conn.execute(text("PRAGMA table_info(deployments)"))
+            has_column = any(row[1] == "artifacts_ready" for row in result.fetchall())
+        else:
+            result = await conn.execute(text("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'deployments' AND column_name = 'artifacts_ready'
+            """))
+            has_column = result.first() is not None
+        
+        if has_column:
+            print("Column deployments.artifacts_ready already exists")
+        else:
+            # Constant default: no table rewrite on either database
+            await conn.execute(text(
+                "ALTER TABLE deployments ADD COLUMN artifacts_ready BOOLEAN NOT NULL DEFAULT TRUE"
+            ))
+            print("✅ Column deployments.artifacts_ready added")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Add artifacts_ready to deployments")
+    asyncio.run(migrate())
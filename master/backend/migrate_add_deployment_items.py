@@ -0,0 +1,100 @@
+"""
+Migration script to create and backfill deployment_items
+Each deployment gets one row per (position, release, tag) so deployments can be
+filtered by release or tag through an index instead of decoding the JSON columns.
+The backfill runs in small batches, one transaction each, so the master can keep
+serving while it runs; re-running it skips rows that already exist
+"""
+import asyncio
+import json
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "500"))
+
+
+def _as_list(value):
+    """JSON columns come back as text on SQLite and decoded on PostgreSQL"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value or []
+
+
+async def migrate():
+    """Create deployment_items and backfill it from deployments.release_ids / release_tags"""
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    
+    async with engine.begin() as conn:
+        # Step 1: Create table and indexes
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS deployment_items (
+                deployment_id VARCHAR NOT NULL REFERENCES deployments(id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                release_id VARCHAR NOT NULL,
+                tag VARCHAR NOT NULL,
+                status VARCHAR(11) NOT NULL,
+                PRIMARY KEY (deployment_id, position)
+            )
+        """))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_deployment_item_release_tag ON deployment_items(release_id, tag)"
+        ))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_deployment_item_tag ON deployment_items(tag)"
+        ))
+        print("✅ Table deployment_items created")
+    
+    # Step 2: Backfill in batches, walking deployments by primary key
+    last_id = ""
+    total = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("""
+                SELECT id, release_ids, release_tags, status
+                FROM deployments
+                WHERE id > :last_id
+                ORDER BY id
+                LIMIT :batch_size
+            """), {"last_id": last_id, "batch_size": BATCH_SIZE})
+            batch = result.fetchall()
+            if not batch:
+                break
+            
+            items = []
+            for deployment_id, release_ids, release_tags, status in batch:
+                tags = _as_list(release_tags)
+                for index, release_id in enumerate(_as_list(release_ids)):
+                    items.append({
+                        "deployment_id": deployment_id,
+                        "position": index,
+                        "release_id": release_id,
+                        "tag": tags[index] if index < len(tags) else "",
+                        "status": status,
+                    })
+            
+            if items:
+                await conn.execute(text("""
+                    INSERT INTO deployment_items (deployment_id, position, release_id, tag, status)
+                    VALUES (:deployment_id, :position, :release_id, :tag, :status)
+                    ON CONFLICT (deployment_id, position) DO NOTHING
+                """), items)
+            
+            last_id = batch[-1][0]
+            total += len(items)
+            print(f"  ... {total} item(s) up to deployment {last_id}")
+    
+    print(f"✅ Backfilled {total} deployment item(s)")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Create deployment_items")
+    asyncio.run(migrate())
@@ -0,0 +1,49 @@
+"""
+Migration script to add deployments.rollout_id
+Deployments created by a fleet rollout are tagged with the rollout they belong to
+"""
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite+aiosqlite")
+
+
+async def migrate():
+    """Add the nullable rollout_id column and its index"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        if IS_SQLITE:
+            result = await conn.execute(text("PRAGMA table_info(deployments)"))
+            has_column = any(row[1] == "rollout_id" for row in result.fetchall())
+        else:
+            result = await conn.execute(text("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'deployments' AND column_name = 'rollout_id'
+            """))
+            has_column = result.first() is not None
+        
+        if has_column:
+            print("Column deployments.rollout_id already exists")
+        else:
+            # Nullable column without default: no table rewrite on either database
+            await conn.execute(text("ALTER TABLE deployments ADD COLUMN rollout_id VARCHAR"))
+            print("✅ Column deployments.rollout_id added")
+        
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_deployments_rollout_id ON deployments(rollout_id)"))
+        print("✅ Index ix_deployments_rollout_id created")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Add rollout_id to deployments")
+    asyncio.run(migrate())
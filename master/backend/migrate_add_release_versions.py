@@ -0,0 +1,44 @@
+"""
+Migration script to create release_versions
+The table is filled by the release catalog sync when the master starts
+"""
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+
+async def migrate():
+    """Create release_versions and its index"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS release_versions (
+                release_id VARCHAR NOT NULL REFERENCES releases(id) ON DELETE CASCADE,
+                tag VARCHAR NOT NULL,
+                name VARCHAR NOT NULL,
+                published_at TIMESTAMP,
+                html_url VARCHAR NOT NULL,
+                assets JSON,
+                synced_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (release_id, tag)
+            )
+        """))
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_release_version_published ON release_versions(release_id, published_at)"
+        ))
+        print("✅ Table release_versions created (filled by the catalog sync on startup)")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Create release_versions")
+    asyncio.run(migrate())
@@ -0,0 +1,40 @@
+"""
+Migration script to rebuild the deployments indexes for keyset pagination
+Deployment lists are ordered by (created_at, id); the indexes gain a trailing id
+column so pages are read straight from the index without sorting
+"""
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+INDEXES = {
+    "idx_deployment_agent_status_created": "agent_id, status, created_at, id",
+    "idx_deployment_agent_created": "agent_id, created_at, id",
+    "idx_deployment_status": "status, created_at, id",
+    "idx_deployment_created_at": "created_at, id",
+}
+
+
+async def migrate():
+    """Drop and recreate the deployments indexes with their new columns"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        for name, columns in INDEXES.items():
+            await conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            await conn.execute(text(f"CREATE INDEX {name} ON deployments({columns})"))
+            print(f"✅ Index {name} created on ({columns})")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Rebuild deployments indexes for pagination")
+    asyncio.run(migrate())
@@ -0,0 +1,73 @@
+"""
+Migration script to make agents.name unique
+Deduplicates agents registered more than once under the same name, then replaces
+the plain ix_agents_name index with a unique one (required by the registration upsert)
+"""
+import asyncio
+import os
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "sqlite+aiosqlite:///./master.db"
+)
+
+# Survivor for a name: the most recently seen agent (id breaks ties)
+SURVIVOR_SUBQUERY = """
+    SELECT s.id FROM agents s
+    WHERE s.name = {name_expr}
+    ORDER BY s.last_seen DESC, s.id DESC
+    LIMIT 1
+"""
+
+
+async def migrate():
+    """Deduplicate agents by name and create a unique index on agents.name"""
+    engine = create_async_engine(DATABASE_URL, echo=True)
+    
+    async with engine.begin() as conn:
+        # Step 1: Report duplicates
+        result = await conn.execute(text("""
+            SELECT name, COUNT(*) FROM agents GROUP BY name HAVING COUNT(*) > 1
+        """))
+        duplicates = result.fetchall()
+        print(f"Found {len(duplicates)} agent name(s) with duplicate rows")
+        
+        # Step 2: Move deployments of duplicate agents to the surviving agent
+        survivor_for_deployment = SURVIVOR_SUBQUERY.format(
+            name_expr="(SELECT a.name FROM agents a WHERE a.id = deployments.agent_id)"
+        )
+        await conn.execute(text(f"""
+            UPDATE deployments
+            SET agent_id = ({survivor_for_deployment})
+            WHERE agent_id IN (
+                SELECT a.id FROM agents a
+                WHERE EXISTS (SELECT 1 FROM agents b WHERE b.name = a.name AND b.id <> a.id)
+            )
+        """))
+        
+        # Step 3: Delete all non-surviving duplicates
+        survivor_for_agent = SURVIVOR_SUBQUERY.format(name_expr="agents.name")
+        await conn.execute(text(f"""
+            DELETE FROM agents
+            WHERE id <> ({survivor_for_agent})
+        """))
+        
+        # Step 4: Replace the non-unique index with a unique one
+        await conn.execute(text("DROP INDEX IF EXISTS ix_agents_name"))
+        await conn.execute(text("CREATE UNIQUE INDEX ix_agents_name ON agents(name)"))
+        print("✅ Unique index ix_agents_name created")
+    
+    await engine.dispose()
+    print("Migration script completed successfully!")
+
+
+if __name__ == "__main__":
+    print("Starting migration: Make agents.name unique")
+    print("Duplicate agents will be merged into the most recently seen agent with the same name")
+    response = input("Continue? (yes/no): ")
+    if response.lower() == "yes":
+        asyncio.run(migrate())
+    else:
+        print("Migration cancelled")
@@ -4,7 +4,7 @@ Following Clean Architecture principles
 """
 
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -84,6 +84,8 @@ class Deployment(BaseModel):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
+    rollout_id: Optional[str] = None  # Set when created as part of a fleet rollout
+    artifacts_ready: bool = True  # False while the master prefetches the release assets
 
 
 class DeploymentCreate(BaseModel):
@@ -93,6 +95,52 @@ class DeploymentCreate(BaseModel):
     release_versions: Optional[List[str]] = None  # Selected version tags for each release (matches release_ids order)
 
 
+class RolloutTarget(BaseModel):
+    """Agent selector for a fleet rollout (all given criteria must match)"""
+    agent_ids: Optional[List[str]] = None  # Explicit agent list
+    platform: Optional[str] = None  # "windows" or "macos"
+    online_only: bool = False  # Only agents with a recent heartbeat
+
+
+class RolloutCreate(BaseModel):
+    """Fleet rollout request model (one deployment per matching agent)"""
+    target: RolloutTarget
+    release_ids: List[str]
+    release_versions: Optional[List[str]] = None  # Selected version tags for each release (matches release_ids order)
+
+
+class RolloutDeployment(BaseModel):
+    """Deployment created for one agent of a rollout"""
+    agent_id: str
+    agent_name: str
+    deployment_id: str
+
+
+class Rollout(BaseModel):
+    """Fleet rollout response model"""
+    rollout_id: str
+    release_ids: List[str]
+    release_tags: List[str]
+    created_at: datetime
+    deployments: List[RolloutDeployment]
+    missing_agent_ids: List[str] = []  # Explicitly requested agents that do not exist or do not match
+
+
+class AgentReleaseVersions(BaseModel):
+    """One row of the fleet version matrix"""
+    agent_id: str
+    agent_name: str
+    platform: str
+    status: AgentStatus
+    versions: Dict[str, str] = {}  # release_id -> installed tag
+
+
+class ReleaseMatrix(BaseModel):
+    """Fleet version matrix (agents x releases)"""
+    release_ids: List[str]
+    agents: List[AgentReleaseVersions]
+
+
 class DeploymentComplete(BaseModel):
     """Deployment completion request model"""
     status: DeploymentStatus  # SUCCESS or FAILED
@@ -108,3 +156,27 @@ class DeploymentHistory(BaseModel):
     status: DeploymentStatus
     timestamp: datetime
     error_message: Optional[str] = None
+
+
+class ArtifactPrefetchJob(BaseModel):
+    """Prefetch of one release asset into the artifact cache"""
+    release_id: str
+    tag: str
+    asset_name: str
+    status: str  # queued, downloading, ready or failed
+    size: Optional[int] = None  # Size listed in the release catalog
+    downloaded_bytes: int = 0
+    sha256: Optional[str] = None
+    error: Optional[str] = None
+    deployment_ids: List[str] = []  # Deployments that waited for this asset
+    queued_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class ArtifactPrefetchStatus(BaseModel):
+    """Prefetch queue state"""
+    workers: int
+    queued: int
+    downloading: int
+    waiting_deployment_ids: List[str]  # Deployments agents cannot claim yet
+    jobs: List[ArtifactPrefetchJob]
@@ -3,33 +3,35 @@ Monitoring and metrics collection for Master backend
 Simple metrics tracking for small-scale deployments (Agent < 50)
 """
 
-import time
 from datetime import datetime
-from typing import Dict, List, Optional
-from collections import defaultdict, deque
+from typing import Dict, Optional
 import logging
-from pathlib import Path
+import time
 
-# Metrics storage (in-memory for simplicity)
-request_counts: Dict[str, int] = defaultdict(int)  # endpoint -> count
-response_times: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))  # endpoint -> response times
-error_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))  # endpoint -> {status_code: count}
-total_requests: int = 0
-start_time: datetime = datetime.now()
+from metrics_collector import get_metrics as get_collected_metrics
+from rolling_window import window_span_seconds
+
+PENDING_DEPLOYMENTS_ENDPOINT = "GET /api/deployments/pending/{agent_id}"
 
 logger = logging.getLogger(__name__)
 
 
-# Note: Metrics collection is handled in main.py RequestLoggingMiddleware
+# Note: Metrics are recorded by request_instrumentation.RequestInstrumentationMiddleware
 # This module provides utility functions to read and aggregate metrics
 
 
-def get_metrics_summary() -> Dict:
-    """Get current metrics summary"""
+def get_metrics_summary(window: Optional[str] = None) -> Dict:
+    """
+    Get current metrics summary
+    - window: "1m", "5m" or "1h" (rolling_window.WINDOWS) for recent traffic only;
+      None for totals since process start
+    """
     collected = get_collected_metrics()
+    if window is not None:
+        return _get_window_summary(collected, window)
     
     request_counts = collected['request_counts']
-    response_times = {k: v for k, v in collected['response_times'].items()}
+    response_times = collected['response_times']
     error_counts = collected['error_counts']
     total_requests = collected['total_requests']
     start_time_obj = collected['start_time']
@@ -44,27 +46,15 @@ def get_metrics_summary() -> Dict:
     }
     
     for endpoint, count in request_counts.items():
-        times = response_times.get(endpoint, [])
+        histogram = response_times.get(endpoint)
         
-        if not times:
+        if histogram is None or not histogram.count:
             continue
         
-        sorted_times = sorted(times)
-        p50_idx = int(len(sorted_times) * 0.5)
-        p95_idx = int(len(sorted_times) * 0.95)
-        p99_idx = int(len(sorted_times) * 0.99)
-        
         summary["endpoints"][endpoint] = {
             "request_count": count,
             "rps": count / uptime if uptime > 0 else 0,
-            "response_time_ms": {
-                "mean": sum(times) / len(times),
-                "min": min(times),
-                "max": max(times),
-                "p50": sorted_times[p50_idx] if p50_idx < len(sorted_times) else sorted_times[-1],
-                "p95": sorted_times[p95_idx] if p95_idx < len(sorted_times) else sorted_times[-1],
-                "p99": sorted_times[p99_idx] if p99_idx < len(sorted_times) else sorted_times[-1],
-            },
+            "response_time_ms": histogram.summary(),
             "errors": error_counts.get(endpoint, {}),
             "error_rate": sum(error_counts.get(endpoint, {}).values()) / count if count > 0 else 0
         }
@@ -72,11 +62,46 @@ def get_metrics_summary() -> Dict:
     return summary
 
 
-def get_pending_deployment_metrics() -> Dict:
-    """Get specific metrics for /api/deployments/pending/{agent_id} endpoint"""
-    from collections import defaultdict
+def _get_window_summary(collected: Dict, window: str) -> Dict:
+    """Metrics summary of the last minute / 5 minutes / hour, in the same shape as the totals"""
+    uptime = (datetime.now() - collected['start_time']).total_seconds()
+    now = time.monotonic()
+    # A window cannot reach back further than the process start
+    span = min(window_span_seconds(window, now), uptime)
+    
+    summary = {
+        "uptime_seconds": uptime,
+        "window": window,
+        "window_seconds": span,
+        "total_requests": 0,
+        "requests_per_second": 0,
+        "endpoints": {}
+    }
+    
+    for endpoint, windows in collected['request_windows'].items():
+        count, errors, histogram = windows.totals(window, now)
+        if not count:
+            continue
+        
+        summary["total_requests"] += count
+        summary["endpoints"][endpoint] = {
+            "request_count": count,
+            "rps": count / span if span > 0 else 0,
+            "response_time_ms": histogram.summary(),
+            "errors": errors,
+            "error_rate": sum(errors.values()) / count
+        }
     
-    endpoint_pattern = "GET /api/deployments/pending/"
+    summary["requests_per_second"] = summary["total_requests"] / span if span > 0 else 0
+    return summary
+
+
+def get_pending_deployment_metrics(top_agents: int = 10) -> Dict:
+    """
+    Get specific metrics for /api/deployments/pending/{agent_id} endpoint
+    - top_agents: number of busiest agents to list (at most METRICS_TOP_AGENTS are tracked)
+    """
+    endpoint = PENDING_DEPLOYMENTS_ENDPOINT
     
     metrics = {
         "total_requests": 0,
@@ -85,52 +110,43 @@ def get_pending_deployment_metrics() -> Dict:
             "mean": 0,
             "p50": 0,
             "p95": 0,
-            "p99": 0
+            "p99": 0,
+            "p999": 0
         },
         "errors": {},
-        "error_rate": 0
+        "error_rate": 0,
+        "top_agents": []
     }
     
     collected = get_collected_metrics()
-    request_counts = collected['request_counts']
-    response_times = collected['response_times']
-    error_counts = collected['error_counts']
+    total_count = collected['request_counts'].get(endpoint, 0)
+    histogram = collected['response_times'].get(endpoint)
+    errors = collected['error_counts'].get(endpoint, {})
     start_time_obj = collected['start_time']
     
-    # Aggregate all pending deployment endpoint requests
-    pending_endpoints = [ep for ep in request_counts.keys() if endpoint_pattern in ep]
-    
-    if not pending_endpoints:
-        return metrics
-    
-    total_count = sum(request_counts[ep] for ep in pending_endpoints)
-    all_times = []
-    all_errors = defaultdict(int)
-    
-    for ep in pending_endpoints:
-        times = response_times.get(ep, [])
-        all_times.extend(times)
-        for status, count in error_counts.get(ep, {}).items():
-            all_errors[status] += count
-    
-    if not all_times:
+    if not total_count or histogram is None or not histogram.count:
         return metrics
     
     uptime = (datetime.now() - start_time_obj).total_seconds()
-    sorted_times = sorted(all_times)
-    p50_idx = int(len(sorted_times) * 0.5)
-    p95_idx = int(len(sorted_times) * 0.95)
-    p99_idx = int(len(sorted_times) * 0.99)
+    latency = histogram.summary()
     
     metrics["total_requests"] = total_count
     metrics["rps"] = total_count / uptime if uptime > 0 else 0
     metrics["response_time_ms"] = {
-        "mean": sum(all_times) / len(all_times),
-        "p50": sorted_times[p50_idx] if p50_idx < len(sorted_times) else sorted_times[-1],
-        "p95": sorted_times[p95_idx] if p95_idx < len(sorted_times) else sorted_times[-1],
-        "p99": sorted_times[p99_idx] if p99_idx < len(sorted_times) else sorted_times[-1],
+        "mean": latency["mean"],
+        "p50": latency["p50"],
+        "p95": latency["p95"],
+        "p99": latency["p99"],
+        "p999": latency["p999"],
     }
-    metrics["errors"] = dict(all_errors)
-    metrics["error_rate"] = sum(all_errors.values()) / total_count if total_count > 0 else 0
+    metrics["errors"] = dict(errors)
+    metrics["error_rate"] = sum(errors.values()) / total_count if total_count > 0 else 0
+    
+    agents = collected['agent_requests'].get(endpoint)
+    if agents is not None:
+        metrics["top_agents"] = [
+            {"agent_id": entry["key"], "requests": entry["count"], "error": entry["error"]}
+            for entry in agents.top(top_agents)
+        ]
     
     return metrics
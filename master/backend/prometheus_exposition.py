@@ -0,0 +1,136 @@
+"""
+Prometheus exposition
+Renders master metrics in the Prometheus text format (version 0.0.4) for GET /metrics
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from latency_histogram import LatencyHistogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Fixed bucket bounds so histograms of every instance can be summed by the scraper
+LATENCY_BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS_SECONDS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels)
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _bound_label(bound: float) -> str:
+    return repr(float(bound))
+
+
+def histogram_samples(
+    name: str,
+    labels: List[Tuple[str, str]],
+    histogram: LatencyHistogram,
+    bounds_seconds: Tuple[float, ...],
+) -> List[str]:
+    """_bucket, _sum and _count lines of one histogram (recorded in ms, exported in seconds)"""
+    cumulative = histogram.cumulative_counts([bound * 1000 for bound in bounds_seconds])
+    lines = [
+        f"{name}_bucket{format_labels(labels + [('le', _bound_label(bound))])} {count}"
+        for bound, count in zip(bounds_seconds, cumulative)
+    ]
+    lines.append(f"{name}_bucket{format_labels(labels + [('le', '+Inf')])} {histogram.count}")
+    lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram.sum_ms / 1000)}")
+    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    return lines
+
+
+class MetricFamily:
+    """Samples of one metric name with its HELP and TYPE header"""
+
+    def __init__(self, name: str, metric_type: str, help_text: str):
+        self.name = name
+        self.metric_type = metric_type
+        self.help_text = help_text
+        self.lines: List[str] = []
+
+    def add(self, value: float, labels: Iterable[Tuple[str, str]] = ()):
+        self.lines.append(f"{self.name}{format_labels(labels)} {format_value(value)}")
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.help_text}\n# TYPE {self.name} {self.metric_type}\n"
+        return header + "".join(line + "\n" for line in self.lines)
+
+
+class PrometheusExposition:
+    """
+    Renders request metrics plus the gauges passed in by the caller.
+    Route samples are rendered once per change: the lines of a route are cached with its
+    request count and reused while the route sees no traffic, so a scrape of a mostly idle
+    master costs little more than joining cached strings.
+    """
+
+    def __init__(self):
+        # endpoint -> (request count when rendered, requests, errors and duration lines)
+        self._route_cache: Dict[str, Tuple[int, List[str], List[str], List[str]]] = {}
+        self.scrapes = 0
+
+    def render(
+        self,
+        collected: Dict,
+        gauges: List[MetricFamily],
+        event_loop_lag: Optional[LatencyHistogram] = None,
+    ) -> str:
+        """
+        Text exposition of the request metrics from metrics_collector.get_metrics()
+        followed by the given families
+        """
+        self.scrapes += 1
+        requests = MetricFamily("master_http_requests_total", "counter", "HTTP requests by route template")
+        errors = MetricFamily("master_http_request_errors_total", "counter", "HTTP responses with status >= 400 by route template")
+        durations = MetricFamily("master_http_request_duration_seconds", "histogram", "HTTP request duration by route template")
+
+        error_counts = collected["error_counts"]
+        for endpoint, histogram in sorted(collected["response_times"].items()):
+            # Counts, errors and the histogram of a route change together
+            count = collected["request_counts"].get(endpoint, 0)
+            cached = self._route_cache.get(endpoint)
+            if cached is None or cached[0] != count:
+                method, _, route = endpoint.partition(" ")
+                labels = [("method", method), ("route", route)]
+                cached = (
+                    count,
+                    [f"master_http_requests_total{format_labels(labels)} {count}"],
+                    [
+                        f"master_http_request_errors_total{format_labels(labels + [('status', status)])} {errors_count}"
+                        for status, errors_count in sorted(error_counts.get(endpoint, {}).items())
+                    ],
+                    histogram_samples("master_http_request_duration_seconds", labels, histogram, LATENCY_BUCKETS_SECONDS),
+                )
+                self._route_cache[endpoint] = cached
+            requests.lines += cached[1]
+            errors.lines += cached[2]
+            durations.lines += cached[3]
+
+        families = [requests, errors, durations]
+        if event_loop_lag is not None:
+            lag = MetricFamily("master_event_loop_lag_seconds", "histogram", "How late the event loop lag probe woke up")
+            lag.lines = histogram_samples("master_event_loop_lag_seconds", [], event_loop_lag, LAG_BUCKETS_SECONDS)
+            families.append(lag)
+        families += gauges
+
+        scrape = MetricFamily("master_metrics_scrapes_total", "counter", "Scrapes of this endpoint")
+        scrape.add(self.scrapes)
+        families.append(scrape)
+        return "".join(family.render() for family in families)
+
+
+prometheus_exposition = PrometheusExposition()
@@ -0,0 +1,216 @@
+"""
+Release catalog sync
+Periodically copies the GitHub releases of every release repository into release_versions
+"""
+
+import asyncio
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from background import PeriodicTask
+from database import AsyncSessionLocal, dialect_insert
+from db_models import ReleaseDB, ReleaseVersionDB, SettingsDB
+from github_releases import GitHubReleaseCache, github_release_cache
+from github_rate_limit import Priority
+from logging_config import app_logger
+from config import RELEASE_CATALOG_SYNC_INTERVAL_SECONDS, RELEASE_CATALOG_SYNC_CONCURRENCY
+
+GITHUB_REPO_PATTERN = r'https://github\.com/([^/]+)/([^/]+)'
+
+# Asset fields agents need to pick and download an asset; the rest of GitHub's asset object is dropped
+ASSET_FIELDS = ("id", "name", "size", "content_type", "updated_at", "browser_download_url")
+
+
+def parse_github_repo(url: str) -> Optional[Tuple[str, str]]:
+    """(owner, repo) of a https://github.com/owner/repo URL"""
+    match = re.match(GITHUB_REPO_PATTERN, (url or "").rstrip('/'))
+    return match.groups() if match else None
+
+
+def parse_github_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """GitHub ISO 8601 timestamp as naive UTC (the database stores naive datetimes)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+async def load_github_token(session: AsyncSession) -> Optional[str]:
+    """GitHub token from the settings table, None when not configured"""
+    result = await session.execute(select(SettingsDB.value).where(SettingsDB.key == "github_token"))
+    return result.scalar_one_or_none() or None
+
+
+def slim_assets(assets: Optional[List[dict]]) -> List[dict]:
+    return [{field: asset.get(field) for field in ASSET_FIELDS} for asset in assets or []]
+
+
+class ReleaseCatalogSync:
+    """
+    Keeps release_versions in step with GitHub.
+    Every interval, all release repositories are refreshed concurrently (at most
+    `concurrency` at a time) through the GitHub release cache, so unchanged
+    repositories cost a conditional request answered with 304.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        concurrency: int,
+        cache: GitHubReleaseCache = github_release_cache,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+    ):
+        self.concurrency = concurrency
+        self.cache = cache
+        self.session_factory = session_factory
+        self._task = PeriodicTask("release-catalog-sync", interval_seconds, self.sync)
+        self._initial_sync: Optional[asyncio.Task] = None
+        self._stats = {
+            "syncs": 0,
+            "repositories_synced": 0,
+            "repository_errors": 0,
+            "versions_stored": 0,
+            "truncated_syncs": 0,
+            "last_sync_at": None,
+            "last_sync_duration_seconds": 0.0,
+        }
+
+    def start(self):
+        """Sync once right away, then every interval"""
+        self._task.start()
+        if self._initial_sync is None or self._initial_sync.done():
+            self._initial_sync = asyncio.create_task(self.sync(), name="release-catalog-initial-sync")
+
+    async def stop(self):
+        if self._initial_sync is not None and not self._initial_sync.done():
+            self._initial_sync.cancel()
+            await asyncio.gather(self._initial_sync, return_exceptions=True)
+        await self._task.stop()
+
+    async def sync(self) -> int:
+        """Refresh every release repository; returns the number of versions stored"""
+        started = datetime.now()
+        async with self.session_factory() as session:
+            result = await session.execute(select(ReleaseDB.id, ReleaseDB.download_url))
+            releases = result.all()
+            token = await load_github_token(session)
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def sync_one(release_id: str, download_url: str) -> int:
+            async with slots:
+                return await self.sync_release(release_id, download_url, token)
+
+        results = await asyncio.gather(
+            *(sync_one(release_id, download_url) for release_id, download_url in releases),
+            return_exceptions=True,
+        )
+        stored = 0
+        for (release_id, _), outcome in zip(releases, results):
+            if isinstance(outcome, BaseException):
+                self._stats["repository_errors"] += 1
+                app_logger.warning(f"Release catalog sync of {release_id} failed: {outcome}")
+            else:
+                stored += outcome
+
+        self._stats["syncs"] += 1
+        self._stats["last_sync_at"] = datetime.now().isoformat()
+        self._stats["last_sync_duration_seconds"] = round((datetime.now() - started).total_seconds(), 3)
+        return stored
+
+    async def sync_release(
+        self,
+        release_id: str,
+        download_url: str,
+        token: Optional[str] = None,
+        session: Optional[AsyncSession] = None,
+        priority: Priority = Priority.BACKGROUND,
+    ) -> int:
+        """
+        Store the current GitHub releases of one repository and drop versions that
+        no longer exist (only when GitHub returned the whole list, not one cut at
+        GITHUB_RELEASES_MAX_PAGES). Raises GitHubAPIError when GitHub cannot be read.
+        - session: write with this session (request handlers); a new one otherwise
+        - priority: INTERACTIVE when a request is waiting for the result
+        """
+        repository = parse_github_repo(download_url)
+        if repository is None:
+            return 0
+        owner, repo = repository
+        fetched = await self.cache.refresh_releases(owner, repo, token, priority=priority)
+
+        synced_at = datetime.now()
+        rows: Dict[str, dict] = {}
+        for release in fetched.releases:
+            tag = release.get("tag_name")
+            if not tag:
+                continue
+            rows[tag] = {
+                "release_id": release_id,
+                "tag": tag,
+                "name": release.get("name") or tag,
+                "published_at": parse_github_timestamp(release.get("published_at")),
+                "html_url": release.get("html_url") or "",
+                "assets": slim_assets(release.get("assets")),
+                "synced_at": synced_at,
+            }
+
+        if not fetched.complete:
+            self._stats["truncated_syncs"] += 1
+        if session is not None:
+            await self._store(session, release_id, rows, fetched.complete)
+        else:
+            async with self.session_factory() as own_session:
+                await self._store(own_session, release_id, rows, fetched.complete)
+
+        self._stats["repositories_synced"] += 1
+        self._stats["versions_stored"] += len(rows)
+        return len(rows)
+
+    @staticmethod
+    async def _store(session: AsyncSession, release_id: str, rows: Dict[str, dict], complete: bool):
+        """
+        Upsert the versions of one release and delete the ones GitHub no longer lists
+        A truncated list says nothing about the older tags, so nothing is deleted then.
+        """
+        if rows:
+            insert_stmt = dialect_insert(session, ReleaseVersionDB).values(list(rows.values()))
+            await session.execute(insert_stmt.on_conflict_do_update(
+                index_elements=[ReleaseVersionDB.release_id, ReleaseVersionDB.tag],
+                set_={
+                    "name": insert_stmt.excluded.name,
+                    "published_at": insert_stmt.excluded.published_at,
+                    "html_url": insert_stmt.excluded.html_url,
+                    "assets": insert_stmt.excluded.assets,
+                    "synced_at": insert_stmt.excluded.synced_at,
+                },
+            ))
+        if complete:
+            await session.execute(
+                delete(ReleaseVersionDB)
+                .where(ReleaseVersionDB.release_id == release_id)
+                .where(ReleaseVersionDB.tag.not_in(list(rows)))
+            )
+        await session.commit()
+
+    def get_stats(self) -> Dict:
+        """Get sync metrics"""
+        return {
+            "running": self._task.running,
+            **self._stats,
+        }
+
+
+release_catalog = ReleaseCatalogSync(
+    interval_seconds=RELEASE_CATALOG_SYNC_INTERVAL_SECONDS,
+    concurrency=RELEASE_CATALOG_SYNC_CONCURRENCY,
+)
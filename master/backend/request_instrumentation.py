@@ -0,0 +1,65 @@
+"""
+Request instrumentation middleware
+One pure ASGI middleware for request timing, per-route metrics and the access log
+"""
+
+from time import perf_counter_ns
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from logging_config import request_logger
+from metrics_collector import record_request
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Times every HTTP request once (perf_counter_ns) and hands the result to the metrics
+    collector and the access log.
+    - Pure ASGI: no extra task or response stream per request, unlike BaseHTTPMiddleware
+    - The status code is taken from the response start message; a request that raises
+      before a response is sent counts as 500
+    - Timing covers the whole response, including streamed bodies
+    - metrics_enabled / access_log_enabled switch the two consumers independently; with
+      both off the middleware passes requests straight through
+    """
+
+    def __init__(self, app: ASGIApp, metrics_enabled: bool = True, access_log_enabled: bool = True):
+        self.app = app
+        self.metrics_enabled = metrics_enabled
+        self.access_log_enabled = access_log_enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not (self.metrics_enabled or self.access_log_enabled):
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter_ns()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            if self.access_log_enabled:
+                elapsed = (perf_counter_ns() - start) / 1e9
+                request_logger.error(
+                    f"{scope['method']} {scope['path']} - Error: {str(e)} - Time: {elapsed:.3f}s",
+                    exc_info=True
+                )
+            raise
+        finally:
+            elapsed_ns = perf_counter_ns() - start
+            if self.metrics_enabled:
+                record_request(scope, status_code, elapsed_ns / 1e6)
+
+        if self.access_log_enabled:
+            client = scope.get("client")
+            request_logger.info(
+                f"{scope['method']} {scope['path']} - Client: {client[0] if client else 'unknown'} - "
+                f"Status: {status_code} - Time: {elapsed_ns / 1e9:.3f}s"
+            )
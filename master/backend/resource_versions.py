@@ -0,0 +1,90 @@
+"""
+Resource change versions
+Per-resource counters bumped by write paths, used for ETag / If-None-Match on dashboard GETs
+"""
+
+import hashlib
+import time
+import uuid
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+AGENTS = "agents"
+RELEASES = "releases"
+DEPLOYMENTS = "deployments"
+
+
+class ResourceVersions:
+    """
+    In-process change counters for API resources.
+    A GET captures the version before querying, so a write racing with the query
+    only makes the next request miss the cache, never serve stale data as fresh.
+    The epoch changes on every start so ETags issued by a previous process never match.
+    Counters live in this process; the master runs as a single process.
+    """
+
+    def __init__(self):
+        self._epoch = uuid.uuid4().hex[:8]
+        self._versions: Dict[str, int] = {}
+        self._stats = {
+            "not_modified": 0,
+            "full_responses": 0,
+        }
+
+    def version(self, resource: str) -> int:
+        """Current change version of a resource"""
+        return self._versions.get(resource, 0)
+
+    def bump(self, resource: str):
+        """Record that a resource changed"""
+        self._versions[resource] = self.version(resource) + 1
+
+    def etag(self, resource: str, variant: str = "", bucket_seconds: Optional[float] = None) -> str:
+        """
+        Strong ETag for a representation of a resource
+        - variant: anything else the response depends on (path, query string)
+        - bucket_seconds: also change the ETag every bucket_seconds, for data that
+          changes over time without a write path (e.g. derived agent status)
+        """
+        parts = [resource, self._epoch, str(self.version(resource)), variant]
+        if bucket_seconds:
+            parts.append(str(int(time.time() // bucket_seconds)))
+        digest = hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+        return f'"{digest}"'
+
+    def not_modified(
+        self,
+        request: Request,
+        response: Response,
+        resource: str,
+        bucket_seconds: Optional[float] = None,
+    ) -> Optional[Response]:
+        """
+        Set ETag / Cache-Control on the response and return a 304 response
+        if the client already has the current representation
+        """
+        variant = f"{request.url.path}?{request.url.query}"
+        etag = self.etag(resource, variant, bucket_seconds)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+            if etag in candidates or "*" in candidates:
+                self._stats["not_modified"] += 1
+                return Response(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        self._stats["full_responses"] += 1
+        return None
+
+    def get_stats(self) -> Dict:
+        """Get conditional GET metrics"""
+        return {
+            "versions": dict(self._versions),
+            **self._stats,
+        }
+
+
+resource_versions = ResourceVersions()
@@ -0,0 +1,104 @@
+"""
+Rolling request windows
+Request counts, errors and latencies of one route over the last minute, 5 minutes and hour
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from latency_histogram import LatencyHistogram, SparseLatencyHistogram
+
+# window name -> (bucket length in seconds, number of buckets). The current bucket is still
+# filling, so a window covers between (buckets - 1) and buckets bucket lengths.
+WINDOWS = {
+    "1m": (1, 60),
+    "5m": (60, 5),
+    "1h": (60, 60),
+}
+
+
+class _Bucket:
+    __slots__ = ("epoch", "count", "errors", "latency")
+
+    def __init__(self):
+        self.epoch = -1
+        self.count = 0
+        self.errors: Dict[str, int] = {}
+        self.latency = SparseLatencyHistogram()
+
+    def reset(self, epoch: int):
+        self.epoch = epoch
+        self.count = 0
+        self.errors.clear()
+        self.latency.clear()
+
+
+class BucketRing:
+    """
+    Ring buffer of `slots` buckets, each covering resolution_seconds of a monotonic clock.
+    A bucket is reused (cleared) when the clock comes round to its slot again, so stale
+    buckets never need a sweep and memory does not grow with uptime.
+    """
+
+    def __init__(self, resolution_seconds: int, slots: int):
+        self.resolution_seconds = resolution_seconds
+        self.slots = slots
+        self._buckets: List[Optional[_Bucket]] = [None] * slots  # Allocated on first use
+
+    def record(self, now: float, status_code: int, elapsed_ms: float):
+        epoch = int(now // self.resolution_seconds)
+        slot = epoch % self.slots
+        bucket = self._buckets[slot]
+        if bucket is None:
+            bucket = self._buckets[slot] = _Bucket()
+        if bucket.epoch != epoch:
+            bucket.reset(epoch)
+        bucket.count += 1
+        if status_code >= 400:
+            status = str(status_code)
+            bucket.errors[status] = bucket.errors.get(status, 0) + 1
+        bucket.latency.record(elapsed_ms)
+
+    def recent(self, now: float, buckets: int) -> Iterator[_Bucket]:
+        """The buckets of the last `buckets` bucket lengths, the current one included"""
+        current = int(now // self.resolution_seconds)
+        for bucket in self._buckets:
+            if bucket is not None and current - buckets < bucket.epoch <= current:
+                yield bucket
+
+
+class RequestWindows:
+    """
+    Rolling metrics of one route: 60 per-second buckets for the 1m window and 60 per-minute
+    buckets for the 5m and 1h windows. Each bucket holds a request count, error counts by
+    status and a sparse latency histogram; windows are read by merging their buckets.
+    """
+
+    __slots__ = ("seconds", "minutes")
+
+    def __init__(self):
+        self.seconds = BucketRing(1, 60)
+        self.minutes = BucketRing(60, 60)
+
+    def record(self, now: float, status_code: int, elapsed_ms: float):
+        self.seconds.record(now, status_code, elapsed_ms)
+        self.minutes.record(now, status_code, elapsed_ms)
+
+    def totals(self, window: str, now: float) -> Tuple[int, Dict[str, int], LatencyHistogram]:
+        """Request count, errors by status and the merged latency histogram of a window"""
+        resolution_seconds, buckets = WINDOWS[window]
+        ring = self.seconds if resolution_seconds == self.seconds.resolution_seconds else self.minutes
+        count = 0
+        errors: Dict[str, int] = {}
+        latency = LatencyHistogram()
+        for bucket in ring.recent(now, buckets):
+            count += bucket.count
+            for status, errors_count in bucket.errors.items():
+                errors[status] = errors.get(status, 0) + errors_count
+            latency.merge(bucket.latency)
+        return count, errors, latency
+
+
+def window_span_seconds(window: str, now: float) -> float:
+    """Length of a window at `now` (the same for every route)"""
+    resolution_seconds, buckets = WINDOWS[window]
+    return now - (int(now // resolution_seconds) - buckets + 1) * resolution_seconds
@@ -0,0 +1,183 @@
+"""
+Agent Push Channel Routes
+One persistent WebSocket per agent carrying heartbeats and pushed deployments
+"""
+
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from sqlalchemy import select, and_, or_, asc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from database import get_db
+from db_models import AgentDB, DeploymentDB, DeploymentStatusEnum
+from models import AgentRegister, Deployment
+from agent_connections import agent_channels, AgentConnection, ChannelCapacityError
+from deployment_notifier import deployment_notifier
+from cursors import encode_cursor, decode_cursor
+from logging_config import app_logger
+from config import (
+    LONG_POLL_MAX_WAIT_SECONDS, HEARTBEAT_TIMEOUT_SECONDS, AGENT_CHANNEL_HEARTBEAT_INTERVAL_SECONDS
+)
+from routers.agents import ingest_heartbeat
+from routers.deployments import claim_pending_deployment, to_deployment_model
+
+router = APIRouter(prefix="/api/agents", tags=["agent-channel"])
+
+
+async def _send_deployment(connection: AgentConnection, deployment: Deployment):
+    """Push a deployment; its event id is the resume cursor"""
+    await connection.send_event(
+        "deployment",
+        deployment.model_dump(mode="json"),
+        event_id=encode_cursor(deployment.created_at, deployment.id),
+    )
+
+
+async def _replay_undelivered(connection: AgentConnection, agent_id: str, last_event_id: str, db: AsyncSession):
+    """
+    Re-send deployments already assigned to the agent (IN_PROGRESS) that come after
+    the last event it received, e.g. when the previous connection dropped mid-send
+    """
+    position = decode_cursor(last_event_id)
+    if position is None:
+        return
+    created_at, deployment_id = position
+
+    result = await db.execute(
+        select(DeploymentDB)
+        .options(selectinload(DeploymentDB.agent))
+        .where(DeploymentDB.agent_id == agent_id)
+        .where(DeploymentDB.status == DeploymentStatusEnum.IN_PROGRESS)
+        .where(or_(
+            DeploymentDB.created_at > created_at,
+            and_(DeploymentDB.created_at == created_at, DeploymentDB.id > deployment_id),
+        ))
+        .order_by(asc(DeploymentDB.created_at), asc(DeploymentDB.id))
+    )
+    for deployment_db in result.scalars().all():
+        await _send_deployment(connection, to_deployment_model(deployment_db))
+    await db.commit()
+
+
+async def _deliver_deployments(
+    connection: AgentConnection,
+    agent_id: str,
+    last_event_id: Optional[str],
+    db: AsyncSession,
+    db_lock: asyncio.Lock,
+):
+    """Push configuration, replay undelivered work, then push deployments as they are queued"""
+    await connection.send_event("config", {
+        "heartbeat_interval_seconds": AGENT_CHANNEL_HEARTBEAT_INTERVAL_SECONDS,
+        "heartbeat_timeout_seconds": HEARTBEAT_TIMEOUT_SECONDS,
+    })
+
+    if last_event_id:
+        async with db_lock:
+            await _replay_undelivered(connection, agent_id, last_event_id, db)
+
+    while not deployment_notifier.closed:
+        # Observe the generation before claiming so no notification is lost
+        generation = deployment_notifier.generation(agent_id)
+        async with db_lock:
+            while True:
+                deployment = await claim_pending_deployment(db, agent_id)
+                if not deployment:
+                    break
+                await _send_deployment(connection, deployment)
+            # Release the database connection while idle
+            await db.close()
+
+        await deployment_notifier.wait(agent_id, generation, timeout=LONG_POLL_MAX_WAIT_SECONDS, limited=False)
+
+
+async def _receive_messages(
+    websocket: WebSocket,
+    agent_id: str,
+    agent_name: str,
+    db: AsyncSession,
+    db_lock: asyncio.Lock,
+):
+    """
+    Handle agent messages until the connection closes
+    Heartbeats are upserted by name, so only heartbeats carrying the name of the channel's
+    agent are accepted; one agent's channel cannot update or create another agent.
+    """
+    while True:
+        message = await websocket.receive_json()
+        if not isinstance(message, dict):
+            continue
+
+        if message.get("type") == "heartbeat":
+            if message.get("name") != agent_name:
+                app_logger.warning(
+                    f"Ignored heartbeat for '{message.get('name')}' on push channel of agent {agent_id} ({agent_name})"
+                )
+                continue
+            try:
+                agent_data = AgentRegister(
+                    name=message.get("name"),
+                    platform=message.get("platform"),
+                    version=message.get("version"),
+                    ip_address=message.get("ip_address"),
+                )
+            except ValidationError:
+                app_logger.warning(f"Invalid heartbeat on push channel of agent {agent_id}")
+                continue
+            async with db_lock:
+                await ingest_heartbeat(agent_data, db)
+                await db.close()
+
+
+@router.websocket("/{agent_id}/channel")
+async def agent_channel(
+    websocket: WebSocket,
+    agent_id: str,
+    last_event_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Persistent push channel for an agent
+    - Server -> agent: {"event": "config" | "deployment" | "cancel", "id": ..., "data": ...}
+    - Agent -> server: {"type": "heartbeat", "name": ..., "platform": ..., "version": ..., "ip_address": ...}
+      (name must be the agent's registered name; other heartbeats are ignored)
+    - last_event_id: id of the last received event (or Last-Event-ID header) to resume after reconnect
+    """
+    result = await db.execute(select(AgentDB.name).where(AgentDB.id == agent_id))
+    agent_name = result.scalar_one_or_none()
+    await db.close()
+    if agent_name is None:
+        await websocket.close(code=4404, reason="Agent not found")
+        return
+
+    await websocket.accept()
+    try:
+        connection = await agent_channels.register(agent_id, websocket)
+    except ChannelCapacityError:
+        await websocket.close(code=1013, reason="Too many connections, retry later")
+        return
+
+    last_event_id = last_event_id or websocket.headers.get("last-event-id")
+    db_lock = asyncio.Lock()
+    delivery = asyncio.create_task(_deliver_deployments(connection, agent_id, last_event_id, db, db_lock))
+    receiving = asyncio.create_task(_receive_messages(websocket, agent_id, agent_name, db, db_lock))
+    try:
+        done, _ = await asyncio.wait({delivery, receiving}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error and not isinstance(error, WebSocketDisconnect):
+                app_logger.warning(f"Push channel of agent {agent_id} failed: {error}")
+    finally:
+        for task in (delivery, receiving):
+            task.cancel()
+        await asyncio.gather(delivery, receiving, return_exceptions=True)
+        agent_channels.unregister(connection)
+        try:
+            await websocket.close()
+        except Exception:
+            # Already closed by the agent
+            pass
@@ -2,23 +2,24 @@
 Agent Management Routes
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, List, Optional
 from datetime import datetime
 import uuid
 
-from database import get_db
-from db_models import AgentDB, AgentStatusEnum
-from models import Agent, AgentRegister, AgentUpdate, AgentStatus
+from database import get_db, dialect_insert
+from db_models import AgentDB, AgentStatusEnum, ReleaseDB, AgentInstalledReleaseDB
+from models import Agent, AgentRegister, AgentUpdate, AgentStatus, AgentReleaseVersions, ReleaseMatrix
+from heartbeat_buffer import heartbeat_buffer
+from resource_versions import resource_versions, AGENTS, DEPLOYMENTS
+from singleflight import single_flight
+from config import HEARTBEAT_TIMEOUT_SECONDS, AGENT_LIST_ETAG_BUCKET_SECONDS
 
 router = APIRouter(prefix="/api/agents", tags=["agents"])
 
-# Agent heartbeat timeout: consider agent offline if last_seen is older than this
-# Agent sends heartbeat every 10 seconds, so 30 seconds gives 3 missed heartbeats tolerance
-HEARTBEAT_TIMEOUT_SECONDS = 30
-
 
 def _should_be_offline(agent_db: AgentDB) -> bool:
     """Check if agent should be considered offline based on last_seen timestamp"""
@@ -29,28 +30,38 @@ def _should_be_offline(agent_db: AgentDB) -> bool:
     return time_since_last_seen.total_seconds() > HEARTBEAT_TIMEOUT_SECONDS
 
 
-async def _get_agent_status(agent_db: AgentDB, db: AsyncSession) -> AgentStatusEnum:
-    """Get agent status, updating to OFFLINE if heartbeat timeout exceeded"""
+def _get_agent_status(agent_db: AgentDB) -> AgentStatusEnum:
+    """
+    Get effective agent status without writing to the database
+    The background sweeper persists OFFLINE for timed-out agents; until it runs,
+    a timed-out agent is still reported as OFFLINE here.
+    """
     if _should_be_offline(agent_db):
-        # Update status in database if it's still marked as ONLINE
-        if agent_db.status == AgentStatusEnum.ONLINE:
-            agent_db.status = AgentStatusEnum.OFFLINE
-            await db.commit()
-            await db.refresh(agent_db)
         return AgentStatusEnum.OFFLINE
     return agent_db.status
 
 
 @router.get("", response_model=List[Agent])
-async def get_agents(db: AsyncSession = Depends(get_db)):
-    """List all agents"""
+async def get_agents(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """List all agents (supports If-None-Match)"""
+    not_modified = resource_versions.not_modified(
+        request, response, AGENTS, bucket_seconds=AGENT_LIST_ETAG_BUCKET_SECONDS
+    )
+    if not_modified:
+        return not_modified
+    
+    # Dashboards poll this list; concurrent polls share one query
+    return await single_flight.do("get_agents", resource_versions.version(AGENTS), lambda: _list_agents(db))
+
+
+async def _list_agents(db: AsyncSession) -> List[Agent]:
     result = await db.execute(select(AgentDB))
     agents_db = result.scalars().all()
     
     agents = []
     for agent_db in agents_db:
-        # Check and update status based on last_seen
-        current_status = await _get_agent_status(agent_db, db)
+        # Derive status from last_seen (read-only)
+        current_status = _get_agent_status(agent_db)
         
         agents.append(
             Agent(
@@ -67,17 +78,76 @@ async def get_agents(db: AsyncSession = Depends(get_db)):
     return agents
 
 
+@router.get("/release-matrix", response_model=ReleaseMatrix)
+async def get_release_matrix(
+    release_id: Optional[str] = None,
+    platform: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Fleet version matrix: the installed tag of every release on every agent
+    Read from agent_installed_releases, so the cost depends on the fleet size only,
+    not on deployment history
+    - release_id: Only this release
+    - platform: Only agents of this platform
+    """
+    release_query = select(ReleaseDB.id).order_by(ReleaseDB.id)
+    agent_query = select(AgentDB).order_by(AgentDB.name)
+    installed_query = select(
+        AgentInstalledReleaseDB.agent_id,
+        AgentInstalledReleaseDB.release_id,
+        AgentInstalledReleaseDB.tag,
+    )
+    if release_id:
+        release_query = release_query.where(ReleaseDB.id == release_id)
+        installed_query = installed_query.where(AgentInstalledReleaseDB.release_id == release_id)
+    if platform:
+        agent_query = agent_query.where(AgentDB.platform == platform)
+        installed_query = installed_query.join(
+            AgentDB, AgentDB.id == AgentInstalledReleaseDB.agent_id
+        ).where(AgentDB.platform == platform)
+    
+    release_ids = list((await db.execute(release_query)).scalars().all())
+    agents_db = (await db.execute(agent_query)).scalars().all()
+    
+    known_releases = set(release_ids)
+    versions: Dict[str, Dict[str, str]] = {}
+    for agent_id, installed_release_id, tag in (await db.execute(installed_query)).all():
+        if installed_release_id in known_releases:
+            versions.setdefault(agent_id, {})[installed_release_id] = tag
+    
+    return ReleaseMatrix(
+        release_ids=release_ids,
+        agents=[
+            AgentReleaseVersions(
+                agent_id=agent_db.id,
+                agent_name=agent_db.name,
+                platform=agent_db.platform,
+                status=AgentStatus(_get_agent_status(agent_db).value),
+                versions=versions.get(agent_db.id, {}),
+            )
+            for agent_db in agents_db
+        ],
+    )
+
+
 @router.get("/{agent_id}", response_model=Agent)
-async def get_agent(agent_id: str, db: AsyncSession = Depends(get_db)):
-    """Get specific agent"""
+async def get_agent(agent_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Get specific agent (supports If-None-Match)"""
+    not_modified = resource_versions.not_modified(
+        request, response, AGENTS, bucket_seconds=AGENT_LIST_ETAG_BUCKET_SECONDS
+    )
+    if not_modified:
+        return not_modified
+    
     result = await db.execute(select(AgentDB).where(AgentDB.id == agent_id))
     agent_db = result.scalar_one_or_none()
     
     if not agent_db:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    # Check and update status based on last_seen
-    current_status = await _get_agent_status(agent_db, db)
+    # Derive status from last_seen (read-only)
+    current_status = _get_agent_status(agent_db)
     
     return Agent(
         id=agent_db.id,
@@ -90,57 +160,68 @@ async def get_agent(agent_id: str, db: AsyncSession = Depends(get_db)):
     )
 
 
+async def ingest_heartbeat(agent_data: AgentRegister, db: AsyncSession) -> Agent:
+    """Record an agent registration / heartbeat (shared by HTTP and the push channel)"""
+    # Buffered ingestion: known agents are updated in memory and flushed in bulk
+    heartbeat = heartbeat_buffer.record(
+        agent_data.name, agent_data.platform, agent_data.version, agent_data.ip_address
+    )
+    if heartbeat:
+        return Agent(
+            id=heartbeat.id,
+            name=heartbeat.name,
+            platform=heartbeat.platform,
+            version=heartbeat.version,
+            status=AgentStatus.ONLINE,
+            last_seen=heartbeat.last_seen,
+            ip_address=heartbeat.ip_address,
+        )
+    
+    # Insert or update by name in a single statement (unique index on agents.name)
+    new_agent_id = str(uuid.uuid4())
+    insert_stmt = dialect_insert(db, AgentDB).values(
+        id=new_agent_id,
+        name=agent_data.name,
+        platform=agent_data.platform,
+        version=agent_data.version,
+        status=AgentStatusEnum.ONLINE,
+        last_seen=datetime.now(),
+        ip_address=agent_data.ip_address,
+    )
+    upsert_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[AgentDB.name],
+        set_={
+            "platform": insert_stmt.excluded.platform,
+            "version": insert_stmt.excluded.version,
+            "status": insert_stmt.excluded.status,
+            "last_seen": insert_stmt.excluded.last_seen,
+            "ip_address": insert_stmt.excluded.ip_address,
+        },
+    ).returning(AgentDB)
+    
+    result = await db.execute(upsert_stmt, execution_options={"populate_existing": True})
+    agent_db = result.scalar_one()
+    await db.commit()
+    heartbeat_buffer.remember(agent_db)
+    if agent_db.id == new_agent_id:
+        # A new agent appears in lists right away; plain heartbeats do not invalidate them
+        resource_versions.bump(AGENTS)
+    
+    return Agent(
+        id=agent_db.id,
+        name=agent_db.name,
+        platform=agent_db.platform,
+        version=agent_db.version,
+        status=AgentStatus(agent_db.status.value),
+        last_seen=agent_db.last_seen,
+        ip_address=agent_db.ip_address,
+    )
+
+
 @router.post("/register", response_model=Agent)
 async def register_agent(agent_data: AgentRegister, db: AsyncSession = Depends(get_db)):
     """Register agent / heartbeat"""
-    # Check if agent exists
-    result = await db.execute(select(AgentDB).where(AgentDB.name == agent_data.name))
-    existing_agent = result.scalar_one_or_none()
-    
-    if existing_agent:
-        # Update existing agent
-        existing_agent.platform = agent_data.platform
-        existing_agent.version = agent_data.version
-        existing_agent.status = AgentStatusEnum.ONLINE
-        existing_agent.last_seen = datetime.now()
-        existing_agent.ip_address = agent_data.ip_address
-        await db.commit()
-        await db.refresh(existing_agent)
-        
-        return Agent(
-            id=existing_agent.id,
-            name=existing_agent.name,
-            platform=existing_agent.platform,
-            version=existing_agent.version,
-            status=AgentStatus(existing_agent.status.value),
-            last_seen=existing_agent.last_seen,
-            ip_address=existing_agent.ip_address,
-        )
-    else:
-        # Create new agent
-        agent_id = str(uuid.uuid4())
-        agent_db = AgentDB(
-            id=agent_id,
-            name=agent_data.name,
-            platform=agent_data.platform,
-            version=agent_data.version,
-            status=AgentStatusEnum.ONLINE,
-            last_seen=datetime.now(),
-            ip_address=agent_data.ip_address,
-        )
-        db.add(agent_db)
-        await db.commit()
-        await db.refresh(agent_db)
-        
-        return Agent(
-            id=agent_db.id,
-            name=agent_db.name,
-            platform=agent_db.platform,
-            version=agent_db.version,
-            status=AgentStatus(agent_db.status.value),
-            last_seen=agent_db.last_seen,
-            ip_address=agent_db.ip_address,
-        )
+    return await ingest_heartbeat(agent_data, db)
 
 
 @router.put("/{agent_id}", response_model=Agent)
@@ -159,12 +240,21 @@ async def update_agent(
     # Update name if provided
     if agent_data.name is not None:
         agent_db.name = agent_data.name
+        # Buffered heartbeats are keyed by name, so drop the cached entry
+        heartbeat_buffer.forget(agent_id)
     
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=f"Agent name '{agent_data.name}' is already in use")
     await db.refresh(agent_db)
+    resource_versions.bump(AGENTS)
+    # Deployment lists show the agent name
+    resource_versions.bump(DEPLOYMENTS)
     
-    # Check and update status based on last_seen
-    current_status = await _get_agent_status(agent_db, db)
+    # Derive status from last_seen (read-only)
+    current_status = _get_agent_status(agent_db)
     
     return Agent(
         id=agent_db.id,
@@ -189,5 +279,9 @@ async def delete_agent(agent_id: str, db: AsyncSession = Depends(get_db)):
     # Use delete statement for SQLAlchemy 2.0 async
     await db.execute(delete(AgentDB).where(AgentDB.id == agent_id))
     await db.commit()
+    heartbeat_buffer.forget(agent_id)
+    resource_versions.bump(AGENTS)
+    # Deployments of the agent are deleted with it (ON DELETE CASCADE)
+    resource_versions.bump(DEPLOYMENTS)
     return {"message": "Agent deleted"}
 
@@ -0,0 +1,232 @@
+"""
+Artifact Routes
+Release assets served from the master's artifact cache, with ETag and Range support
+"""
+
+import re
+from typing import BinaryIO, Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
+
+from database import get_db
+from artifact_store import artifact_store, ArtifactNotFound, CHUNK_SIZE
+from artifact_prefetch import artifact_prefetcher
+from artifact_delta import artifact_deltas
+from github_releases import GitHubAPIError
+from models import ArtifactPrefetchJob, ArtifactPrefetchStatus
+
+router = APIRouter(prefix="/api/artifacts", tags=["artifacts"])
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ArtifactFileResponse(Response):
+    """
+    Streams a byte range of an already opened file
+    The file is opened before the response starts, so eviction of the cached file
+    while it is being sent does not affect the transfer.
+    """
+
+    def __init__(self, file: BinaryIO, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.file = file
+        self.start = start
+        self.end = end  # Inclusive; end < start for empty files
+        self.headers["content-length"] = str(max(0, end - start + 1))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"] == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            await anyio.to_thread.run_sync(self.file.seek, self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(self.file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0 or self.end < self.start:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) of a single "bytes=" range, None to send the whole file
+    Raises ValueError for ranges outside the file (416). Multiple ranges are not
+    supported and are answered with the whole file, which RFC 9110 allows.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)  # bytes=-N: the last N bytes
+            if suffix <= 0:
+                raise ValueError(header)
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None  # Malformed ranges are ignored
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def _serve(
+    request: Request,
+    sha256: str,
+    content_type: str,
+    filename: Optional[str],
+    cache_control: str,
+    extra_headers: Optional[dict] = None,
+) -> Response:
+    etag = f'"{sha256}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+        "X-Artifact-Sha256": sha256,
+        **(extra_headers or {}),
+    }
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [candidate.strip() for candidate in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    opened = artifact_store.open(sha256)
+    if opened is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    file, size = opened
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            file.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return ArtifactFileResponse(file, 0, size - 1, 200, headers, content_type)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return ArtifactFileResponse(file, start, end, 206, headers, content_type)
+
+
+@router.api_route("/sha256/{digest}", methods=["GET", "HEAD"])
+async def get_artifact_by_digest(digest: str, request: Request):
+    """Stored file by content hash (immutable)"""
+    if not SHA256_PATTERN.match(digest):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return _serve(request, digest, "application/octet-stream", None, "public, max-age=31536000, immutable")
+
+
+@router.get("/prefetch", response_model=ArtifactPrefetchStatus)
+async def get_prefetch_status(deployment_id: Optional[str] = None):
+    """
+    Progress of artifact prefetching for new deployments
+    - deployment_id: Only the assets this deployment waits (or waited) for
+    """
+    stats = artifact_prefetcher.get_stats()
+    waiting = artifact_prefetcher.waiting_deployment_ids()
+    if deployment_id is not None:
+        waiting = [waiting_id for waiting_id in waiting if waiting_id == deployment_id]
+    return ArtifactPrefetchStatus(
+        workers=stats["workers"],
+        queued=stats["queued"],
+        downloading=stats["downloading"],
+        waiting_deployment_ids=waiting,
+        jobs=[
+            ArtifactPrefetchJob(
+                release_id=job.key[0],
+                tag=job.key[1],
+                asset_name=job.key[2],
+                status=job.status,
+                size=job.size,
+                downloaded_bytes=artifact_prefetcher.downloaded_bytes(job),
+                sha256=job.sha256,
+                error=job.error,
+                deployment_ids=sorted(job.deployment_ids),
+                queued_at=job.queued_at,
+                finished_at=job.finished_at,
+            )
+            for job in artifact_prefetcher.jobs(deployment_id)
+        ],
+    )
+
+
+@router.api_route("/{release_id}/{tag}/{asset_name}", methods=["GET", "HEAD"])
+async def get_release_artifact(
+    release_id: str,
+    tag: str,
+    asset_name: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Release asset for agents, downloaded from GitHub on first use and then served from the cache
+    Supports Range / If-Range (resume) and If-None-Match; the ETag is the sha256 of the content
+    """
+    try:
+        artifact = await artifact_store.get(db, release_id, tag, asset_name)
+    except ArtifactNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except GitHubAPIError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return _serve(request, artifact.sha256, artifact.content_type, asset_name, "no-cache")
+
+
+@router.api_route("/{release_id}/{tag}/{asset_name}/delta", methods=["GET", "HEAD"])
+async def get_release_artifact_delta(
+    release_id: str,
+    tag: str,
+    asset_name: str,
+    request: Request,
+    base_sha256: str = Query(..., description="sha256 of the file the agent already has"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Binary delta from a file the agent already has to this asset
+    404 when no delta is available (base file not cached, delta not built yet, or the delta
+    would not be smaller than ARTIFACT_DELTA_MAX_RATIO of the asset); the agent then downloads
+    the full file. The first request for a pair starts the build for the next one.
+    X-Delta-Target-Sha256 is the sha256 of the rebuilt asset, to verify the result.
+    """
+    base_sha256 = base_sha256.lower()
+    if not SHA256_PATTERN.match(base_sha256):
+        raise HTTPException(status_code=400, detail="base_sha256 must be a sha256 hex digest")
+    try:
+        artifact = await artifact_store.get(db, release_id, tag, asset_name)
+    except ArtifactNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except GitHubAPIError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    delta = await artifact_deltas.get(db, base_sha256, artifact)
+    if delta is None:
+        raise HTTPException(status_code=404, detail="No delta available, download the full asset")
+    return _serve(
+        request,
+        delta.sha256,
+        delta.content_type,
+        f"{asset_name}.delta",
+        "no-cache",
+        extra_headers={
+            "X-Delta-Base-Sha256": base_sha256,
+            "X-Delta-Target-Sha256": artifact.sha256,
+            "X-Delta-Target-Size": str(artifact.size),
+        },
+    )
@@ -2,143 +2,414 @@
 Deployment Management Routes
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, asc
+from sqlalchemy import select, update, insert, desc, asc, and_, or_, exists, func, tuple_
 from sqlalchemy.orm import selectinload
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import uuid
 
-from database import get_db
-from db_models import AgentDB, ReleaseDB, DeploymentDB, DeploymentStatusEnum
-from models import Deployment, DeploymentCreate, DeploymentComplete, DeploymentStatus
+from database import get_db, dialect_insert
+from db_models import (
+    AgentDB, ReleaseDB, ReleaseVersionDB, DeploymentDB, DeploymentItemDB, DeploymentStatusEnum, AgentStatusEnum,
+    AgentInstalledReleaseDB
+)
+from models import (
+    Deployment, DeploymentCreate, DeploymentComplete, DeploymentStatus,
+    RolloutCreate, Rollout, RolloutDeployment
+)
+from deployment_notifier import deployment_notifier, LongPollCapacityError
+from agent_connections import agent_channels
+from cursors import encode_cursor, decode_cursor
+from resource_versions import resource_versions, DEPLOYMENTS
+from artifact_prefetch import artifact_prefetcher
+from config import LONG_POLL_MAX_WAIT_SECONDS, HEARTBEAT_TIMEOUT_SECONDS, ARTIFACT_PREFETCH_RETRY_AFTER_SECONDS
 
 router = APIRouter(prefix="/api/deployments", tags=["deployments"])
 
 
+def to_deployment_model(deployment_db: DeploymentDB, agent_name: Optional[str] = None) -> Deployment:
+    """
+    Convert a DeploymentDB row to the API model
+    The agent relationship must be loaded unless agent_name is given
+    """
+    if agent_name is None:
+        agent_name = deployment_db.agent.name if deployment_db.agent else "Unknown"
+    return Deployment(
+        id=deployment_db.id,
+        agent_id=deployment_db.agent_id,
+        agent_name=agent_name,
+        release_ids=deployment_db.release_ids or [],
+        release_tags=deployment_db.release_tags or [],
+        status=DeploymentStatus(deployment_db.status.value),
+        created_at=deployment_db.created_at,
+        started_at=deployment_db.started_at,
+        completed_at=deployment_db.completed_at,
+        error_message=deployment_db.error_message,
+        rollout_id=deployment_db.rollout_id,
+        artifacts_ready=deployment_db.artifacts_ready is not False,
+    )
+
+
+async def _resolve_release_tags(
+    db: AsyncSession,
+    release_ids: List[str],
+    release_versions: Optional[List[str]],
+) -> List[str]:
+    """
+    Validate all releases and return the tag to deploy for each
+    Selected versions win; otherwise the newest version in the release catalog is used,
+    and the release tag_name for releases the catalog has no versions of.
+    Selected versions of catalogued releases must exist in the catalog.
+    Only local tables are read; nothing here calls GitHub.
+    """
+    result = await db.execute(
+        select(ReleaseDB.id, ReleaseDB.tag_name).where(ReleaseDB.id.in_(release_ids))
+    )
+    tag_names = dict(result.all())
+    
+    for release_id in release_ids:
+        if release_id not in tag_names:
+            raise HTTPException(status_code=404, detail=f"Release {release_id} not found")
+    
+    # Newest catalog version per release (idx_release_version_published)
+    newest = (
+        select(
+            ReleaseVersionDB.release_id,
+            ReleaseVersionDB.tag,
+            func.row_number().over(
+                partition_by=ReleaseVersionDB.release_id,
+                order_by=(ReleaseVersionDB.published_at.desc().nulls_last(), ReleaseVersionDB.tag.desc()),
+            ).label("rank"),
+        )
+        .where(ReleaseVersionDB.release_id.in_(release_ids))
+        .subquery()
+    )
+    result = await db.execute(select(newest.c.release_id, newest.c.tag).where(newest.c.rank == 1))
+    latest_tags = dict(result.all())
+    
+    if release_versions and len(release_versions) == len(release_ids):
+        catalogued = [
+            (release_id, tag) for release_id, tag in zip(release_ids, release_versions)
+            if release_id in latest_tags
+        ]
+        if catalogued:
+            result = await db.execute(
+                select(ReleaseVersionDB.release_id, ReleaseVersionDB.tag)
+                .where(tuple_(ReleaseVersionDB.release_id, ReleaseVersionDB.tag).in_(catalogued))
+            )
+            known = set(result.all())
+            for release_id, tag in catalogued:
+                if (release_id, tag) not in known:
+                    raise HTTPException(status_code=400, detail=f"Version {tag} of release {release_id} not found")
+        return release_versions
+    return [latest_tags.get(release_id, tag_names[release_id]) for release_id in release_ids]
+
+
+async def _fetch_page(
+    db: AsyncSession,
+    query,
+    limit: int,
+    cursor: Optional[str],
+    response: Response,
+) -> List[Deployment]:
+    """
+    Keyset pagination, newest first, on (created_at, id)
+    Seeks past the cursor instead of using OFFSET, so every page costs the same
+    regardless of how much history there is. The next-page cursor is returned
+    in the X-Next-Cursor header; it is absent on the last page.
+    """
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        created_at, deployment_id = position
+        query = query.where(or_(
+            DeploymentDB.created_at < created_at,
+            and_(DeploymentDB.created_at == created_at, DeploymentDB.id < deployment_id),
+        ))
+    
+    # Fetch one extra row to know whether there is a next page
+    query = (
+        query.order_by(desc(DeploymentDB.created_at), desc(DeploymentDB.id))
+        .limit(limit + 1)
+        .options(selectinload(DeploymentDB.agent))
+    )
+    result = await db.execute(query)
+    deployments_db = result.scalars().all()
+    
+    if len(deployments_db) > limit:
+        deployments_db = deployments_db[:limit]
+        last = deployments_db[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.created_at, last.id)
+    
+    return [to_deployment_model(deployment) for deployment in deployments_db]
+
+
+def _filter_by_release(query, release_id: Optional[str], tag: Optional[str]):
+    """Restrict a deployments query to deployments that included a release and/or tag"""
+    if not release_id and not tag:
+        return query
+    # Indexed lookup in deployment_items instead of decoding the JSON release lists
+    item_query = select(DeploymentItemDB.deployment_id).where(
+        DeploymentItemDB.deployment_id == DeploymentDB.id
+    )
+    if release_id:
+        item_query = item_query.where(DeploymentItemDB.release_id == release_id)
+    if tag:
+        item_query = item_query.where(DeploymentItemDB.tag == tag)
+    return query.where(exists(item_query))
+
+
+def _item_rows(deployment_id: str, release_ids: List[str], release_tags: List[str]) -> List[dict]:
+    """deployment_items rows for a new deployment"""
+    return [
+        {
+            "deployment_id": deployment_id,
+            "position": index,
+            "release_id": release_id,
+            "tag": release_tags[index] if index < len(release_tags) else "",
+            "status": DeploymentStatusEnum.PENDING,
+        }
+        for index, release_id in enumerate(release_ids)
+    ]
+
+
+async def _set_item_status(db: AsyncSession, deployment_id: str, status: DeploymentStatusEnum):
+    """Mirror a deployment status change onto its items (same transaction)"""
+    await db.execute(
+        update(DeploymentItemDB)
+        .where(DeploymentItemDB.deployment_id == deployment_id)
+        .values(status=status)
+    )
+
+
+async def _record_installed_releases(db: AsyncSession, deployment_db: DeploymentDB):
+    """
+    Upsert the agent's installed version of every release in a successful deployment
+    Runs in the completion transaction, so the table never disagrees with deployment history.
+    Deployments are installed in the order they were created, so a row is only replaced by
+    a deployment that is not older than the one that wrote it; a late report of an older
+    deployment does not roll the matrix back.
+    """
+    release_ids = deployment_db.release_ids or []
+    release_tags = deployment_db.release_tags or []
+    if not release_ids:
+        return
+    
+    rows = [
+        {
+            "agent_id": deployment_db.agent_id,
+            "release_id": release_id,
+            "tag": release_tags[index] if index < len(release_tags) else "",
+            "deployment_id": deployment_db.id,
+            "installed_at": deployment_db.completed_at,
+        }
+        for index, release_id in enumerate(release_ids)
+    ]
+    newer_deployments = (
+        select(DeploymentDB.id)
+        .where(DeploymentDB.agent_id == deployment_db.agent_id)
+        .where(DeploymentDB.created_at > deployment_db.created_at)
+    )
+    insert_stmt = dialect_insert(db, AgentInstalledReleaseDB).values(rows)
+    await db.execute(insert_stmt.on_conflict_do_update(
+        index_elements=[AgentInstalledReleaseDB.agent_id, AgentInstalledReleaseDB.release_id],
+        set_={
+            "tag": insert_stmt.excluded.tag,
+            "deployment_id": insert_stmt.excluded.deployment_id,
+            "installed_at": insert_stmt.excluded.installed_at,
+        },
+        where=AgentInstalledReleaseDB.deployment_id.not_in(newer_deployments),
+    ))
+
+
 @router.get("", response_model=List[Deployment])
 async def get_deployments(
+    request: Request,
+    response: Response,
     agent_id: Optional[str] = None,
     status: Optional[DeploymentStatus] = None,
+    rollout_id: Optional[str] = None,
+    release_id: Optional[str] = None,
+    tag: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
-    List all deployments with optional filtering
+    List deployments with optional filtering, newest first
     - agent_id: Filter by agent ID
     - status: Filter by deployment status (pending, in_progress, success, failed)
+    - rollout_id: Filter by fleet rollout
+    - release_id: Only deployments that included this release
+    - tag: Only deployments that included this release tag
+    - limit: Page size
+    - cursor: X-Next-Cursor header value of the previous page
+    Supports If-None-Match
     """
+    not_modified = resource_versions.not_modified(request, response, DEPLOYMENTS)
+    if not_modified:
+        return not_modified
+    
     query = select(DeploymentDB)
     
     # Apply filters
     if agent_id:
         query = query.where(DeploymentDB.agent_id == agent_id)
     
-    if status:
-        query = query.where(DeploymentDB.status == DeploymentStatusEnum(status.value))
+    if rollout_id:
+        query = query.where(DeploymentDB.rollout_id == rollout_id)
     
-    # Order by created_at descending (newest first)
-    query = query.order_by(desc(DeploymentDB.created_at))
+    query = _filter_by_release(query, release_id, tag)
     
-    # Join with Agent to get current agent name
-    query = query.options(selectinload(DeploymentDB.agent))
-    result = await db.execute(query)
-    deployments_db = result.scalars().all()
+    if status:
+        query = query.where(DeploymentDB.status == DeploymentStatusEnum(status.value))
     
-    return [
-        Deployment(
-            id=deployment.id,
-            agent_id=deployment.agent_id,
-            agent_name=deployment.agent.name if deployment.agent else "Unknown",
-            release_ids=deployment.release_ids or [],
-            release_tags=deployment.release_tags or [],
-            status=DeploymentStatus(deployment.status.value),
-            created_at=deployment.created_at,
-            started_at=deployment.started_at,
-            completed_at=deployment.completed_at,
-            error_message=deployment.error_message,
-        )
-        for deployment in deployments_db
-    ]
+    return await _fetch_page(db, query, limit, cursor, response)
 
 
 @router.get("/history", response_model=List[Deployment])
-async def get_deployment_history(limit: int = 50, db: AsyncSession = Depends(get_db)):
-    """Get deployment history"""
+async def get_deployment_history(
+    request: Request,
+    response: Response,
+    release_id: Optional[str] = None,
+    tag: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get deployment history, newest first
+    - release_id: Only deployments that included this release
+    - tag: Only deployments that included this release tag
+    - limit: Page size
+    - cursor: X-Next-Cursor header value of the previous page
+    Supports If-None-Match
+    """
+    not_modified = resource_versions.not_modified(request, response, DEPLOYMENTS)
+    if not_modified:
+        return not_modified
+    
+    query = _filter_by_release(select(DeploymentDB), release_id, tag)
+    return await _fetch_page(db, query, limit, cursor, response)
+
+
+async def claim_pending_deployment(db: AsyncSession, agent_id: str) -> Optional[Deployment]:
+    """
+    Move the oldest PENDING deployment of an agent to IN_PROGRESS and return it
+    This is a single UPDATE ... RETURNING statement. The status guard in the WHERE clause
+    makes a concurrent claim of the same row match nothing. On PostgreSQL the oldest row is
+    locked with FOR UPDATE (not SKIP LOCKED): a concurrent claim for the same agent waits
+    and then claims nothing, instead of skipping ahead to a newer deployment.
+    Nothing is claimed while the oldest deployment's artifacts are still being prefetched;
+    deployments are installed in order, so newer ones wait behind it.
+    """
+    oldest_pending = (
+        select(DeploymentDB.id)
+        .where(DeploymentDB.agent_id == agent_id)
+        .where(DeploymentDB.status == DeploymentStatusEnum.PENDING)
+        .order_by(asc(DeploymentDB.created_at), asc(DeploymentDB.id))
+        .limit(1)
+        .with_for_update()  # Not rendered on SQLite, where writes are serialized
+        .scalar_subquery()
+    )
+    agent_name = (
+        select(AgentDB.name)
+        .where(AgentDB.id == DeploymentDB.agent_id)
+        .scalar_subquery()
+    )
     result = await db.execute(
-        select(DeploymentDB)
-        .options(selectinload(DeploymentDB.agent))
-        .order_by(desc(DeploymentDB.created_at))
-        .limit(limit)
+        update(DeploymentDB)
+        .where(DeploymentDB.id == oldest_pending)
+        .where(DeploymentDB.status == DeploymentStatusEnum.PENDING)
+        .where(DeploymentDB.artifacts_ready.is_(True))
+        .values(status=DeploymentStatusEnum.IN_PROGRESS, started_at=datetime.now())
+        .returning(DeploymentDB, agent_name)
     )
-    deployments_db = result.scalars().all()
+    row = result.first()
+    if row is not None:
+        await _set_item_status(db, row[0].id, DeploymentStatusEnum.IN_PROGRESS)
+    await db.commit()
     
-    return [
-        Deployment(
-            id=deployment.id,
-            agent_id=deployment.agent_id,
-            agent_name=deployment.agent.name if deployment.agent else "Unknown",
-            release_ids=deployment.release_ids or [],
-            release_tags=deployment.release_tags or [],
-            status=DeploymentStatus(deployment.status.value),
-            created_at=deployment.created_at,
-            started_at=deployment.started_at,
-            completed_at=deployment.completed_at,
-            error_message=deployment.error_message,
-        )
-        for deployment in deployments_db
-    ]
+    if row is None:
+        return None
+    
+    resource_versions.bump(DEPLOYMENTS)
+    deployment_db, name = row
+    return to_deployment_model(deployment_db, agent_name=name or "Unknown")
 
 
 @router.get("/pending/{agent_id}", response_model=Optional[Deployment])
-async def get_pending_deployment(agent_id: str, db: AsyncSession = Depends(get_db)):
+async def get_pending_deployment(
+    agent_id: str,
+    request: Request,
+    response: Response,
+    wait: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Get pending deployment for an agent (Agent polling endpoint)
     Returns the oldest PENDING deployment for the agent, or None if no pending deployment exists
+    - wait: Long-poll for up to this many seconds (capped) until a deployment is queued
+    A deployment whose artifacts are still being prefetched is not returned; the response
+    then carries Retry-After, and a long-poll is woken as soon as the artifacts are ready.
     """
-    # Verify agent exists
-    result = await db.execute(select(AgentDB).where(AgentDB.id == agent_id))
-    agent_db = result.scalar_one_or_none()
-    
-    if not agent_db:
-        raise HTTPException(status_code=404, detail="Agent not found")
+    # Observe the notification generation before claiming so no signal is lost
+    generation = deployment_notifier.generation(agent_id)
+    deployment = await claim_pending_deployment(db, agent_id)
+    if deployment:
+        return deployment
     
-    # Get oldest PENDING deployment for this agent
-    result = await db.execute(
-        select(DeploymentDB)
-        .options(selectinload(DeploymentDB.agent))
+    # Only look the agent up when there is nothing to hand out
+    warming = (
+        exists()
         .where(DeploymentDB.agent_id == agent_id)
         .where(DeploymentDB.status == DeploymentStatusEnum.PENDING)
-        .order_by(asc(DeploymentDB.created_at))
-        .limit(1)
+        .where(DeploymentDB.artifacts_ready.is_(False))
     )
-    deployment_db = result.scalar_one_or_none()
-    
-    if not deployment_db:
-        return None
+    result = await db.execute(select(AgentDB.id, warming).where(AgentDB.id == agent_id))
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if row[1]:
+        response.headers["Retry-After"] = str(ARTIFACT_PREFETCH_RETRY_AFTER_SECONDS)
     
-    # Update status to IN_PROGRESS and set started_at
-    deployment_db.status = DeploymentStatusEnum.IN_PROGRESS
-    deployment_db.started_at = datetime.now()
-    await db.commit()
-    await db.refresh(deployment_db)
+    if wait > 0:
+        # Release the database connection while parked
+        await db.close()
+        try:
+            notified = await deployment_notifier.wait(
+                agent_id,
+                generation,
+                timeout=min(wait, LONG_POLL_MAX_WAIT_SECONDS),
+                is_disconnected=request.is_disconnected,
+            )
+        except LongPollCapacityError:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many long-poll requests, retry later",
+                headers={"Retry-After": "10"},
+            )
+        if notified:
+            deployment = await claim_pending_deployment(db, agent_id)
     
-    return Deployment(
-        id=deployment_db.id,
-        agent_id=deployment_db.agent_id,
-        agent_name=deployment_db.agent.name if deployment_db.agent else "Unknown",
-        release_ids=deployment_db.release_ids or [],
-        release_tags=deployment_db.release_tags or [],
-        status=DeploymentStatus(deployment_db.status.value),
-        created_at=deployment_db.created_at,
-        started_at=deployment_db.started_at,
-        completed_at=deployment_db.completed_at,
-        error_message=deployment_db.error_message,
-    )
+    return deployment
 
 
 @router.get("/{deployment_id}", response_model=Deployment)
-async def get_deployment(deployment_id: str, db: AsyncSession = Depends(get_db)):
-    """Get specific deployment"""
+async def get_deployment(
+    deployment_id: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get specific deployment (supports If-None-Match)"""
+    not_modified = resource_versions.not_modified(request, response, DEPLOYMENTS)
+    if not_modified:
+        return not_modified
+    
     result = await db.execute(
         select(DeploymentDB)
         .options(selectinload(DeploymentDB.agent))
@@ -149,18 +420,7 @@ async def get_deployment(deployment_id: str, db: AsyncSession = Depends(get_db))
     if not deployment_db:
         raise HTTPException(status_code=404, detail="Deployment not found")
     
-    return Deployment(
-        id=deployment_db.id,
-        agent_id=deployment_db.agent_id,
-        agent_name=deployment_db.agent.name if deployment_db.agent else "Unknown",
-        release_ids=deployment_db.release_ids or [],
-        release_tags=deployment_db.release_tags or [],
-        status=DeploymentStatus(deployment_db.status.value),
-        created_at=deployment_db.created_at,
-        started_at=deployment_db.started_at,
-        completed_at=deployment_db.completed_at,
-        error_message=deployment_db.error_message,
-    )
+    return to_deployment_model(deployment_db)
 
 
 @router.post("", response_model=Deployment)
@@ -174,55 +434,161 @@ async def create_deployment(deployment_data: DeploymentCreate, db: AsyncSession
         raise HTTPException(status_code=404, detail="Agent not found")
     
     # Validate all releases exist and use selected versions if provided
-    release_tags = []
-    if deployment_data.release_versions and len(deployment_data.release_versions) == len(deployment_data.release_ids):
-        # Use provided version tags
-        release_tags = deployment_data.release_versions
-    else:
-        # Fallback to release tag_name if versions not provided
-        for release_id in deployment_data.release_ids:
-            result = await db.execute(select(ReleaseDB).where(ReleaseDB.id == release_id))
-            release_db = result.scalar_one_or_none()
-            if not release_db:
-                raise HTTPException(status_code=404, detail=f"Release {release_id} not found")
-            release_tags.append(release_db.tag_name)
+    release_tags = await _resolve_release_tags(db, deployment_data.release_ids, deployment_data.release_versions)
     
     # Create deployment
     deployment_id = f"deploy-{agent_db.id}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
     
+    # Release assets that are not in the artifact cache yet are prefetched before the agent can claim it
+    warmup = await artifact_prefetcher.plan(
+        db, [(deployment_id, agent_db.id, agent_db.platform)], deployment_data.release_ids, release_tags
+    )
+    
     deployment_db = DeploymentDB(
         id=deployment_id,
         agent_id=deployment_data.agent_id,
         release_ids=deployment_data.release_ids,
         release_tags=release_tags,
         status=DeploymentStatusEnum.PENDING,
-        created_at=datetime.now()
+        created_at=datetime.now(),
+        artifacts_ready=not warmup,
     )
     
     db.add(deployment_db)
+    await db.execute(
+        insert(DeploymentItemDB),
+        _item_rows(deployment_id, deployment_data.release_ids, release_tags),
+    )
     await db.commit()
     await db.refresh(deployment_db)
+    resource_versions.bump(DEPLOYMENTS)
+    artifact_prefetcher.enqueue(warmup)
     
     # Load agent relationship for response
     await db.refresh(deployment_db, ['agent'])
     
     # Deployment is created in PENDING state
-    # Agent will poll /api/deployments/pending/{agent_id} to retrieve and execute it
+    # Agent will poll /api/deployments/pending/{agent_id} to retrieve and execute it;
+    # wake up a long-polling agent right away
+    deployment_notifier.notify(deployment_db.agent_id)
     
-    return Deployment(
-        id=deployment_db.id,
-        agent_id=deployment_db.agent_id,
-        agent_name=deployment_db.agent.name if deployment_db.agent else "Unknown",
-        release_ids=deployment_db.release_ids or [],
-        release_tags=deployment_db.release_tags or [],
-        status=DeploymentStatus(deployment_db.status.value),
-        created_at=deployment_db.created_at,
-        started_at=deployment_db.started_at,
-        completed_at=deployment_db.completed_at,
-        error_message=deployment_db.error_message,
+    return to_deployment_model(deployment_db)
+
+
+@router.post("/rollouts", response_model=Rollout)
+async def create_rollout(rollout_data: RolloutCreate, db: AsyncSession = Depends(get_db)):
+    """
+    Deploy releases to every agent matching a target selector in one request
+    Releases are validated once and all deployments are inserted with a single bulk INSERT
+    - target.agent_ids: Explicit agent list
+    - target.platform: Only agents of this platform
+    - target.online_only: Only agents with a recent heartbeat
+    """
+    target = rollout_data.target
+    if target.agent_ids is None and not target.platform and not target.online_only:
+        raise HTTPException(status_code=400, detail="Rollout target must select agents")
+    
+    release_tags = await _resolve_release_tags(db, rollout_data.release_ids, rollout_data.release_versions)
+    
+    query = select(AgentDB.id, AgentDB.name, AgentDB.platform)
+    if target.agent_ids is not None:
+        query = query.where(AgentDB.id.in_(target.agent_ids))
+    if target.platform:
+        query = query.where(AgentDB.platform == target.platform)
+    if target.online_only:
+        cutoff = datetime.now() - timedelta(seconds=HEARTBEAT_TIMEOUT_SECONDS)
+        query = query.where(AgentDB.status == AgentStatusEnum.ONLINE, AgentDB.last_seen >= cutoff)
+    result = await db.execute(query.order_by(AgentDB.name))
+    agents = result.all()
+    
+    if not agents:
+        raise HTTPException(status_code=404, detail="No agents match the rollout target")
+    
+    created_at = datetime.now()
+    rollout_id = f"rollout-{created_at.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    # The rollout suffix keeps ids unique when an agent gets several deployments in the same second
+    suffix = rollout_id.rsplit("-", 1)[-1]
+    deployment_ids = [f"deploy-{agent_id}-{created_at.strftime('%Y%m%d%H%M%S')}-{suffix}" for agent_id, _, _ in agents]
+    # Agents of the same platform share one prefetch job per asset
+    warmup = await artifact_prefetcher.plan(
+        db,
+        [(deployment_id, agent_id, platform) for deployment_id, (agent_id, _, platform) in zip(deployment_ids, agents)],
+        rollout_data.release_ids,
+        release_tags,
+    )
+    warming = {plan.deployment_id for plan in warmup}
+    rows = [
+        {
+            "id": deployment_id,
+            "agent_id": agent_id,
+            "release_ids": rollout_data.release_ids,
+            "release_tags": release_tags,
+            "status": DeploymentStatusEnum.PENDING,
+            "created_at": created_at,
+            "rollout_id": rollout_id,
+            "artifacts_ready": deployment_id not in warming,
+        }
+        for deployment_id, (agent_id, _, _) in zip(deployment_ids, agents)
+    ]
+    await db.execute(insert(DeploymentDB), rows)
+    await db.execute(insert(DeploymentItemDB), [
+        item
+        for row in rows
+        for item in _item_rows(row["id"], rollout_data.release_ids, release_tags)
+    ])
+    await db.commit()
+    resource_versions.bump(DEPLOYMENTS)
+    artifact_prefetcher.enqueue(warmup)
+    
+    # Wake up every targeted agent that is long-polling or connected to the push channel
+    for agent_id, _, _ in agents:
+        deployment_notifier.notify(agent_id)
+    
+    matched = {agent_id for agent_id, _, _ in agents}
+    return Rollout(
+        rollout_id=rollout_id,
+        release_ids=rollout_data.release_ids,
+        release_tags=release_tags,
+        created_at=created_at,
+        deployments=[
+            RolloutDeployment(agent_id=agent_id, agent_name=name, deployment_id=row["id"])
+            for (agent_id, name, _), row in zip(agents, rows)
+        ],
+        missing_agent_ids=[agent_id for agent_id in target.agent_ids or [] if agent_id not in matched],
     )
 
 
+@router.post("/{deployment_id}/cancel")
+async def cancel_deployment(deployment_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Cancel a deployment that has not finished yet
+    The deployment is marked FAILED and a cancel event is pushed to a connected agent
+    """
+    result = await db.execute(select(DeploymentDB).where(DeploymentDB.id == deployment_id))
+    deployment_db = result.scalar_one_or_none()
+    
+    if not deployment_db:
+        raise HTTPException(status_code=404, detail="Deployment not found")
+    
+    if deployment_db.status in (DeploymentStatusEnum.SUCCESS, DeploymentStatusEnum.FAILED):
+        raise HTTPException(status_code=400, detail="Deployment has already finished")
+    
+    deployment_db.status = DeploymentStatusEnum.FAILED
+    deployment_db.completed_at = datetime.now()
+    deployment_db.error_message = "Cancelled by user"
+    await _set_item_status(db, deployment_id, DeploymentStatusEnum.FAILED)
+    await db.commit()
+    resource_versions.bump(DEPLOYMENTS)
+    
+    pushed = await agent_channels.send(deployment_db.agent_id, "cancel", {"deployment_id": deployment_id})
+    
+    return {
+        "message": "Deployment cancelled",
+        "deployment_id": deployment_id,
+        "agent_notified": pushed,
+    }
+
+
 @router.post("/{deployment_id}/complete")
 async def complete_deployment(
     deployment_id: str,
@@ -231,14 +597,10 @@ async def complete_deployment(
 ):
     """
     Report deployment completion (Agent reports deployment result)
+    Only a PENDING or IN_PROGRESS deployment can complete: the status guard is part of the
+    UPDATE, so a report racing a cancel (or a repeated report) gets 409 instead of
+    overwriting the finished deployment.
     """
-    # Get deployment
-    result = await db.execute(select(DeploymentDB).where(DeploymentDB.id == deployment_id))
-    deployment_db = result.scalar_one_or_none()
-    
-    if not deployment_db:
-        raise HTTPException(status_code=404, detail="Deployment not found")
-    
     # Validate status
     if completion_data.status not in [DeploymentStatus.SUCCESS, DeploymentStatus.FAILED]:
         raise HTTPException(
@@ -247,13 +609,33 @@ async def complete_deployment(
         )
     
     # Update deployment status
-    deployment_db.status = DeploymentStatusEnum(completion_data.status.value)
-    deployment_db.completed_at = datetime.now()
+    values = {
+        "status": DeploymentStatusEnum(completion_data.status.value),
+        "completed_at": datetime.now(),
+    }
     if completion_data.error_message:
-        deployment_db.error_message = completion_data.error_message
+        values["error_message"] = completion_data.error_message
+    result = await db.execute(
+        update(DeploymentDB)
+        .where(DeploymentDB.id == deployment_id)
+        .where(DeploymentDB.status.in_([DeploymentStatusEnum.PENDING, DeploymentStatusEnum.IN_PROGRESS]))
+        .values(**values)
+        .returning(DeploymentDB)
+    )
+    deployment_db = result.scalar_one_or_none()
+    
+    if not deployment_db:
+        exists = await db.scalar(select(DeploymentDB.id).where(DeploymentDB.id == deployment_id))
+        if not exists:
+            raise HTTPException(status_code=404, detail="Deployment not found")
+        raise HTTPException(status_code=409, detail="Deployment has already finished")
+    
+    await _set_item_status(db, deployment_id, deployment_db.status)
+    if deployment_db.status == DeploymentStatusEnum.SUCCESS:
+        await _record_installed_releases(db, deployment_db)
     
     await db.commit()
-    await db.refresh(deployment_db)
+    resource_versions.bump(DEPLOYMENTS)
     
     return {
         "message": "Deployment status updated",
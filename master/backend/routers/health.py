@@ -2,43 +2,66 @@
 Health Check and Monitoring Routes
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from datetime import datetime
+import time
 
 from database import get_db, engine, IS_SQLITE
-from db_models import AgentDB, ReleaseDB, DeploymentDB
+from db_models import AgentDB, ReleaseDB, DeploymentDB, DeploymentStatusEnum
 from monitoring import get_metrics_summary, get_pending_deployment_metrics
+from metrics_collector import get_metrics as get_collected_metrics
+from prometheus_exposition import prometheus_exposition, MetricFamily, CONTENT_TYPE
+from rolling_window import WINDOWS
+from event_loop_monitor import event_loop_monitor
+from heartbeat_buffer import heartbeat_buffer
+from agent_sweeper import agent_sweeper
+from deployment_notifier import deployment_notifier
+from agent_connections import agent_channels
+from resource_versions import resource_versions
+from github_releases import github_release_cache
+from http_client import http_client
+from github_rate_limit import github_rate_limiter
+from singleflight import single_flight
+from release_catalog import release_catalog
+from artifact_store import artifact_store
+from artifact_prefetch import artifact_prefetcher
+from artifact_delta import artifact_deltas
+from config import METRICS_TOP_AGENTS
 
 router = APIRouter(tags=["health"])
 
+PROCESS_START_TIME = time.time()
 
-@router.get("/api/health")
-async def health_check(db: AsyncSession = Depends(get_db)):
-    """Health check"""
-    # Count records from database
-    agents_count = await db.scalar(select(func.count(AgentDB.id)))
-    releases_count = await db.scalar(select(func.count(ReleaseDB.id)))
-    deployments_count = await db.scalar(select(func.count(DeploymentDB.id)))
-    
-    # Get database connection pool stats (only for PostgreSQL, SQLite doesn't use pooling)
+
+def _database_pool_stats() -> dict:
+    """Database connection pool stats (only for PostgreSQL, SQLite doesn't use pooling)"""
     if IS_SQLITE:
-        pool_stats = {
+        return {
             "note": "SQLite does not use connection pooling",
             "size": None,
             "checked_in": None,
             "checked_out": None,
             "overflow": None,
         }
-    else:
-        pool = engine.pool
-        pool_stats = {
-            "size": pool.size() if hasattr(pool, 'size') else None,
-            "checked_in": pool.checkedin() if hasattr(pool, 'checkedin') else None,
-            "checked_out": pool.checkedout() if hasattr(pool, 'checkedout') else None,
-            "overflow": pool.overflow() if hasattr(pool, 'overflow') else None,
-        }
+    pool = engine.pool
+    return {
+        "size": pool.size() if hasattr(pool, 'size') else None,
+        "checked_in": pool.checkedin() if hasattr(pool, 'checkedin') else None,
+        "checked_out": pool.checkedout() if hasattr(pool, 'checkedout') else None,
+        "overflow": pool.overflow() if hasattr(pool, 'overflow') else None,
+    }
+
+
+@router.get("/api/health")
+async def health_check(db: AsyncSession = Depends(get_db)):
+    """Health check"""
+    # Count records from database
+    agents_count = await db.scalar(select(func.count(AgentDB.id)))
+    releases_count = await db.scalar(select(func.count(ReleaseDB.id)))
+    deployments_count = await db.scalar(select(func.count(DeploymentDB.id)))
     
     return {
         "status": "healthy",
@@ -46,18 +69,75 @@ async def health_check(db: AsyncSession = Depends(get_db)):
         "agents_count": agents_count or 0,
         "releases_count": releases_count or 0,
         "deployments_count": deployments_count or 0,
-        "database_pool": pool_stats
+        "database_pool": _database_pool_stats(),
+        "outbound_http_pool": http_client.get_stats(),
     }
 
 
 @router.get("/api/metrics")
-async def get_metrics():
+async def get_metrics(
+    window: Optional[str] = Query(None, description="Recent traffic only: 1m, 5m or 1h (default: since start)")
+):
     """Get API metrics summary"""
-    return get_metrics_summary()
+    if window is not None and window not in WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window must be one of: {', '.join(WINDOWS)}")
+    summary = get_metrics_summary(window)
+    summary["heartbeat_ingest"] = heartbeat_buffer.get_stats()
+    summary["agent_sweeper"] = agent_sweeper.get_stats()
+    summary["long_poll"] = deployment_notifier.get_stats()
+    summary["agent_channels"] = agent_channels.get_stats()
+    summary["conditional_get"] = resource_versions.get_stats()
+    summary["github_releases"] = github_release_cache.get_stats()
+    summary["github_rate_limit"] = github_rate_limiter.get_stats()
+    summary["single_flight"] = single_flight.get_stats()
+    summary["release_catalog"] = release_catalog.get_stats()
+    summary["artifact_cache"] = artifact_store.get_stats()
+    summary["artifact_prefetch"] = artifact_prefetcher.get_stats()
+    summary["artifact_deltas"] = artifact_deltas.get_stats()
+    summary["event_loop"] = event_loop_monitor.get_stats()
+    return summary
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_prometheus_metrics(db: AsyncSession = Depends(get_db)):
+    """Metrics in the Prometheus text exposition format, for scraping"""
+    result = await db.execute(
+        select(DeploymentDB.status, func.count())
+        .where(DeploymentDB.status.in_([DeploymentStatusEnum.PENDING, DeploymentStatusEnum.IN_PROGRESS]))
+        .group_by(DeploymentDB.status)
+    )
+    deployment_counts = {status: count for status, count in result.all()}
+    
+    deployments = MetricFamily("master_deployments", "gauge", "Deployments waiting for or being installed by agents")
+    for status in (DeploymentStatusEnum.PENDING, DeploymentStatusEnum.IN_PROGRESS):
+        deployments.add(deployment_counts.get(status, 0), [("status", status.value)])
+    
+    heartbeat_stats = heartbeat_buffer.get_stats()
+    heartbeats = MetricFamily("master_heartbeats_received_total", "counter", "Agent heartbeats received (HTTP and push channel)")
+    heartbeats.add(heartbeat_stats["heartbeats_received"])
+    heartbeats_pending = MetricFamily("master_heartbeats_pending", "gauge", "Buffered heartbeats not yet written to the database")
+    heartbeats_pending.add(heartbeat_stats["pending"])
+    
+    lag = MetricFamily("master_event_loop_last_lag_seconds", "gauge", "Lag of the latest event loop probe")
+    lag.add(event_loop_monitor.last_lag_ms / 1000)
+    
+    started = MetricFamily("master_process_start_time_seconds", "gauge", "Start time of the process (Unix time)")
+    started.add(PROCESS_START_TIME)
+    
+    gauges = [deployments, heartbeats, heartbeats_pending, lag, started]
+    if not IS_SQLITE:
+        pool = MetricFamily("master_db_pool_connections", "gauge", "Database pool connections by state")
+        for state, value in _database_pool_stats().items():
+            if value is not None:
+                pool.add(value, [("state", state)])
+        gauges.append(pool)
+    
+    body = prometheus_exposition.render(get_collected_metrics(), gauges, event_loop_monitor.histogram)
+    return Response(content=body, media_type=CONTENT_TYPE)
 
 
 @router.get("/api/metrics/pending-deployments")
-async def get_pending_deployment_metrics_endpoint():
-    """Get specific metrics for pending deployment endpoint"""
-    return get_pending_deployment_metrics()
+async def get_pending_deployment_metrics_endpoint(top_agents: int = Query(10, ge=0, le=METRICS_TOP_AGENTS)):
+    """Get specific metrics for pending deployment endpoint, with the agents polling most"""
+    return get_pending_deployment_metrics(top_agents)
 
@@ -2,27 +2,35 @@
 Release Management Routes
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List, Optional
 from sqlalchemy import select, delete
-from typing import List
+from typing import AsyncIterator, List
 from datetime import datetime
-import re
-import httpx
+import json
+import math
 from pydantic import BaseModel
 
 from database import get_db
-from db_models import ReleaseDB, SettingsDB
+from db_models import ReleaseDB, ReleaseVersionDB
 from models import Release, ReleaseCreate, ReleaseUpdate
+from resource_versions import resource_versions, RELEASES
+from github_releases import github_release_cache, GitHubAPIError
+from github_rate_limit import Priority
+from release_catalog import release_catalog, parse_github_repo, load_github_token
+from singleflight import single_flight
 
 router = APIRouter(prefix="/api/releases", tags=["releases"])
 
 
 @router.get("", response_model=List[Release])
-async def get_releases(db: AsyncSession = Depends(get_db)):
-    """List all releases"""
+async def get_releases(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """List all releases (supports If-None-Match)"""
+    not_modified = resource_versions.not_modified(request, response, RELEASES)
+    if not_modified:
+        return not_modified
+    
     result = await db.execute(select(ReleaseDB))
     releases_db = result.scalars().all()
     
@@ -42,8 +50,19 @@ async def get_releases(db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/{release_id}", response_model=Release)
-async def get_release(release_id: str, db: AsyncSession = Depends(get_db)):
-    """Get specific release"""
+async def get_release(release_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Get specific release (supports If-None-Match)"""
+    not_modified = resource_versions.not_modified(request, response, RELEASES)
+    if not_modified:
+        return not_modified
+    
+    # Agents fetch the release being rolled out all at once; concurrent reads share one query
+    return await single_flight.do(
+        "get_release", (release_id, resource_versions.version(RELEASES)), lambda: _load_release(db, release_id)
+    )
+
+
+async def _load_release(db: AsyncSession, release_id: str) -> Release:
     result = await db.execute(select(ReleaseDB).where(ReleaseDB.id == release_id))
     release_db = result.scalar_one_or_none()
     
@@ -68,13 +87,12 @@ async def create_release(release_data: ReleaseCreate, db: AsyncSession = Depends
     # Extract owner and repo from GitHub URL
     # Example: https://github.com/jameskwon07/3project/releases/
     github_url = release_data.github_url.rstrip('/')
-    pattern = r'https://github\.com/([^/]+)/([^/]+)'
-    match = re.match(pattern, github_url)
+    repository = parse_github_repo(github_url)
     
-    if not match:
+    if repository is None:
         raise HTTPException(status_code=400, detail="Invalid GitHub URL format")
     
-    owner, repo = match.groups()
+    owner, repo = repository
     
     # Use repo name as the unique ID and display name
     release_id = repo
@@ -103,6 +121,7 @@ async def create_release(release_data: ReleaseCreate, db: AsyncSession = Depends
     db.add(release_db)
     await db.commit()
     await db.refresh(release_db)
+    resource_versions.bump(RELEASES)
     
     return Release(
         id=release_db.id,
@@ -139,6 +158,7 @@ async def update_release(
     
     await db.commit()
     await db.refresh(release_db)
+    resource_versions.bump(RELEASES)
     
     return Release(
         id=release_db.id,
@@ -164,6 +184,7 @@ async def delete_release(release_id: str, db: AsyncSession = Depends(get_db)):
     # Use delete statement for SQLAlchemy 2.0 async
     await db.execute(delete(ReleaseDB).where(ReleaseDB.id == release_id))
     await db.commit()
+    resource_versions.bump(RELEASES)
     return {"message": "Release deleted"}
 
 
@@ -176,16 +197,79 @@ class GitHubReleaseVersion(BaseModel):
     assets: List[dict] = []
 
 
-async def get_github_token_from_db(db: AsyncSession) -> Optional[str]:
-    """Get GitHub token from database"""
-    result = await db.execute(select(SettingsDB).where(SettingsDB.key == "github_token"))
-    settings_db = result.scalar_one_or_none()
-    return settings_db.value if settings_db and settings_db.value else None
+def _to_version(release: dict) -> GitHubReleaseVersion:
+    return GitHubReleaseVersion(
+        tag_name=release.get("tag_name", ""),
+        name=release.get("name", release.get("tag_name", "")),
+        published_at=release.get("published_at", ""),
+        html_url=release.get("html_url", ""),
+        assets=release.get("assets", [])
+    )
+
+
+async def _ndjson_versions(first_page: List[dict], pages: AsyncIterator[List[dict]]):
+    """One JSON version per line; a failure after the first page ends the stream with an error line"""
+    for release in first_page:
+        yield _to_version(release).model_dump_json() + "\n"
+    try:
+        async for page in pages:
+            for release in page:
+                yield _to_version(release).model_dump_json() + "\n"
+    except GitHubAPIError as e:
+        yield json.dumps({"error": e.detail, "status_code": e.status_code}) + "\n"
+
+
+def _catalog_version(version_db: ReleaseVersionDB) -> GitHubReleaseVersion:
+    return GitHubReleaseVersion(
+        tag_name=version_db.tag,
+        name=version_db.name,
+        published_at=version_db.published_at.isoformat() + "Z" if version_db.published_at else "",
+        html_url=version_db.html_url or "",
+        assets=version_db.assets or [],
+    )
+
+
+def _github_http_error(e: GitHubAPIError) -> HTTPException:
+    """HTTPException for a GitHub failure; rate limited requests tell the client when to retry"""
+    headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after is not None else None
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+
+
+async def _sync_catalog(db: AsyncSession, release_db: ReleaseDB):
+    """Sync one release into the catalog now, reporting GitHub failures with their status code"""
+    github_token = await load_github_token(db)
+    try:
+        await release_catalog.sync_release(
+            release_db.id, release_db.download_url, github_token, session=db, priority=Priority.INTERACTIVE
+        )
+    except GitHubAPIError as e:
+        raise _github_http_error(e)
+
+
+async def _catalog_versions(db: AsyncSession, release_id: str) -> List[ReleaseVersionDB]:
+    result = await db.execute(
+        select(ReleaseVersionDB)
+        .where(ReleaseVersionDB.release_id == release_id)
+        .order_by(ReleaseVersionDB.published_at.desc().nulls_last(), ReleaseVersionDB.tag.desc())
+    )
+    return list(result.scalars().all())
 
 
 @router.get("/{release_id}/versions", response_model=List[GitHubReleaseVersion])
-async def get_release_versions(release_id: str, db: AsyncSession = Depends(get_db)):
-    """Get available versions from GitHub releases for a specific release"""
+async def get_release_versions(
+    release_id: str,
+    stream: bool = False,
+    refresh: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get available versions of a release, newest first
+    Versions come from the release catalog kept by the background sync; GitHub is only
+    called when a release has no versions yet or with refresh=true
+    - refresh: Sync this release from GitHub before answering
+    - stream: Read GitHub directly and answer with NDJSON (one version per line)
+      written as pages arrive, for repositories with hundreds of releases
+    """
     # Get release from database
     result = await db.execute(select(ReleaseDB).where(ReleaseDB.id == release_id))
     release_db = result.scalar_one_or_none()
@@ -193,59 +277,55 @@ async def get_release_versions(release_id: str, db: AsyncSession = Depends(get_d
     if not release_db:
         raise HTTPException(status_code=404, detail="Release not found")
     
-    # Extract owner and repo from GitHub URL
-    github_url = release_db.download_url.rstrip('/')
-    pattern = r'https://github\.com/([^/]+)/([^/]+)'
-    match = re.match(pattern, github_url)
-    
-    if not match:
+    repository = parse_github_repo(release_db.download_url)
+    if repository is None:
         raise HTTPException(status_code=400, detail="Invalid GitHub URL format")
     
-    owner, repo = match.groups()
-    
-    # Get GitHub token
-    github_token = await get_github_token_from_db(db)
+    if stream:
+        owner, repo = repository
+        github_token = await load_github_token(db)
+        pages = github_release_cache.stream_releases(owner, repo, github_token)
+        # Wait for the first page so request errors still get their status code
+        try:
+            first_page = await pages.__anext__()
+        except StopAsyncIteration:
+            first_page = []
+        except GitHubAPIError as e:
+            raise _github_http_error(e)
+        return StreamingResponse(_ndjson_versions(first_page, pages), media_type="application/x-ndjson")
     
-    # Fetch releases from GitHub API
-    headers = {}
-    if github_token:
-        headers["Authorization"] = f"token {github_token}"
+    # Identical concurrent requests share one catalog read (and one GitHub sync)
+    return await single_flight.do(
+        "get_release_versions",
+        (release_id, refresh, resource_versions.version(RELEASES)),
+        lambda: _load_versions(db, release_db, refresh),
+    )
+
+
+async def _load_versions(db: AsyncSession, release_db: ReleaseDB, refresh: bool) -> List[GitHubReleaseVersion]:
+    versions = [] if refresh else await _catalog_versions(db, release_db.id)
+    if not versions:
+        await _sync_catalog(db, release_db)
+        versions = await _catalog_versions(db, release_db.id)
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"https://api.github.com/repos/{owner}/{repo}/releases",
-                headers=headers,
-                timeout=10.0
-            )
-            
-            if response.status_code == 404:
-                raise HTTPException(status_code=404, detail="GitHub repository not found")
-            elif response.status_code == 401:
-                raise HTTPException(status_code=401, detail="GitHub authentication failed. Please check your GitHub token.")
-            elif not response.is_success:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to fetch GitHub releases: {response.text}"
-                )
-            
-            releases_data = response.json()
-            
-            # Convert to response model
-            versions = []
-            for release in releases_data:
-                versions.append(GitHubReleaseVersion(
-                    tag_name=release.get("tag_name", ""),
-                    name=release.get("name", release.get("tag_name", "")),
-                    published_at=release.get("published_at", ""),
-                    html_url=release.get("html_url", ""),
-                    assets=release.get("assets", [])
-                ))
-            
-            return versions
-            
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="GitHub API request timeout")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=503, detail=f"Failed to connect to GitHub API: {str(e)}")
+    return [_catalog_version(version_db) for version_db in versions]
 
+
+@router.get("/{release_id}/versions/{tag:path}", response_model=GitHubReleaseVersion)
+async def get_release_version(release_id: str, tag: str, db: AsyncSession = Depends(get_db)):
+    """
+    Get one version of a release with its assets (used by agents before downloading)
+    Read from the release catalog; a tag the catalog does not know yet triggers a sync
+    """
+    version_db = await db.get(ReleaseVersionDB, (release_id, tag))
+    if version_db is None:
+        result = await db.execute(select(ReleaseDB).where(ReleaseDB.id == release_id))
+        release_db = result.scalar_one_or_none()
+        if not release_db:
+            raise HTTPException(status_code=404, detail="Release not found")
+        await _sync_catalog(db, release_db)
+        version_db = await db.get(ReleaseVersionDB, (release_id, tag))
+    
+    if version_db is None:
+        raise HTTPException(status_code=404, detail=f"Version {tag} not found")
+    return _catalog_version(version_db)
@@ -0,0 +1,65 @@
+"""
+Single-flight request coalescing
+Concurrent identical reads share one execution instead of each querying the database or GitHub
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    In-flight calls keyed by (name, key).
+    - The first caller (the leader) runs the call; callers arriving while it runs await the
+      same task and get the same result or exception
+    - Nothing is cached: once the call finishes the next caller runs it again
+    - The call runs on the leader's resources (e.g. its database session), so it is cancelled
+      with the leader; followers of a cancelled call run it themselves
+    Keys should include the resource version (resource_versions) so a caller never joins
+    a read that started before a write it has already seen.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def do(self, name: str, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Result of call(), shared with identical concurrent calls"""
+        stats = self._stats.setdefault(name, {"calls": 0, "executions": 0, "coalesced": 0})
+        stats["calls"] += 1
+        flight_key = (name, key)
+
+        while True:
+            task = self._flights.get(flight_key)
+            if task is None or task.done():
+                break
+            stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise  # This caller was cancelled
+            # The leader went away; join a newer flight or run the call for this caller
+            stats["coalesced"] -= 1
+
+        stats["executions"] += 1
+        task = asyncio.ensure_future(call())
+        self._flights[flight_key] = task
+        task.add_done_callback(lambda done: self._forget(flight_key, done))
+        return await task
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Calls, executions and coalesced calls per name"""
+        return {
+            "in_flight": len(self._flights),
+            "calls": {name: dict(stats) for name, stats in self._stats.items()},
+        }
+
+    def _forget(self, flight_key: Tuple[str, Hashable], task: asyncio.Task):
+        if self._flights.get(flight_key) is task:
+            del self._flights[flight_key]
+
+
+single_flight = SingleFlight()
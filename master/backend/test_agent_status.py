@@ -0,0 +1,165 @@
+"""
+Unit tests for agent registration and status handling
+Tests the registration upsert, the background offline sweeper and read-only status reporting
+"""
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime, timedelta
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, AgentStatusEnum
+from agent_sweeper import AgentStatusSweeper
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """Create one fresh and one stale agent, both marked ONLINE"""
+    stale_seen = datetime.now() - timedelta(minutes=5)
+    async with TestSessionLocal() as session:
+        session.add(AgentDB(
+            id="agent-fresh",
+            name="FreshAgent",
+            platform="windows",
+            version="1.0.0",
+            status=AgentStatusEnum.ONLINE,
+            last_seen=datetime.now(),
+        ))
+        session.add(AgentDB(
+            id="agent-stale",
+            name="StaleAgent",
+            platform="macos",
+            version="1.0.0",
+            status=AgentStatusEnum.ONLINE,
+            last_seen=stale_seen,
+        ))
+        await session.commit()
+    return {"stale_seen": stale_seen}
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(setup_database, test_data):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _get_status(agent_id: str) -> AgentStatusEnum:
+    async with TestSessionLocal() as session:
+        result = await session.execute(select(AgentDB.status).where(AgentDB.id == agent_id))
+        return result.scalar_one()
+
+
+class TestAgentStatus:
+    """Test suite for agent status sweeping"""
+
+    @pytest.mark.asyncio
+    async def test_list_reports_stale_agent_offline_without_writing(self, client):
+        """GET /api/agents derives OFFLINE for stale agents but leaves the row untouched"""
+        response = await client.get("/api/agents")
+        assert response.status_code == 200
+        statuses = {agent["id"]: agent["status"] for agent in response.json()}
+        assert statuses == {"agent-fresh": "online", "agent-stale": "offline"}
+
+        assert await _get_status("agent-stale") == AgentStatusEnum.ONLINE
+
+    @pytest.mark.asyncio
+    async def test_sweeper_marks_only_stale_agents_offline(self, client, test_data):
+        """One sweep marks timed-out agents OFFLINE and keeps their last_seen"""
+        sweeper = AgentStatusSweeper(interval_seconds=60, timeout_seconds=30, session_factory=TestSessionLocal)
+        assert await sweeper.sweep() == 1
+
+        assert await _get_status("agent-stale") == AgentStatusEnum.OFFLINE
+        assert await _get_status("agent-fresh") == AgentStatusEnum.ONLINE
+
+        async with TestSessionLocal() as session:
+            last_seen = await session.scalar(select(AgentDB.last_seen).where(AgentDB.id == "agent-stale"))
+        assert last_seen == test_data["stale_seen"]
+
+        # Already OFFLINE rows are not touched again
+        assert await sweeper.sweep() == 0
+        assert sweeper.get_stats()["agents_marked_offline"] == 1
+
+
+class TestAgentRegistration:
+    """Test suite for the registration upsert"""
+
+    @pytest.mark.asyncio
+    async def test_register_existing_name_updates_same_row(self, client):
+        """Registering a known name updates the existing agent instead of inserting"""
+        response = await client.post("/api/agents/register", json={
+            "name": "StaleAgent",
+            "platform": "macos",
+            "version": "2.0.0",
+            "ip_address": "10.0.0.9",
+        })
+        assert response.status_code == 200
+        agent = response.json()
+        assert agent["id"] == "agent-stale"
+        assert agent["version"] == "2.0.0"
+        assert agent["status"] == "online"
+
+        response = await client.get("/api/agents")
+        assert len(response.json()) == 2
+
+    @pytest.mark.asyncio
+    async def test_register_new_name_inserts_agent(self, client):
+        """Registering an unknown name creates a new agent"""
+        response = await client.post("/api/agents/register", json={
+            "name": "NewAgent",
+            "platform": "windows",
+            "version": "1.0.0",
+        })
+        assert response.status_code == 200
+        assert response.json()["id"] not in ("agent-fresh", "agent-stale")
+
+        response = await client.get("/api/agents")
+        assert len(response.json()) == 3
+
+    @pytest.mark.asyncio
+    async def test_rename_to_existing_name_conflicts(self, client):
+        """Agent names are unique"""
+        response = await client.put("/api/agents/agent-fresh", json={"name": "StaleAgent"})
+        assert response.status_code == 409
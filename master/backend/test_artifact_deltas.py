@@ -0,0 +1,276 @@
+"""
+Unit tests for artifact deltas
+Tests the delta encoder and the delta download endpoint
+"""
+
+import asyncio
+import hashlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import ReleaseDB, ReleaseVersionDB
+from artifact_store import ArtifactStore
+from artifact_delta import ArtifactDeltaStore, DeltaFormatError, encode_delta, apply_delta
+from http_client import OutboundHTTPClient
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+def _edited(data: bytes, seed: int, edits: int = 20) -> bytes:
+    """data with small replacements, insertions and deletions"""
+    rng = random.Random(seed)
+    result = bytearray(data)
+    for _ in range(edits):
+        position = rng.randrange(len(result) - 1000)
+        result[position:position + rng.randrange(0, 200)] = rng.randbytes(rng.randrange(0, 200))
+    return bytes(result)
+
+
+FIRMWARE_V1 = random.Random(1).randbytes(400_000)
+FIRMWARE_V2 = _edited(FIRMWARE_V1, seed=2)
+FIRMWARE_V3 = random.Random(3).randbytes(400_000)  # Rewritten: a delta would not help
+
+
+class TestDeltaEncoding:
+    """Test suite for encode_delta / apply_delta"""
+
+    @pytest.mark.parametrize("block_size", [64, 2048])
+    def test_round_trip(self, block_size):
+        """Edited files are rebuilt exactly and the delta is much smaller"""
+        delta = encode_delta(FIRMWARE_V1, FIRMWARE_V2, block_size, max_literal_bytes=len(FIRMWARE_V2))
+        assert apply_delta(FIRMWARE_V1, delta) == FIRMWARE_V2
+        assert len(delta) < len(FIRMWARE_V2) // 5
+
+    def test_edge_cases(self):
+        """Empty, tiny and shifted inputs"""
+        for base, target in [
+            (b"", b"new"),
+            (b"old", b""),
+            (b"abc", b"abc"),
+            (FIRMWARE_V1, b"x" + FIRMWARE_V1),
+            (FIRMWARE_V1, FIRMWARE_V1[1000:] + FIRMWARE_V1[:1000]),
+        ]:
+            delta = encode_delta(base, target, 64, max_literal_bytes=len(target))
+            assert apply_delta(base, delta) == target
+
+    def test_unrelated_files_give_up(self):
+        """Encoding stops once the literal data exceeds the limit"""
+        assert encode_delta(FIRMWARE_V1, FIRMWARE_V3, 2048, max_literal_bytes=len(FIRMWARE_V3) // 2) is None
+
+    def test_wrong_base_is_detected(self):
+        delta = encode_delta(FIRMWARE_V1, FIRMWARE_V2, 2048, max_literal_bytes=len(FIRMWARE_V2))
+        with pytest.raises(DeltaFormatError):
+            apply_delta(FIRMWARE_V1[:1000], delta)
+        with pytest.raises(DeltaFormatError):
+            apply_delta(FIRMWARE_V1, b"garbage")
+
+
+class AssetServer:
+    """Serves three versions of a firmware file on a local port"""
+
+    def __init__(self):
+        self.files = {
+            "/v1/firmware.bin": FIRMWARE_V1,
+            "/v2/firmware.bin": FIRMWARE_V2,
+            "/v3/firmware.bin": FIRMWARE_V3,
+        }
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = server.files[self.path]
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def asset_server():
+    server = AssetServer()
+    yield server
+    server.stop()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database, asset_server):
+    """Three catalogued versions of a release"""
+    async with TestSessionLocal() as session:
+        session.add(ReleaseDB(
+            id="firmware",
+            tag_name="v1",
+            name="firmware",
+            version="",
+            release_date=datetime.now(),
+            download_url="https://github.com/acme/firmware",
+        ))
+        for tag in ["v1", "v2", "v3"]:
+            session.add(ReleaseVersionDB(
+                release_id="firmware",
+                tag=tag,
+                name=tag,
+                html_url="",
+                assets=[{
+                    "id": 1,
+                    "name": "firmware.bin",
+                    "size": len(asset_server.files[f"/{tag}/firmware.bin"]),
+                    "content_type": "application/octet-stream",
+                    "updated_at": "2024-01-01T00:00:00Z",
+                    "browser_download_url": f"{asset_server.base_url}/{tag}/firmware.bin",
+                }],
+                synced_at=datetime.now(),
+            ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def deltas(tmp_path, test_data, monkeypatch):
+    client = OutboundHTTPClient(
+        max_connections=10,
+        max_keepalive_connections=5,
+        keepalive_expiry_seconds=30,
+        max_connections_per_host=4,
+        http2=False,
+        timeout_seconds=5,
+    )
+    client.start()
+    store = ArtifactStore(
+        root_dir=tmp_path / "artifacts", max_bytes=10 ** 9, client=client, timeout_seconds=5,
+        session_factory=TestSessionLocal,
+    )
+    deltas = ArtifactDeltaStore(
+        store, workers=1, block_size=2048, max_ratio=0.5, max_input_bytes=10 ** 8,
+        session_factory=TestSessionLocal,
+    )
+    monkeypatch.setattr("routers.artifacts.artifact_store", store)
+    monkeypatch.setattr("routers.artifacts.artifact_deltas", deltas)
+    yield deltas
+    await deltas.close()
+    await client.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(deltas):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+V1_SHA256 = hashlib.sha256(FIRMWARE_V1).hexdigest()
+
+
+async def wait_for_builds(deltas: ArtifactDeltaStore):
+    """Wait until the background delta builds are done"""
+    for _ in range(3000):
+        if not deltas.get_stats()["building"]:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Delta build did not finish")
+
+
+class TestDeltaEndpoint:
+    """Test suite for /api/artifacts/{release_id}/{tag}/{asset_name}/delta"""
+
+    @pytest.mark.asyncio
+    async def test_delta_from_previous_version(self, client, deltas):
+        """An agent with v1 downloads a small delta and rebuilds v2"""
+        await client.get("/api/artifacts/firmware/v1/firmware.bin")
+
+        # The first request starts the build and is sent to the full file
+        response = await client.get(f"/api/artifacts/firmware/v2/firmware.bin/delta?base_sha256={V1_SHA256}")
+        assert response.status_code == 404
+        await wait_for_builds(deltas)
+
+        for _ in range(2):
+            response = await client.get(f"/api/artifacts/firmware/v2/firmware.bin/delta?base_sha256={V1_SHA256}")
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/x-artifact-delta"
+            assert response.headers["x-delta-target-sha256"] == hashlib.sha256(FIRMWARE_V2).hexdigest()
+            assert response.headers["x-artifact-sha256"] == hashlib.sha256(response.content).hexdigest()
+            assert len(response.content) < len(FIRMWARE_V2) // 5
+            assert apply_delta(FIRMWARE_V1, response.content) == FIRMWARE_V2
+
+        stats = deltas.get_stats()
+        assert (stats["builds"], stats["hits"]) == (1, 2)
+
+        # Deltas are stored artifacts: resumable with Range
+        response = await client.get(
+            f"/api/artifacts/firmware/v2/firmware.bin/delta?base_sha256={V1_SHA256}",
+            headers={"Range": "bytes=10-"},
+        )
+        assert response.status_code == 206
+
+    @pytest.mark.asyncio
+    async def test_full_file_fallback(self, client, deltas):
+        """No delta for unknown bases or when the delta would not be smaller"""
+        response = await client.get(f"/api/artifacts/firmware/v2/firmware.bin/delta?base_sha256={'0' * 64}")
+        assert response.status_code == 404
+
+        await client.get("/api/artifacts/firmware/v1/firmware.bin")
+        for _ in range(2):
+            response = await client.get(f"/api/artifacts/firmware/v3/firmware.bin/delta?base_sha256={V1_SHA256}")
+            assert response.status_code == 404
+            await wait_for_builds(deltas)
+        stats = deltas.get_stats()
+        assert (stats["builds"], stats["not_smaller"]) == (1, 1)
+
+        response = await client.get("/api/artifacts/firmware/v2/firmware.bin/delta?base_sha256=abc")
+        assert response.status_code == 400
@@ -0,0 +1,344 @@
+"""
+Unit tests for artifact prefetching
+Tests that deployments are handed to agents only once their release assets are in the artifact cache
+"""
+
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, AgentStatusEnum, ReleaseDB, ReleaseVersionDB
+from artifact_store import ArtifactStore
+from artifact_prefetch import ArtifactPrefetcher, select_agent_asset
+from http_client import OutboundHTTPClient
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+class AssetServer:
+    """Serves fixed files on a local port; downloads block until `gate` is set"""
+
+    def __init__(self):
+        self.files = {
+            "/download/firmware-setup.exe": b"windows" * 5000,
+            "/download/firmware.dmg": b"macos" * 5000,
+        }
+        self.downloads = []
+        self.gate = threading.Event()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.downloads.append(self.path)
+                server.gate.wait(10)
+                body = server.files.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.gate.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def asset_server():
+    server = AssetServer()
+    yield server
+    server.stop()
+
+
+def _asset(name: str, url: str, size: int = 1000) -> dict:
+    return {
+        "id": 1,
+        "name": name,
+        "size": size,
+        "content_type": "application/octet-stream",
+        "updated_at": "2024-01-01T00:00:00Z",
+        "browser_download_url": url,
+    }
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database, asset_server):
+    """Two Windows PCs, one Mac, and a release whose assets are served by the local asset server"""
+    async with TestSessionLocal() as session:
+        for agent_id, name, platform in [
+            ("agent-1", "PC-01", "windows"),
+            ("agent-2", "PC-02", "windows"),
+            ("agent-3", "MAC-01", "macos"),
+        ]:
+            session.add(AgentDB(
+                id=agent_id,
+                name=name,
+                platform=platform,
+                version="1.0.0",
+                status=AgentStatusEnum.ONLINE,
+                last_seen=datetime.now(),
+            ))
+        for release_id, tag, assets in [
+            ("firmware", "v1.0.0", [
+                _asset("Source code.zip", f"{asset_server.base_url}/download/source.zip"),
+                _asset("firmware-setup.exe", f"{asset_server.base_url}/download/firmware-setup.exe"),
+                _asset("firmware.dmg", f"{asset_server.base_url}/download/firmware.dmg"),
+            ]),
+            ("tools", "v2.0.0", [
+                _asset("tools.exe", f"{asset_server.base_url}/download/missing.exe"),
+            ]),
+        ]:
+            session.add(ReleaseDB(
+                id=release_id,
+                tag_name=tag,
+                name=release_id,
+                version=tag,
+                release_date=datetime.now(),
+                download_url=f"https://github.com/acme/{release_id}",
+            ))
+            session.add(ReleaseVersionDB(
+                release_id=release_id,
+                tag=tag,
+                name=tag,
+                published_at=datetime.now(),
+                html_url="",
+                assets=assets,
+                synced_at=datetime.now(),
+            ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def prefetcher(tmp_path, test_data, monkeypatch):
+    client = OutboundHTTPClient(
+        max_connections=10,
+        max_keepalive_connections=5,
+        keepalive_expiry_seconds=30,
+        max_connections_per_host=4,
+        http2=False,
+        timeout_seconds=15,
+    )
+    client.start()
+    store = ArtifactStore(
+        root_dir=tmp_path / "artifacts", max_bytes=10 ** 9, client=client, timeout_seconds=15,
+        session_factory=TestSessionLocal,
+    )
+    prefetcher = ArtifactPrefetcher(store, workers=2, retention_seconds=60, session_factory=TestSessionLocal)
+    prefetcher.start()
+    monkeypatch.setattr("routers.deployments.artifact_prefetcher", prefetcher)
+    monkeypatch.setattr("routers.artifacts.artifact_prefetcher", prefetcher)
+    monkeypatch.setattr("routers.artifacts.artifact_store", store)
+    yield prefetcher
+    await prefetcher.stop()
+    await client.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(prefetcher):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _wait_until_released(prefetcher: ArtifactPrefetcher):
+    for _ in range(200):
+        if not prefetcher.waiting_deployment_ids():
+            return
+        await asyncio.sleep(0.025)
+    raise AssertionError("Deployments still waiting for artifacts")
+
+
+class TestArtifactPrefetch:
+    """Test suite for prefetching deployment artifacts"""
+
+    def test_select_agent_asset(self):
+        """The master picks the same asset as the agent"""
+        assets = [
+            _asset("Source code.zip", "", size=10 ** 6),
+            _asset("firmware-setup.exe", "", size=100),
+            _asset("firmware.dmg", "", size=200),
+            _asset("firmware.bin", "", size=300),
+        ]
+        assert select_agent_asset(assets, "windows")["name"] == "firmware-setup.exe"
+        assert select_agent_asset(assets, "macos")["name"] == "firmware.dmg"
+        assert select_agent_asset(assets, "linux")["name"] == "firmware.bin"
+        assert select_agent_asset(assets[:1], "windows") is None
+
+    @pytest.mark.asyncio
+    async def test_deployment_waits_for_artifacts(self, client, prefetcher, asset_server):
+        """Agents get Retry-After until the asset is cached, then the deployment"""
+        response = await client.post("/api/deployments", json={"agent_id": "agent-1", "release_ids": ["firmware"]})
+        deployment = response.json()
+        assert deployment["artifacts_ready"] is False
+
+        response = await client.get("/api/deployments/pending/agent-1")
+        assert response.status_code == 200
+        assert response.json() is None
+        assert response.headers["retry-after"] == "5"
+
+        response = await client.get(f"/api/artifacts/prefetch?deployment_id={deployment['id']}")
+        status = response.json()
+        assert status["waiting_deployment_ids"] == [deployment["id"]]
+        assert [(job["asset_name"], job["status"]) for job in status["jobs"]] in (
+            [("firmware-setup.exe", "queued")], [("firmware-setup.exe", "downloading")]
+        )
+
+        asset_server.gate.set()
+        await _wait_until_released(prefetcher)
+
+        response = await client.get("/api/deployments/pending/agent-1")
+        assert response.json()["id"] == deployment["id"]
+        assert response.json()["artifacts_ready"] is True
+        assert "retry-after" not in response.headers
+
+        job = (await client.get("/api/artifacts/prefetch")).json()["jobs"][0]
+        assert job["status"] == "ready"
+        assert job["sha256"]
+        assert asset_server.downloads == ["/download/firmware-setup.exe"]
+
+        # The agent's own download is served from the cache
+        response = await client.get("/api/artifacts/firmware/v1.0.0/firmware-setup.exe")
+        assert response.status_code == 200
+        assert asset_server.downloads == ["/download/firmware-setup.exe"]
+
+    @pytest.mark.asyncio
+    async def test_cached_assets_do_not_gate(self, client, prefetcher, asset_server):
+        """A deployment whose assets are already cached can be claimed right away"""
+        asset_server.gate.set()
+        await client.post("/api/deployments", json={"agent_id": "agent-1", "release_ids": ["firmware"]})
+        await _wait_until_released(prefetcher)
+
+        response = await client.post("/api/deployments", json={"agent_id": "agent-2", "release_ids": ["firmware"]})
+        assert response.json()["artifacts_ready"] is True
+        response = await client.get("/api/deployments/pending/agent-2")
+        assert response.json()["id"].startswith("deploy-agent-2")
+
+    @pytest.mark.asyncio
+    async def test_rollout_shares_jobs(self, client, prefetcher, asset_server):
+        """One job per asset, however many agents of a platform need it"""
+        response = await client.post("/api/deployments/rollouts", json={
+            "target": {"agent_ids": ["agent-1", "agent-2", "agent-3"]},
+            "release_ids": ["firmware"],
+        })
+        assert response.status_code == 200
+
+        status = (await client.get("/api/artifacts/prefetch")).json()
+        assert sorted(job["asset_name"] for job in status["jobs"]) == ["firmware-setup.exe", "firmware.dmg"]
+        assert len(status["waiting_deployment_ids"]) == 3
+        windows_job = next(job for job in status["jobs"] if job["asset_name"] == "firmware-setup.exe")
+        assert len(windows_job["deployment_ids"]) == 2
+
+        asset_server.gate.set()
+        await _wait_until_released(prefetcher)
+        assert sorted(asset_server.downloads) == ["/download/firmware-setup.exe", "/download/firmware.dmg"]
+        for agent_id in ["agent-1", "agent-2", "agent-3"]:
+            response = await client.get(f"/api/deployments/pending/{agent_id}")
+            assert response.json()["agent_id"] == agent_id
+
+    @pytest.mark.asyncio
+    async def test_long_poll_woken_when_ready(self, client, prefetcher, asset_server):
+        """A parked long-poll returns the deployment as soon as its artifacts are cached"""
+        response = await client.post("/api/deployments", json={"agent_id": "agent-1", "release_ids": ["firmware"]})
+        deployment_id = response.json()["id"]
+
+        poll = asyncio.create_task(client.get("/api/deployments/pending/agent-1?wait=10"))
+        await asyncio.sleep(0.2)
+        assert not poll.done()
+        asset_server.gate.set()
+
+        response = await asyncio.wait_for(poll, timeout=5)
+        assert response.json()["id"] == deployment_id
+
+    @pytest.mark.asyncio
+    async def test_failed_prefetch_releases_deployment(self, client, prefetcher, asset_server):
+        """When an asset cannot be downloaded the agent gets the deployment and falls back to GitHub"""
+        asset_server.gate.set()
+        response = await client.post("/api/deployments", json={"agent_id": "agent-1", "release_ids": ["tools"]})
+        assert response.json()["artifacts_ready"] is False
+        await _wait_until_released(prefetcher)
+
+        job = (await client.get("/api/artifacts/prefetch")).json()["jobs"][0]
+        assert job["status"] == "failed"
+        assert job["error"]
+        response = await client.get("/api/deployments/pending/agent-1")
+        assert response.json()["release_ids"] == ["tools"]
+
+    @pytest.mark.asyncio
+    async def test_waiting_deployments_resume_on_start(self, client, prefetcher, asset_server):
+        """Deployments left waiting by a restart are queued again"""
+        response = await client.post("/api/deployments", json={"agent_id": "agent-1", "release_ids": ["firmware"]})
+        # Restart while the download waits, not while the worker is querying the database
+        for _ in range(200):
+            if asset_server.downloads:
+                break
+            await asyncio.sleep(0.01)
+        await prefetcher.stop()
+        prefetcher._waiting.clear()
+        prefetcher._jobs.clear()
+
+        asset_server.gate.set()
+        prefetcher.start()
+        for _ in range(200):
+            response = await client.get("/api/deployments/pending/agent-1")
+            if response.json():
+                break
+            await asyncio.sleep(0.025)
+        assert response.json()["artifacts_ready"] is True
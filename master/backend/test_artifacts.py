@@ -0,0 +1,294 @@
+"""
+Unit tests for the artifact cache
+Tests single download per asset, Range / ETag handling and LRU eviction against a local asset server
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import ArtifactDB, ReleaseDB, ReleaseVersionDB
+from artifact_store import ArtifactStore
+from http_client import OutboundHTTPClient
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+class AssetServer:
+    """Serves fixed files on a local port, counting downloads"""
+
+    def __init__(self):
+        self.files = {
+            "/download/firmware.exe": bytes(range(256)) * 400,  # 100 KiB
+            "/download/tools.zip": b"tools" * 10000,
+        }
+        self.downloads = []
+        self.delay = 0.0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.downloads.append(self.path)
+                body = server.files.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                time.sleep(server.delay)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def asset_server():
+    server = AssetServer()
+    yield server
+    server.stop()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database, asset_server):
+    """A release version whose assets point at the local asset server"""
+    async with TestSessionLocal() as session:
+        session.add(ReleaseDB(
+            id="firmware",
+            tag_name="firmware",
+            name="firmware",
+            version="",
+            release_date=datetime.now(),
+            download_url="https://github.com/acme/firmware",
+        ))
+        session.add(ReleaseVersionDB(
+            release_id="firmware",
+            tag="v1.0.0",
+            name="1.0.0",
+            html_url="",
+            assets=[
+                {
+                    "id": 1,
+                    "name": name,
+                    "size": len(asset_server.files.get(path, b"")),
+                    "content_type": "application/octet-stream",
+                    "updated_at": "2024-01-01T00:00:00Z",
+                    "browser_download_url": f"{asset_server.base_url}{path}",
+                }
+                for name, path in [
+                    ("firmware.exe", "/download/firmware.exe"),
+                    ("tools.zip", "/download/tools.zip"),
+                    ("gone.exe", "/download/gone.exe"),
+                ]
+            ],
+            synced_at=datetime.now(),
+        ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def store(tmp_path, test_data, monkeypatch):
+    client = OutboundHTTPClient(
+        max_connections=10,
+        max_keepalive_connections=5,
+        keepalive_expiry_seconds=30,
+        max_connections_per_host=4,
+        http2=False,
+        timeout_seconds=5,
+    )
+    client.start()
+    store = ArtifactStore(
+        root_dir=tmp_path / "artifacts", max_bytes=10 ** 9, client=client, timeout_seconds=5,
+        session_factory=TestSessionLocal,
+    )
+    monkeypatch.setattr("routers.artifacts.artifact_store", store)
+    yield store
+    await client.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(store):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+FIRMWARE_URL = "/api/artifacts/firmware/v1.0.0/firmware.exe"
+
+
+class TestArtifactCache:
+    """Test suite for /api/artifacts"""
+
+    @pytest.mark.asyncio
+    async def test_asset_is_downloaded_once(self, client, store, asset_server):
+        """The first request fills the cache, later ones are served from disk"""
+        body = asset_server.files["/download/firmware.exe"]
+        sha256 = hashlib.sha256(body).hexdigest()
+        for _ in range(2):
+            response = await client.get(FIRMWARE_URL)
+            assert response.status_code == 200
+            assert response.content == body
+            assert response.headers["etag"] == f'"{sha256}"'
+            assert response.headers["accept-ranges"] == "bytes"
+            assert response.headers["content-length"] == str(len(body))
+
+        assert asset_server.downloads == ["/download/firmware.exe"]
+        assert store.path_for(sha256).read_bytes() == body
+        stats = store.get_stats()
+        assert (stats["misses"], stats["hits"]) == (1, 1)
+
+        # Content-addressed URL of the same file
+        response = await client.get(f"/api/artifacts/sha256/{sha256}")
+        assert response.content == body
+        assert "immutable" in response.headers["cache-control"]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_download(self, client, asset_server):
+        """Agents asking for the same asset at once trigger one upstream download"""
+        asset_server.delay = 0.2
+        responses = await asyncio.gather(*[client.get(FIRMWARE_URL) for _ in range(5)])
+        assert all(response.status_code == 200 for response in responses)
+        assert asset_server.downloads == ["/download/firmware.exe"]
+
+    @pytest.mark.asyncio
+    async def test_download_does_not_hold_a_connection(self, store, asset_server):
+        """The caller's transaction ends before the download; the asset is recorded afterwards"""
+        asset_server.delay = 0.3
+        async with TestSessionLocal() as session:
+            get = asyncio.create_task(store.get(session, "firmware", "v1.0.0", "firmware.exe"))
+            while not asset_server.downloads:
+                await asyncio.sleep(0.01)
+            assert not session.in_transaction()
+            stored = await get
+
+        async with TestSessionLocal() as session:
+            artifact_db = await session.get(ArtifactDB, ("firmware", "v1.0.0", "firmware.exe"))
+        assert artifact_db.sha256 == stored.sha256
+
+    @pytest.mark.asyncio
+    async def test_range_requests(self, client, asset_server):
+        """Single byte ranges are answered with 206 so downloads can resume"""
+        body = asset_server.files["/download/firmware.exe"]
+        etag = (await client.get(FIRMWARE_URL)).headers["etag"]
+
+        response = await client.get(FIRMWARE_URL, headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.content == body[100:200]
+        assert response.headers["content-range"] == f"bytes 100-199/{len(body)}"
+
+        response = await client.get(FIRMWARE_URL, headers={"Range": "bytes=102000-"})
+        assert response.content == body[102000:]
+
+        response = await client.get(FIRMWARE_URL, headers={"Range": "bytes=-10"})
+        assert response.content == body[-10:]
+
+        response = await client.get(FIRMWARE_URL, headers={"Range": f"bytes={len(body)}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(body)}"
+
+        # A stale If-Range validator gets the whole (changed) file instead of a range
+        response = await client.get(FIRMWARE_URL, headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+        assert response.status_code == 200
+        response = await client.get(FIRMWARE_URL, headers={"Range": "bytes=0-9", "If-Range": etag})
+        assert response.status_code == 206
+
+    @pytest.mark.asyncio
+    async def test_if_none_match(self, client):
+        """A matching ETag is answered with 304"""
+        etag = (await client.get(FIRMWARE_URL)).headers["etag"]
+        response = await client.get(FIRMWARE_URL, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    @pytest.mark.asyncio
+    async def test_head(self, client, asset_server):
+        """HEAD reports size and hash without a body"""
+        response = await client.head(FIRMWARE_URL)
+        assert response.status_code == 200
+        assert response.headers["content-length"] == str(len(asset_server.files["/download/firmware.exe"]))
+        assert response.content == b""
+
+    @pytest.mark.asyncio
+    async def test_unknown_and_failing_assets(self, client):
+        """Assets outside the catalog are 404, upstream 404s are passed through"""
+        response = await client.get("/api/artifacts/firmware/v1.0.0/other.exe")
+        assert response.status_code == 404
+        response = await client.get("/api/artifacts/firmware/v1.0.0/gone.exe")
+        assert response.status_code == 404
+        response = await client.get(f"/api/artifacts/sha256/{'0' * 64}")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_file_is_evicted(self, client, store, asset_server, monkeypatch):
+        """Above max_bytes the file read longest ago is deleted and fetched again on demand"""
+        monkeypatch.setattr(store, "max_bytes", 120_000)
+        await client.get(FIRMWARE_URL)
+        await client.get("/api/artifacts/firmware/v1.0.0/tools.zip")
+
+        stats = store.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["total_bytes"] == len(asset_server.files["/download/tools.zip"])
+
+        response = await client.get(FIRMWARE_URL)
+        assert response.status_code == 200
+        assert asset_server.downloads.count("/download/firmware.exe") == 2
@@ -0,0 +1,176 @@
+"""
+Unit tests for conditional GET on dashboard endpoints
+Tests ETag / If-None-Match handling and invalidation by write paths
+"""
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, ReleaseDB, AgentStatusEnum
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """Create one agent and one release"""
+    async with TestSessionLocal() as session:
+        session.add(AgentDB(
+            id="agent-1",
+            name="TestAgent1",
+            platform="windows",
+            version="1.0.0",
+            status=AgentStatusEnum.ONLINE,
+            last_seen=datetime.now(),
+        ))
+        session.add(ReleaseDB(
+            id="release-1",
+            tag_name="v1.0.0",
+            name="Release 1.0.0",
+            version="1.0.0",
+            release_date=datetime.now(),
+            download_url="https://github.com/test/repo/releases/",
+        ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(setup_database, test_data, monkeypatch):
+    """Create test client with overridden database dependency"""
+    # One long bucket so time-based ETag changes do not interfere
+    monkeypatch.setattr("routers.agents.AGENT_LIST_ETAG_BUCKET_SECONDS", 3600)
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _get_etag(client, url):
+    response = await client.get(url)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+    return response.headers["etag"]
+
+
+class TestConditionalGet:
+    """Test suite for ETag / If-None-Match"""
+
+    @pytest.mark.asyncio
+    async def test_unchanged_resource_returns_304(self, client):
+        """A matching If-None-Match is answered with an empty 304"""
+        etag = await _get_etag(client, "/api/releases")
+        assert etag.startswith('"')
+
+        response = await client.get("/api/releases", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    @pytest.mark.asyncio
+    async def test_write_invalidates_etag(self, client):
+        """Updating a release changes the ETag of release GETs"""
+        etag = await _get_etag(client, "/api/releases")
+
+        response = await client.put("/api/releases/release-1", json={"name": "Renamed"})
+        assert response.status_code == 200
+
+        response = await client.get("/api/releases", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()[0]["name"] == "Renamed"
+        assert response.headers["etag"] != etag
+
+    @pytest.mark.asyncio
+    async def test_query_string_is_part_of_etag(self, client):
+        """Different pages or filters of the same resource have different ETags"""
+        first = await _get_etag(client, "/api/deployments/history?limit=10")
+        second = await _get_etag(client, "/api/deployments/history?limit=20")
+        assert first != second
+
+        response = await client.get("/api/deployments/history?limit=20", headers={"If-None-Match": first})
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_deployment_lifecycle_invalidates_history(self, client):
+        """Creating, claiming and completing a deployment each change the history ETag"""
+        etags = [await _get_etag(client, "/api/deployments/history")]
+
+        response = await client.post("/api/deployments", json={
+            "agent_id": "agent-1",
+            "release_ids": ["release-1"],
+        })
+        deployment_id = response.json()["id"]
+        etags.append(await _get_etag(client, "/api/deployments/history"))
+
+        await client.get("/api/deployments/pending/agent-1")
+        etags.append(await _get_etag(client, "/api/deployments/history"))
+
+        # An empty poll does not change anything
+        await client.get("/api/deployments/pending/agent-1")
+        etags.append(await _get_etag(client, "/api/deployments/history"))
+
+        await client.post(f"/api/deployments/{deployment_id}/complete", json={"status": "success"})
+        etags.append(await _get_etag(client, "/api/deployments/history"))
+
+        assert len(set(etags)) == 4
+        assert etags[2] == etags[3]
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_of_known_agent_keeps_agent_etag(self, client):
+        """Heartbeats do not invalidate agent lists, new registrations do"""
+        etag = await _get_etag(client, "/api/agents")
+
+        await client.post("/api/agents/register", json={
+            "name": "TestAgent1",
+            "platform": "windows",
+            "version": "1.0.0",
+        })
+        response = await client.get("/api/agents", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        await client.post("/api/agents/register", json={
+            "name": "TestAgent2",
+            "platform": "macos",
+            "version": "1.0.0",
+        })
+        response = await client.get("/api/agents", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert len(response.json()) == 2
@@ -0,0 +1,175 @@
+"""
+Unit tests for deployment_items
+Tests that deployments keep one item row per release and the release/tag filters
+"""
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, ReleaseDB, AgentStatusEnum, DeploymentItemDB, DeploymentStatusEnum
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """Create two agents and two releases"""
+    async with TestSessionLocal() as session:
+        for agent_id, name in [("agent-1", "PC-01"), ("agent-2", "PC-02")]:
+            session.add(AgentDB(
+                id=agent_id,
+                name=name,
+                platform="windows",
+                version="1.0.0",
+                status=AgentStatusEnum.ONLINE,
+                last_seen=datetime.now(),
+            ))
+        for release_id, tag in [("release-1", "v1.0.0"), ("release-2", "v2.0.0")]:
+            session.add(ReleaseDB(
+                id=release_id,
+                tag_name=tag,
+                name=f"Release {tag}",
+                version=tag.lstrip("v"),
+                release_date=datetime.now(),
+                download_url="https://github.com/test/repo/releases/",
+            ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(setup_database, test_data):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _items(deployment_id):
+    async with TestSessionLocal() as session:
+        result = await session.execute(
+            select(DeploymentItemDB)
+            .where(DeploymentItemDB.deployment_id == deployment_id)
+            .order_by(DeploymentItemDB.position)
+        )
+        return [(item.release_id, item.tag, item.status) for item in result.scalars().all()]
+
+
+async def _create_deployments(client):
+    """agent-1 gets release-1, agent-2 gets release-1 and release-2 (pinned to v1.9.0)"""
+    single = await client.post("/api/deployments", json={
+        "agent_id": "agent-1",
+        "release_ids": ["release-1"],
+    })
+    rollout = await client.post("/api/deployments/rollouts", json={
+        "target": {"agent_ids": ["agent-2"]},
+        "release_ids": ["release-1", "release-2"],
+        "release_versions": ["v1.0.0", "v1.9.0"],
+    })
+    return single.json()["id"], rollout.json()["deployments"][0]["deployment_id"]
+
+
+class TestDeploymentItems:
+    """Test suite for deployment_items"""
+
+    @pytest.mark.asyncio
+    async def test_items_written_with_deployment(self, client):
+        """Single deployments and rollouts store one item per release"""
+        first, second = await _create_deployments(client)
+        assert await _items(first) == [("release-1", "v1.0.0", DeploymentStatusEnum.PENDING)]
+        assert await _items(second) == [
+            ("release-1", "v1.0.0", DeploymentStatusEnum.PENDING),
+            ("release-2", "v1.9.0", DeploymentStatusEnum.PENDING),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_filter_by_release_and_tag(self, client):
+        """release_id / tag filters match any item of a deployment"""
+        first, second = await _create_deployments(client)
+
+        response = await client.get("/api/deployments?release_id=release-1")
+        assert {deployment["id"] for deployment in response.json()} == {first, second}
+
+        response = await client.get("/api/deployments?release_id=release-2")
+        assert [deployment["id"] for deployment in response.json()] == [second]
+
+        response = await client.get("/api/deployments?tag=v1.9.0&agent_id=agent-2")
+        assert [deployment["id"] for deployment in response.json()] == [second]
+
+        # Both criteria must hold for the same item
+        response = await client.get("/api/deployments?release_id=release-2&tag=v1.0.0")
+        assert response.json() == []
+
+        response = await client.get("/api/deployments/history?tag=v1.0.0")
+        assert {deployment["id"] for deployment in response.json()} == {first, second}
+
+    @pytest.mark.asyncio
+    async def test_item_status_follows_deployment(self, client):
+        """Claim, completion and cancellation update the item status"""
+        first, second = await _create_deployments(client)
+
+        await client.get("/api/deployments/pending/agent-1")
+        assert await _items(first) == [("release-1", "v1.0.0", DeploymentStatusEnum.IN_PROGRESS)]
+
+        await client.post(f"/api/deployments/{first}/complete", json={"status": "success"})
+        assert await _items(first) == [("release-1", "v1.0.0", DeploymentStatusEnum.SUCCESS)]
+
+        await client.post(f"/api/deployments/{second}/cancel")
+        assert {status for _, _, status in await _items(second)} == {DeploymentStatusEnum.FAILED}
+
+    @pytest.mark.asyncio
+    async def test_complete_after_cancel(self, client):
+        """A late completion report does not overwrite a cancelled deployment"""
+        first, _ = await _create_deployments(client)
+        await client.get("/api/deployments/pending/agent-1")
+        await client.post(f"/api/deployments/{first}/cancel")
+
+        response = await client.post(f"/api/deployments/{first}/complete", json={"status": "success"})
+        assert response.status_code == 409
+        assert await _items(first) == [("release-1", "v1.0.0", DeploymentStatusEnum.FAILED)]
+        deployment = (await client.get(f"/api/deployments/{first}")).json()
+        assert deployment["status"] == "failed"
+        assert deployment["error_message"] == "Cancelled by user"
+
+        response = await client.post("/api/deployments/unknown/complete", json={"status": "success"})
+        assert response.status_code == 404
@@ -0,0 +1,312 @@
+"""
+Unit tests for agent-facing deployment delivery
+Tests atomic pending deployment claiming, long-polling and the push channel
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, ReleaseDB, DeploymentDB, AgentStatusEnum, DeploymentStatusEnum
+from deployment_notifier import DeploymentNotifier, LongPollCapacityError
+from routers.deployments import claim_pending_deployment
+
+
+# File-based SQLite database so concurrent sessions use their own connections,
+# as they do in production (a shared in-memory connection would interleave transactions)
+TEST_DATABASE_PATH = os.path.join(tempfile.gettempdir(), f"test_deployment_queue_{os.getpid()}.db")
+TEST_DATABASE_URL = f"sqlite+aiosqlite:///{TEST_DATABASE_PATH}"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=NullPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await test_engine.dispose()
+    if os.path.exists(TEST_DATABASE_PATH):
+        os.remove(TEST_DATABASE_PATH)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """Create test agents and a release"""
+    async with TestSessionLocal() as session:
+        for index, platform in enumerate(["windows", "windows", "macos"], start=1):
+            session.add(AgentDB(
+                id=f"agent-{index}",
+                name=f"TestAgent{index}",
+                platform=platform,
+                version="1.0.0",
+                status=AgentStatusEnum.ONLINE,
+                last_seen=datetime.now(),
+            ))
+        session.add(ReleaseDB(
+            id="release-1",
+            tag_name="v1.0.0",
+            name="Release 1.0.0",
+            version="1.0.0",
+            release_date=datetime.now(),
+            download_url="https://github.com/test/repo/releases/",
+        ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(setup_database, test_data):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test", timeout=30) as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _create_deployment(client, agent_id="agent-1"):
+    response = await client.post("/api/deployments", json={
+        "agent_id": agent_id,
+        "release_ids": ["release-1"],
+        "release_versions": ["v1.0.0"],
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+class TestPendingDeployment:
+    """Test suite for the agent polling endpoint"""
+
+    @pytest.mark.asyncio
+    async def test_pending_claims_deployment_once(self, client):
+        """A pending deployment is handed out exactly once"""
+        created = await _create_deployment(client)
+
+        response = await client.get("/api/deployments/pending/agent-1")
+        assert response.status_code == 200
+        assert response.json()["id"] == created["id"]
+        assert response.json()["status"] == "in_progress"
+
+        response = await client.get("/api/deployments/pending/agent-1")
+        assert response.status_code == 200
+        assert response.json() is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_claims_never_share_a_deployment(self, client):
+        """Parallel claims each get a different deployment, oldest first"""
+        async with TestSessionLocal() as session:
+            for index in range(2):
+                session.add(DeploymentDB(
+                    id=f"deploy-{index}",
+                    agent_id="agent-1",
+                    release_ids=["release-1"],
+                    release_tags=["v1.0.0"],
+                    status=DeploymentStatusEnum.PENDING,
+                    created_at=datetime.now(),
+                ))
+            await session.commit()
+
+        async def claim():
+            async with TestSessionLocal() as session:
+                return await claim_pending_deployment(session, "agent-1")
+
+        claimed = await asyncio.gather(claim(), claim(), claim())
+        claimed_ids = [deployment.id for deployment in claimed if deployment]
+        assert sorted(claimed_ids) == ["deploy-0", "deploy-1"]
+        assert claimed.count(None) == 1
+        assert all(deployment.agent_name == "TestAgent1" for deployment in claimed if deployment)
+
+    @pytest.mark.asyncio
+    async def test_claim_skips_other_agents_and_statuses(self, client):
+        """Only PENDING deployments of the polling agent are claimed"""
+        await _create_deployment(client, agent_id="agent-2")
+
+        response = await client.get("/api/deployments/pending/agent-1")
+        assert response.status_code == 200
+        assert response.json() is None
+
+        response = await client.get("/api/deployments/pending/agent-2")
+        assert response.json()["agent_name"] == "TestAgent2"
+        assert response.json()["started_at"] is not None
+
+    @pytest.mark.asyncio
+    async def test_pending_unknown_agent(self, client):
+        """Polling for an unknown agent returns 404"""
+        response = await client.get("/api/deployments/pending/missing?wait=5")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_long_poll_returns_when_deployment_created(self, client):
+        """A parked long-poll returns as soon as a deployment is queued"""
+        started = time.monotonic()
+        poll = asyncio.create_task(client.get("/api/deployments/pending/agent-1?wait=20"))
+        await asyncio.sleep(0.2)
+        assert not poll.done()
+
+        created = await _create_deployment(client)
+        response = await asyncio.wait_for(poll, timeout=5)
+
+        assert response.status_code == 200
+        assert response.json()["id"] == created["id"]
+        assert time.monotonic() - started < 5
+
+    @pytest.mark.asyncio
+    async def test_long_poll_times_out_with_null(self, client, monkeypatch):
+        """A long-poll without new work returns null after the (capped) wait"""
+        monkeypatch.setattr("routers.deployments.LONG_POLL_MAX_WAIT_SECONDS", 1)
+        started = time.monotonic()
+        response = await client.get("/api/deployments/pending/agent-2?wait=30")
+        assert response.status_code == 200
+        assert response.json() is None
+        assert 0.9 <= time.monotonic() - started < 5
+
+
+class TestDeploymentNotifier:
+    """Test suite for the long-poll notifier"""
+
+    @pytest.mark.asyncio
+    async def test_notification_before_wait_is_not_lost(self):
+        """A notify() between observing the generation and waiting wakes immediately"""
+        notifier = DeploymentNotifier(max_waiters=10, disconnect_check_seconds=1)
+        generation = notifier.generation("agent-1")
+        notifier.notify("agent-1")
+        assert await notifier.wait("agent-1", generation, timeout=5) is True
+
+    @pytest.mark.asyncio
+    async def test_capacity_limit(self):
+        """Waiters beyond the cap are rejected"""
+        notifier = DeploymentNotifier(max_waiters=1, disconnect_check_seconds=1)
+        parked = asyncio.create_task(notifier.wait("agent-1", 0, timeout=5))
+        await asyncio.sleep(0)
+        with pytest.raises(LongPollCapacityError):
+            await notifier.wait("agent-2", 0, timeout=5)
+        notifier.close()
+        assert await parked is False
+        assert notifier.get_stats()["parked"] == 0
+
+    @pytest.mark.asyncio
+    async def test_disconnect_releases_waiter(self):
+        """A disconnected client stops waiting at the next check"""
+        notifier = DeploymentNotifier(max_waiters=10, disconnect_check_seconds=0.05)
+
+        async def disconnected():
+            return True
+
+        assert await notifier.wait("agent-1", 0, timeout=5, is_disconnected=disconnected) is False
+        assert notifier.get_stats()["disconnected"] == 1
+
+
+@pytest.fixture(scope="function")
+def ws_client(test_data, monkeypatch):
+    """
+    Synchronous test client for WebSocket tests
+    Startup/shutdown hooks are skipped so the real database and the notifier singleton stay untouched
+    """
+    monkeypatch.setattr(app.router, "on_startup", [])
+    monkeypatch.setattr(app.router, "on_shutdown", [])
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+def _wait_for_agent_version(client, agent_id, version):
+    """Heartbeats on the channel are not acknowledged; poll until one has been applied"""
+    for _ in range(100):
+        if client.get(f"/api/agents/{agent_id}").json()["version"] == version:
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestAgentChannel:
+    """Test suite for the WebSocket push channel"""
+
+    def test_channel_pushes_config_and_deployments(self, ws_client):
+        """A connected agent receives its configuration and new deployments without polling"""
+        with ws_client.websocket_connect("/api/agents/agent-1/channel") as websocket:
+            config = websocket.receive_json()
+            assert config["event"] == "config"
+            assert config["data"]["heartbeat_interval_seconds"] > 0
+
+            response = ws_client.post("/api/deployments", json={
+                "agent_id": "agent-1",
+                "release_ids": ["release-1"],
+                "release_versions": ["v1.0.0"],
+            })
+            assert response.status_code == 200
+
+            event = websocket.receive_json()
+            assert event["event"] == "deployment"
+            assert event["data"]["id"] == response.json()["id"]
+            assert event["data"]["status"] == "in_progress"
+            assert event["id"]
+
+            # Heartbeats are accepted on the same connection
+            websocket.send_json({
+                "type": "heartbeat",
+                "name": "TestAgent1",
+                "platform": "windows",
+                "version": "1.1.0",
+            })
+
+            response = ws_client.post(f"/api/deployments/{event['data']['id']}/cancel")
+            assert response.status_code == 200
+            cancel = websocket.receive_json()
+            assert cancel["event"] == "cancel"
+            assert cancel["data"]["deployment_id"] == event["data"]["id"]
+            assert _wait_for_agent_version(ws_client, "agent-1", "1.1.0")
+
+    def test_channel_ignores_heartbeats_of_other_agents(self, ws_client):
+        """A heartbeat naming another agent, or an unknown one, changes nothing"""
+        with ws_client.websocket_connect("/api/agents/agent-1/channel") as websocket:
+            websocket.receive_json()
+            for name in ["TestAgent2", "Intruder"]:
+                websocket.send_json({"type": "heartbeat", "name": name, "platform": "macos", "version": "9.9.9"})
+            # Messages are handled in order: once this one is applied the others were seen
+            websocket.send_json({"type": "heartbeat", "name": "TestAgent1", "platform": "windows", "version": "1.2.0"})
+            assert _wait_for_agent_version(ws_client, "agent-1", "1.2.0")
+
+        agents = {agent["name"]: agent for agent in ws_client.get("/api/agents").json()}
+        assert set(agents) == {"TestAgent1", "TestAgent2", "TestAgent3"}
+        assert agents["TestAgent2"]["version"] == "1.0.0"
+
+    def test_channel_unknown_agent_is_rejected(self, ws_client):
+        """Connecting as an unknown agent closes the socket"""
+        with pytest.raises(WebSocketDisconnect) as error:
+            with ws_client.websocket_connect("/api/agents/missing/channel") as websocket:
+                websocket.receive_json()
+        assert error.value.code == 4404
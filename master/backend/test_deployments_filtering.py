@@ -101,7 +101,6 @@ async def test_data(setup_database):
         deployment1 = DeploymentDB(
             id="deploy-1",
             agent_id="agent-1",
-            agent_name="TestAgent1",
             release_ids=["release-1"],
             release_tags=["v1.0.0"],
             status=DeploymentStatusEnum.SUCCESS,
@@ -110,7 +109,6 @@ async def test_data(setup_database):
         deployment2 = DeploymentDB(
             id="deploy-2",
             agent_id="agent-1",
-            agent_name="TestAgent1",
             release_ids=["release-2"],
             release_tags=["v1.1.0"],
             status=DeploymentStatusEnum.FAILED,
@@ -119,7 +117,6 @@ async def test_data(setup_database):
         deployment3 = DeploymentDB(
             id="deploy-3",
             agent_id="agent-1",
-            agent_name="TestAgent1",
             release_ids=["release-1"],
             release_tags=["v1.0.0"],
             status=DeploymentStatusEnum.PENDING,
@@ -130,7 +127,6 @@ async def test_data(setup_database):
         deployment4 = DeploymentDB(
             id="deploy-4",
             agent_id="agent-2",
-            agent_name="TestAgent2",
             release_ids=["release-1"],
             release_tags=["v1.0.0"],
             status=DeploymentStatusEnum.SUCCESS,
@@ -139,7 +135,6 @@ async def test_data(setup_database):
         deployment5 = DeploymentDB(
             id="deploy-5",
             agent_id="agent-2",
-            agent_name="TestAgent2",
             release_ids=["release-2"],
             release_tags=["v1.1.0"],
             status=DeploymentStatusEnum.IN_PROGRESS,
@@ -148,7 +143,6 @@ async def test_data(setup_database):
         deployment6 = DeploymentDB(
             id="deploy-6",
             agent_id="agent-2",
-            agent_name="TestAgent2",
             release_ids=["release-1"],
             release_tags=["v1.0.0"],
             status=DeploymentStatusEnum.SUCCESS,
@@ -436,3 +430,75 @@ class TestDeploymentFiltering:
         assert isinstance(deployment["release_tags"], list)
         assert deployment["status"] == "success"
 
+
+
+@pytest_asyncio.fixture(scope="function")
+async def paged_data(test_data):
+    """Add 20 more agent-1 deployments sharing one created_at, to exercise the id tie-breaker"""
+    created_at = datetime(2024, 1, 1, 12, 0, 0)
+    async with TestSessionLocal() as session:
+        for index in range(20):
+            session.add(DeploymentDB(
+                id=f"deploy-bulk-{index:02d}",
+                agent_id="agent-1",
+                release_ids=["release-1"],
+                release_tags=["v1.0.0"],
+                status=DeploymentStatusEnum.SUCCESS,
+                created_at=created_at,
+            ))
+        await session.commit()
+
+
+class TestDeploymentPagination:
+    """Test suite for keyset pagination of deployment lists"""
+    
+    async def _collect_pages(self, client, url, limit):
+        """Follow X-Next-Cursor until the last page"""
+        ids, pages = [], 0
+        cursor = None
+        while True:
+            params = {"limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get(url, params=params)
+            assert response.status_code == 200
+            pages += 1
+            ids.extend(deployment["id"] for deployment in response.json())
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                return ids, pages
+    
+    @pytest.mark.asyncio
+    async def test_pages_cover_all_deployments_once(self, client, paged_data):
+        """Walking the pages returns every deployment exactly once, newest first"""
+        ids, pages = await self._collect_pages(client, "/api/deployments", limit=7)
+        assert len(ids) == 26
+        assert len(set(ids)) == 26
+        assert pages == 4
+        
+        # The bulk rows are the oldest and come last, ordered by id descending
+        assert ids[-20:] == [f"deploy-bulk-{index:02d}" for index in reversed(range(20))]
+    
+    @pytest.mark.asyncio
+    async def test_pagination_with_filter(self, client, paged_data):
+        """Filters apply to every page"""
+        ids, _ = await self._collect_pages(client, "/api/deployments?agent_id=agent-1&status=success", limit=5)
+        assert len(ids) == 21
+        assert "deploy-1" in ids
+    
+    @pytest.mark.asyncio
+    async def test_history_pagination(self, client, paged_data):
+        """History uses the same cursor and has no cursor on the last page"""
+        response = await client.get("/api/deployments/history", params={"limit": 30})
+        assert len(response.json()) == 26
+        assert "x-next-cursor" not in response.headers
+        
+        ids, pages = await self._collect_pages(client, "/api/deployments/history", limit=10)
+        assert len(set(ids)) == 26
+        assert pages == 3
+    
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, client, test_data):
+        """A malformed cursor is rejected"""
+        response = await client.get("/api/deployments", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
@@ -0,0 +1,199 @@
+"""
+Unit tests for the GitHub rate limit scheduler
+Tests budget tracking, interactive reserve, priority promotion and retries of rate limited responses
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from github_rate_limit import GitHubRateLimiter, Priority, PriorityHolder, RateLimitWaitTimeout
+from github_releases import GitHubReleaseCache, GitHubAPIError
+
+
+def _response(status_code=200, limit=10, remaining=9, reset_in=60.0, headers=None, json=None):
+    """GitHub response carrying X-RateLimit headers"""
+    all_headers = {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(int(time.time() + reset_in)),
+    }
+    all_headers.update(headers or {})
+    return httpx.Response(status_code, headers=all_headers, json=json if json is not None else [])
+
+
+class FakeGitHub:
+    """Answers sends from a list of responses, recording the order of the labels sent"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def send(self, label):
+        async def send():
+            self.sent.append(label)
+            return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        return send
+
+
+def _limiter(max_wait_seconds=5.0, max_attempts=3):
+    return GitHubRateLimiter(
+        interactive_reserve_ratio=0.2,
+        max_wait_seconds=max_wait_seconds,
+        max_attempts=max_attempts,
+    )
+
+
+class TestGitHubRateLimiter:
+    """Test suite for GitHubRateLimiter"""
+
+    @pytest.mark.asyncio
+    async def test_budget_is_read_from_headers(self):
+        """The last response sets limit, remaining and reset of the token"""
+        limiter = _limiter()
+        github = FakeGitHub([_response(limit=5000, remaining=4321)])
+
+        await limiter.run("secret", PriorityHolder(Priority.INTERACTIVE), github.send("a"))
+
+        budgets = limiter.get_stats()["budgets"]
+        assert list(budgets) != ["secret"]  # Tokens are never reported
+        budget = next(iter(budgets.values()))
+        assert (budget["limit"], budget["remaining"], budget["in_flight"]) == (5000, 4321, 0)
+
+    @pytest.mark.asyncio
+    async def test_background_leaves_reserve_for_interactive(self):
+        """Below the reserve background requests queue while interactive ones still go"""
+        limiter = _limiter()
+        github = FakeGitHub([_response(limit=10, remaining=2)])
+        await limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("first"))
+
+        background = asyncio.create_task(
+            limiter.run(None, PriorityHolder(Priority.BACKGROUND), github.send("background"))
+        )
+        await asyncio.sleep(0.05)
+        assert limiter.get_stats()["budgets"]["anonymous"]["queued_background"] == 1
+
+        await limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("interactive"))
+        assert github.sent == ["first", "interactive"]
+        background.cancel()
+        await asyncio.gather(background, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_exhausted_budget_waits_for_reset(self):
+        """Queued requests go once the reset time has passed, interactive ones first"""
+        limiter = _limiter()
+        # A limit of 2 lets only the interactive request go right after the reset
+        github = FakeGitHub([_response(limit=2, remaining=0, reset_in=2), _response(remaining=9)])
+        await limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("first"))
+
+        background = asyncio.create_task(
+            limiter.run(None, PriorityHolder(Priority.BACKGROUND), github.send("background"))
+        )
+        await asyncio.sleep(0.05)
+        interactive = asyncio.create_task(
+            limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("interactive"))
+        )
+        await asyncio.wait_for(asyncio.gather(background, interactive), timeout=5)
+
+        assert github.sent == ["first", "interactive", "background"]
+        assert limiter.get_stats()["delayed"] == 2
+
+    @pytest.mark.asyncio
+    async def test_interactive_wait_times_out(self):
+        """An interactive request does not wait longer than max_wait_seconds"""
+        limiter = _limiter(max_wait_seconds=0.1)
+        github = FakeGitHub([_response(remaining=0, reset_in=120)])
+        await limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("first"))
+
+        with pytest.raises(RateLimitWaitTimeout) as error:
+            await limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("second"))
+
+        assert 100 < error.value.retry_after <= 120
+        assert github.sent == ["first"]
+        stats = limiter.get_stats()
+        assert (stats["wait_timeouts"], stats["queued"]) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_promoted_work_goes_first(self):
+        """Raising the priority of queued background work moves it ahead of other background work"""
+        limiter = _limiter()
+        github = FakeGitHub([_response(limit=2, remaining=0, reset_in=2), _response(remaining=9)])
+        await limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("first"))
+
+        other = asyncio.create_task(limiter.run(None, PriorityHolder(Priority.BACKGROUND), github.send("other")))
+        await asyncio.sleep(0.02)
+        holder = PriorityHolder(Priority.BACKGROUND)
+        joined = asyncio.create_task(limiter.run(None, holder, github.send("joined")))
+        await asyncio.sleep(0.02)
+        limiter.promote(None, holder, Priority.INTERACTIVE)
+        assert limiter.get_stats()["budgets"]["anonymous"]["queued_interactive"] == 1
+
+        await asyncio.wait_for(asyncio.gather(other, joined), timeout=5)
+        assert github.sent == ["first", "joined", "other"]
+
+    @pytest.mark.asyncio
+    async def test_secondary_rate_limit_is_retried(self):
+        """A 403 with Retry-After blocks the token, then the request is sent again"""
+        limiter = _limiter()
+        github = FakeGitHub([
+            _response(403, remaining=50, headers={"Retry-After": "1"}),
+            _response(200, remaining=49),
+        ])
+
+        started = time.monotonic()
+        response = await limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("request"))
+
+        assert response.status_code == 200
+        assert github.sent == ["request", "request"]
+        assert time.monotonic() - started >= 0.9
+        stats = limiter.get_stats()
+        assert (stats["rate_limited_responses"], stats["retried"]) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_forbidden_without_rate_limit_is_not_retried(self):
+        """A 403 with budget left is a permission error and is returned as is"""
+        limiter = _limiter()
+        github = FakeGitHub([_response(403, remaining=50)])
+
+        response = await limiter.run(None, PriorityHolder(Priority.INTERACTIVE), github.send("request"))
+
+        assert response.status_code == 403
+        assert github.sent == ["request"]
+        assert limiter.get_stats()["retried"] == 0
+
+
+class FakeGitHubClient:
+    """Outbound client stand-in for GitHubReleaseCache, answering every GET with one response"""
+
+    def __init__(self, response):
+        self.response = response
+        self.requests = 0
+
+    async def get(self, url, **kwargs):
+        self.requests += 1
+        return self.response
+
+
+@pytest.mark.asyncio
+async def test_release_cache_reports_rate_limit_wait():
+    """The release cache turns a rate limit wait timeout into 503 with retry_after"""
+    limiter = _limiter(max_wait_seconds=0.1)
+    client = FakeGitHubClient(_response(remaining=0, reset_in=90, json=[{"tag_name": "v1.0.0"}]))
+    cache = GitHubReleaseCache(
+        client=client,
+        base_url="https://api.github.test",
+        ttl_seconds=0,
+        stale_seconds=0,
+        timeout_seconds=5,
+        rate_limiter=limiter,
+    )
+    assert [release["tag_name"] for release in await cache.get_releases("acme", "firmware")] == ["v1.0.0"]
+
+    with pytest.raises(GitHubAPIError) as error:
+        await cache.get_releases("acme", "firmware")
+
+    assert error.value.status_code == 503
+    assert 60 < error.value.retry_after <= 90
+    assert client.requests == 1
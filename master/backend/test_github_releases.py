@@ -0,0 +1,425 @@
+"""
+Unit tests for the GitHub release cache
+Tests TTL hits, ETag revalidation, stale-while-revalidate and pagination against a local GitHub stub
+"""
+
+import asyncio
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import ReleaseDB
+from github_releases import GitHubReleaseCache, GitHubAPIError
+from http_client import OutboundHTTPClient
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+class GitHubStub:
+    """Minimal paginated GitHub releases API on a local port, recording every request"""
+
+    def __init__(self):
+        self.releases = [{"tag_name": "v1.0.0", "name": "1.0.0", "published_at": "2024-01-01T00:00:00Z"}]
+        self.etag = '"v1"'
+        self.requests = []
+        self.pages = []
+        self.client_ports = set()
+        self.page_delay = 0.0  # Seconds to hold pages after the first
+        self.active = 0
+        self.max_active = 0
+        lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like api.github.com
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                per_page = int(query.get("per_page", ["30"])[0])
+                page = int(query.get("page", ["1"])[0])
+                stub.requests.append((url.path, self.headers.get("If-None-Match")))
+                stub.pages.append(page)
+                stub.client_ports.add(self.client_address[1])
+                if url.path != "/repos/acme/firmware/releases":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                last_page = max(1, -(-len(stub.releases) // per_page))
+                body = json.dumps(stub.releases[(page - 1) * per_page:page * per_page]).encode()
+                etag = stub.etag if page == 1 else f'"page-{page}-{zlib.crc32(body)}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                if page > 1 and stub.page_delay:
+                    with lock:
+                        stub.active += 1
+                        stub.max_active = max(stub.max_active, stub.active)
+                    time.sleep(stub.page_delay)
+                    with lock:
+                        stub.active -= 1
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                if last_page > 1:
+                    base = f"{stub.base_url}{url.path}?per_page={per_page}"
+                    links = [f'<{base}&page={last_page}>; rel="last"']
+                    if page < last_page:
+                        links.insert(0, f'<{base}&page={page + 1}>; rel="next"')
+                    self.send_header("Link", ", ".join(links))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def publish(self, tag: str):
+        self.releases = [{"tag_name": tag, "name": tag.lstrip("v")}] + self.releases
+        self.etag = f'"{tag}"'
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def github_stub():
+    stub = GitHubStub()
+    yield stub
+    stub.stop()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """A release pointing at the stubbed repository and one pointing at a missing one"""
+    async with TestSessionLocal() as session:
+        for release_id, url in [
+            ("firmware", "https://github.com/acme/firmware/releases/"),
+            ("missing", "https://github.com/acme/missing"),
+        ]:
+            session.add(ReleaseDB(
+                id=release_id,
+                tag_name=release_id,
+                name=release_id,
+                version="",
+                release_date=datetime.now(),
+                download_url=url,
+            ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def outbound_client():
+    """Shared-pool client as started by main.py, bound to the test event loop"""
+    client = OutboundHTTPClient(
+        max_connections=10,
+        max_keepalive_connections=5,
+        keepalive_expiry_seconds=30,
+        max_connections_per_host=2,
+        http2=False,
+        timeout_seconds=5,
+    )
+    client.start()
+    yield client
+    await client.close()
+
+
+def _client_with_cache(monkeypatch, outbound_client, github_stub, ttl_seconds, stale_seconds, **options):
+    cache = GitHubReleaseCache(
+        client=outbound_client,
+        base_url=github_stub.base_url,
+        ttl_seconds=ttl_seconds,
+        stale_seconds=stale_seconds,
+        timeout_seconds=5,
+        **options,
+    )
+    monkeypatch.setattr("routers.releases.github_release_cache", cache)
+    app.dependency_overrides[get_db] = override_get_db
+    return cache
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(test_data, github_stub, outbound_client, monkeypatch):
+    """Test client whose release cache talks to the stub with a long TTL"""
+    cache = _client_with_cache(monkeypatch, outbound_client, github_stub, ttl_seconds=3600, stale_seconds=0)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac, cache
+    app.dependency_overrides.clear()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def stale_client(test_data, github_stub, outbound_client, monkeypatch):
+    """Test client whose cached lists are always stale but still servable"""
+    cache = _client_with_cache(monkeypatch, outbound_client, github_stub, ttl_seconds=0, stale_seconds=3600)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac, cache
+    app.dependency_overrides.clear()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def paged_client(test_data, github_stub, outbound_client, monkeypatch):
+    """Test client reading 10 releases per page, at most 2 pages at a time, from 45 releases"""
+    github_stub.releases = [{"tag_name": f"v1.0.{number}", "name": f"1.0.{number}"} for number in range(44, -1, -1)]
+    cache = _client_with_cache(
+        monkeypatch, outbound_client, github_stub, ttl_seconds=3600, stale_seconds=0,
+        per_page=10, page_concurrency=2,
+    )
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac, cache
+    app.dependency_overrides.clear()
+
+
+async def _wait_for_refreshes(cache):
+    for _ in range(100):
+        if not cache.get_stats()["refreshing"]:
+            return
+        await asyncio.sleep(0.02)
+
+
+async def _wait_for_requests(github_stub, count):
+    for _ in range(100):
+        if len(github_stub.requests) >= count:
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"expected {count} GitHub requests, got {github_stub.requests}")
+
+
+async def _tags(cache, repo="firmware"):
+    return [release["tag_name"] for release in await cache.get_releases("acme", repo)]
+
+
+class TestGitHubReleaseCache:
+    """Test suite for GitHubReleaseCache"""
+
+    @pytest.mark.asyncio
+    async def test_fresh_entry_is_served_from_memory(self, client, github_stub):
+        """Within the TTL only the first call reaches GitHub"""
+        ac, cache = client
+        for _ in range(3):
+            assert await _tags(cache) == ["v1.0.0"]
+
+        assert len(github_stub.requests) == 1
+        stats = cache.get_stats()
+        assert (stats["misses"], stats["hits"], stats["stale"]) == (1, 2, 0)
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_is_revalidated_in_background(self, stale_client, github_stub):
+        """A stale list is answered immediately and revalidated with If-None-Match"""
+        ac, cache = stale_client
+        await _tags(cache)
+
+        assert await _tags(cache) == ["v1.0.0"]
+        await _wait_for_requests(github_stub, 2)
+        assert github_stub.requests[1] == ("/repos/acme/firmware/releases", '"v1"')
+
+        # A new release changes the ETag; the next stale read picks it up in the background
+        github_stub.publish("v1.1.0")
+        assert await _tags(cache) == ["v1.0.0"]
+        await _wait_for_requests(github_stub, 3)
+        await _wait_for_refreshes(cache)
+
+        assert await _tags(cache) == ["v1.1.0", "v1.0.0"]
+        await _wait_for_requests(github_stub, 4)
+        assert github_stub.requests[3][1] == '"v1.1.0"'
+
+        stats = cache.get_stats()
+        assert stats["misses"] == 1
+        assert stats["stale"] == 3
+
+    @pytest.mark.asyncio
+    async def test_refresh_ignores_ttl(self, client, github_stub):
+        """refresh_releases always revalidates, with a conditional request"""
+        ac, cache = client
+        await _tags(cache)
+        github_stub.publish("v1.1.0")
+        assert await _tags(cache) == ["v1.0.0"]
+
+        fetched = await cache.refresh_releases("acme", "firmware")
+        assert [release["tag_name"] for release in fetched.releases] == ["v1.1.0", "v1.0.0"]
+        assert fetched.complete
+        assert github_stub.requests[1][1] == '"v1"'
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_request(self, client, github_stub):
+        """Parallel first reads of a repository wait for the same GitHub request"""
+        ac, cache = client
+        results = await asyncio.gather(*[_tags(cache) for _ in range(5)])
+        assert results == [["v1.0.0"]] * 5
+        assert len(github_stub.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_requests_reuse_pooled_connection(self, stale_client, github_stub, outbound_client):
+        """Sequential GitHub requests share one kept-alive connection"""
+        ac, cache = stale_client
+        for count in range(1, 4):
+            await _tags(cache)
+            await _wait_for_requests(github_stub, count)
+            await _wait_for_refreshes(cache)
+
+        assert len(github_stub.client_ports) == 1
+        stats = outbound_client.get_stats()
+        assert stats["requests"] == 3
+        assert stats["connections"] == 1
+        assert stats["in_flight"] == {}
+
+    @pytest.mark.asyncio
+    async def test_missing_repository_is_not_cached(self, client, github_stub):
+        """GitHub errors are raised and retried on the next call"""
+        ac, cache = client
+        for _ in range(2):
+            with pytest.raises(GitHubAPIError) as error:
+                await _tags(cache, repo="missing")
+            assert error.value.status_code == 404
+        assert len(github_stub.requests) == 2
+        assert cache.get_stats()["errors"] == 2
+
+
+class TestGitHubReleasePagination:
+    """Test suite for multi-page release lists"""
+
+    @pytest.mark.asyncio
+    async def test_all_pages_are_read_in_order(self, paged_client, github_stub):
+        """Pages behind the Link header are fetched concurrently and merged newest first"""
+        ac, cache = paged_client
+        github_stub.page_delay = 0.1
+        assert await _tags(cache) == [f"v1.0.{number}" for number in range(44, -1, -1)]
+
+        assert github_stub.pages[0] == 1
+        assert sorted(github_stub.pages) == [1, 2, 3, 4, 5]
+        assert github_stub.max_active == 2
+        assert cache.get_stats()["pages_fetched"] == 4
+
+    @pytest.mark.asyncio
+    async def test_only_first_page_is_revalidated(self, paged_client, github_stub, monkeypatch):
+        """An unchanged first page keeps the cached pages without reading the rest"""
+        ac, cache = paged_client
+        await _tags(cache)
+        monkeypatch.setattr(cache, "ttl_seconds", 0)
+        monkeypatch.setattr(cache, "stale_seconds", 0)
+
+        assert len(await _tags(cache)) == 45
+        assert github_stub.pages == [1, 2, 3, 4, 5, 1]
+        assert github_stub.requests[-1][1] == '"v1"'
+
+    @pytest.mark.asyncio
+    async def test_older_pages_are_revalidated_after_full_revalidate_seconds(self, paged_client, github_stub, monkeypatch):
+        """Edits and deletions behind an unchanged first page show up at the next full revalidation"""
+        ac, cache = paged_client
+        await _tags(cache)
+        monkeypatch.setattr(cache, "ttl_seconds", 0)
+        monkeypatch.setattr(cache, "stale_seconds", 0)
+        monkeypatch.setattr(cache, "full_revalidate_seconds", 0)
+
+        # Nothing changed: every page answers 304
+        assert len(await _tags(cache)) == 45
+        # Page 1 first, then the older pages concurrently (in any order)
+        assert github_stub.pages[5] == 1
+        assert sorted(github_stub.pages[6:]) == [2, 3, 4, 5]
+        assert all(etag for _, etag in github_stub.requests[5:])
+        assert cache.get_stats()["pages_not_modified"] == 4
+
+        # An older release is edited and another deleted; page 1 stays the same
+        github_stub.releases[25]["name"] = "edited"
+        del github_stub.releases[40]
+        releases = await cache.get_releases("acme", "firmware")
+
+        assert len(releases) == 44
+        assert releases[25]["name"] == "edited"
+        assert "v1.0.4" not in [release["tag_name"] for release in releases]
+
+    @pytest.mark.asyncio
+    async def test_emptied_last_page_is_dropped(self, paged_client, github_stub, monkeypatch):
+        ac, cache = paged_client
+        await _tags(cache)
+        monkeypatch.setattr(cache, "ttl_seconds", 0)
+        monkeypatch.setattr(cache, "stale_seconds", 0)
+        monkeypatch.setattr(cache, "full_revalidate_seconds", 0)
+        del github_stub.releases[40:]
+
+        assert len(await _tags(cache)) == 40
+        assert len(cache._entries[("acme", "firmware")].pages) == 4
+
+    @pytest.mark.asyncio
+    async def test_max_pages_caps_the_list(self, paged_client, github_stub, monkeypatch):
+        """Repositories with more pages than max_pages are truncated"""
+        ac, cache = paged_client
+        monkeypatch.setattr(cache, "max_pages", 2)
+        assert len(await _tags(cache)) == 20
+        assert cache.get_stats()["truncated"] == 1
+        assert not (await cache.refresh_releases("acme", "firmware")).complete
+
+    @pytest.mark.asyncio
+    async def test_stream_returns_ndjson(self, paged_client, github_stub):
+        """stream=true writes one version per line, then serves the cached list the same way"""
+        ac, cache = paged_client
+        for _ in range(2):
+            response = await ac.get("/api/releases/firmware/versions?stream=true")
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            assert sorted(line["tag_name"] for line in lines) == sorted(f"v1.0.{number}" for number in range(45))
+
+        assert len(github_stub.pages) == 5
+
+    @pytest.mark.asyncio
+    async def test_stream_of_missing_repository(self, paged_client):
+        """Errors on the first page are still reported with their status code"""
+        ac, cache = paged_client
+        response = await ac.get("/api/releases/missing/versions?stream=true")
+        assert response.status_code == 404
@@ -0,0 +1,160 @@
+"""
+Unit tests for the write-behind heartbeat buffer
+Tests buffering, bulk flushing and no-op field skipping
+"""
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, AgentStatusEnum
+from heartbeat_buffer import HeartbeatBuffer
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def buffered_client(setup_database, monkeypatch):
+    """Test client with heartbeat buffering enabled against the test database"""
+    buffer = HeartbeatBuffer(enabled=True, flush_interval_seconds=60, session_factory=TestSessionLocal)
+    monkeypatch.setattr("routers.agents.heartbeat_buffer", buffer)
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac, buffer
+    app.dependency_overrides.clear()
+
+
+async def _get_agent_row(agent_id: str) -> AgentDB:
+    async with TestSessionLocal() as session:
+        result = await session.execute(select(AgentDB).where(AgentDB.id == agent_id))
+        return result.scalar_one()
+
+
+def _heartbeat(ip_address="10.0.0.1", version="1.0.0"):
+    return {"name": "PC-01", "platform": "windows", "version": version, "ip_address": ip_address}
+
+
+class TestHeartbeatBuffer:
+    """Test suite for buffered heartbeat ingestion"""
+
+    @pytest.mark.asyncio
+    async def test_first_heartbeat_registers_through_database(self, buffered_client):
+        """Unknown agents are inserted directly and then cached by the buffer"""
+        client, buffer = buffered_client
+        response = await client.post("/api/agents/register", json=_heartbeat())
+        assert response.status_code == 200
+        agent_id = response.json()["id"]
+
+        row = await _get_agent_row(agent_id)
+        assert row.name == "PC-01"
+        assert buffer.get_stats()["known_agents"] == 1
+        assert buffer.get_stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_repeated_heartbeats_are_buffered_until_flush(self, buffered_client):
+        """Known agents are kept in memory and written in one flush"""
+        client, buffer = buffered_client
+        first = (await client.post("/api/agents/register", json=_heartbeat())).json()
+        before = await _get_agent_row(first["id"])
+
+        response = await client.post("/api/agents/register", json=_heartbeat(ip_address="10.0.0.2"))
+        assert response.status_code == 200
+        assert response.json()["id"] == first["id"]
+        assert response.json()["ip_address"] == "10.0.0.2"
+
+        # Nothing written yet
+        row = await _get_agent_row(first["id"])
+        assert row.ip_address == "10.0.0.1"
+        assert buffer.get_stats()["pending"] == 1
+
+        await buffer.flush()
+
+        row = await _get_agent_row(first["id"])
+        assert row.ip_address == "10.0.0.2"
+        assert row.status == AgentStatusEnum.ONLINE
+        assert row.last_seen >= before.last_seen
+
+        stats = buffer.get_stats()
+        assert stats["pending"] == 0
+        assert stats["last_batch_size"] == 1
+        assert stats["last_flush_lag_seconds"] >= 0
+        # platform and version did not change, so only ip_address was written
+        assert stats["field_writes_skipped"] == 2
+
+    @pytest.mark.asyncio
+    async def test_flush_restores_offline_status(self, buffered_client):
+        """A buffered heartbeat marks the agent online again"""
+        client, buffer = buffered_client
+        agent_id = (await client.post("/api/agents/register", json=_heartbeat())).json()["id"]
+
+        async with TestSessionLocal() as session:
+            row = (await session.execute(select(AgentDB).where(AgentDB.id == agent_id))).scalar_one()
+            row.status = AgentStatusEnum.OFFLINE
+            await session.commit()
+
+        await client.post("/api/agents/register", json=_heartbeat())
+        await buffer.flush()
+
+        row = await _get_agent_row(agent_id)
+        assert row.status == AgentStatusEnum.ONLINE
+
+    @pytest.mark.asyncio
+    async def test_deleted_agent_is_registered_again(self, buffered_client):
+        """Deleting an agent drops it from the buffer so the next heartbeat re-registers it"""
+        client, buffer = buffered_client
+        agent_id = (await client.post("/api/agents/register", json=_heartbeat())).json()["id"]
+        await client.post("/api/agents/register", json=_heartbeat())
+
+        response = await client.delete(f"/api/agents/{agent_id}")
+        assert response.status_code == 200
+        assert buffer.get_stats()["pending"] == 0
+
+        response = await client.post("/api/agents/register", json=_heartbeat())
+        assert response.status_code == 200
+        assert response.json()["id"] != agent_id
+
+    @pytest.mark.asyncio
+    async def test_direct_mode_does_not_buffer(self, setup_database):
+        """Direct mode never buffers heartbeats, even of agents it has seen"""
+        buffer = HeartbeatBuffer(enabled=False, flush_interval_seconds=60, session_factory=TestSessionLocal)
+        buffer.remember(AgentDB(id="agent-1", name="PC-01", platform="windows", version="1.0.0"))
+        assert buffer.record("PC-01", "windows", "1.0.0", None) is None
+        assert buffer.get_stats()["heartbeats_buffered"] == 0
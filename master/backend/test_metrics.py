@@ -0,0 +1,478 @@
+"""
+Unit tests for request metrics
+Tests latency histogram accuracy, merging, rolling windows, route-template keys, top-K drill-down,
+the request instrumentation middleware and the /api/metrics summary
+"""
+
+import asyncio
+import math
+import random
+import time
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, HTTPException
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import metrics_collector
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, DeploymentDB, DeploymentStatusEnum
+from event_loop_monitor import EventLoopLagMonitor
+from latency_histogram import LatencyHistogram, SparseLatencyHistogram, BUCKET_COUNT
+from prometheus_exposition import PrometheusExposition
+from request_instrumentation import RequestInstrumentationMiddleware
+from rolling_window import RequestWindows, window_span_seconds
+from top_k import TopK
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(setup_database):
+    """Test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+def _exact_quantile(values, q):
+    return sorted(values)[math.ceil(q * len(values)) - 1]
+
+
+class TestLatencyHistogram:
+    """Test suite for LatencyHistogram"""
+
+    def test_quantiles_within_bucket_precision(self):
+        """Quantiles of every sample are within about 3% of the exact values"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(2.5, 1.0) for _ in range(50000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        quantiles = histogram.quantiles()
+        for name, q in [("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999)]:
+            exact = _exact_quantile(values, q)
+            assert abs(quantiles[name] - exact) <= exact * 0.035, name
+
+        summary = histogram.summary()
+        assert summary["min"] == min(values)
+        assert summary["max"] == max(values)
+        assert summary["mean"] == pytest.approx(sum(values) / len(values))
+
+    def test_memory_is_fixed(self):
+        """The bucket array does not grow with the number of samples"""
+        histogram = LatencyHistogram()
+        for value in range(100000):
+            histogram.record(value / 10)
+        histogram.record(10 ** 12)  # Beyond the range: counted in the last bucket
+
+        assert len(histogram.counts) == BUCKET_COUNT
+        assert histogram.count == 100001
+        assert histogram.quantiles({"max": 1.0})["max"] == 10 ** 12
+
+    def test_small_values_are_exact(self):
+        histogram = LatencyHistogram()
+        for micros in (5, 5, 5, 40):
+            histogram.record(micros / 1000)
+
+        assert histogram.quantiles({"p50": 0.5, "p100": 1.0}) == {"p50": 0.005, "p100": 0.04}
+
+    def test_merge_equals_recording_everything(self):
+        rng = random.Random(3)
+        first, second, everything = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for index in range(2000):
+            value = rng.expovariate(1 / 30)
+            (first if index % 2 else second).record(value)
+            everything.record(value)
+
+        merged = LatencyHistogram.merged([first, second])
+
+        assert merged.counts == everything.counts
+        assert merged.quantiles() == everything.quantiles()
+        assert (merged.count, merged.min_ms, merged.max_ms) == (everything.count, everything.min_ms, everything.max_ms)
+
+    def test_empty_histogram(self):
+        assert LatencyHistogram().summary() == {
+            "mean": 0, "min": 0, "max": 0, "p50": 0, "p95": 0, "p99": 0, "p999": 0,
+        }
+
+
+@pytest.mark.asyncio
+async def test_metrics_summary_reports_histogram_quantiles():
+    """/api/metrics reports p50 to p999 of every request to an endpoint"""
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for _ in range(5):
+            assert (await ac.get("/")).status_code == 200
+        summary = (await ac.get("/api/metrics")).json()
+
+    endpoint = summary["endpoints"]["GET /"]
+    assert endpoint["request_count"] >= 5
+    latency = endpoint["response_time_ms"]
+    assert set(latency) == {"mean", "min", "max", "p50", "p95", "p99", "p999"}
+    assert latency["min"] <= latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["p999"] <= latency["max"]
+
+
+class TestRollingWindows:
+    """Test suite for RequestWindows"""
+
+    def test_sparse_histogram_merges_like_a_full_one(self):
+        values = [random.lognormvariate(2, 1) for _ in range(2000)]
+        full = LatencyHistogram()
+        sparse = SparseLatencyHistogram()
+        for value in values:
+            full.record(value)
+            sparse.record(value)
+
+        assert LatencyHistogram.merged([sparse]).summary() == full.summary()
+        assert len(sparse.counts) < BUCKET_COUNT
+
+    def test_old_traffic_leaves_the_window(self):
+        """A burst shows up in every window, then ages out of 1m, 5m and 1h in turn"""
+        windows = RequestWindows()
+        start = 100000.0
+        for _ in range(50):
+            windows.record(start, 200, 5.0)
+        windows.record(start, 503, 900.0)
+
+        count, errors, histogram = windows.totals("1m", start + 30)
+        assert (count, errors) == (51, {"503": 1})
+        assert histogram.max_ms == 900.0
+        assert windows.totals("1m", start + 61)[0] == 0
+        assert windows.totals("5m", start + 61)[0] == 51
+        assert windows.totals("5m", start + 301)[0] == 0
+        assert windows.totals("1h", start + 301)[0] == 51
+        assert windows.totals("1h", start + 3601)[0] == 0
+
+    def test_latency_regression_is_visible(self):
+        """Percentiles of a window cover only its own requests, however long the history"""
+        windows = RequestWindows()
+        now = 200000.0
+        for second in range(3600):
+            windows.record(now - 3600 + second, 200, 2.0)
+        for _ in range(100):
+            windows.record(now, 200, 400.0)
+
+        assert windows.totals("1m", now)[2].quantiles()["p50"] == pytest.approx(400, rel=0.05)
+        assert windows.totals("1h", now)[2].quantiles()["p50"] == pytest.approx(2, rel=0.05)
+
+    def test_memory_is_fixed(self):
+        windows = RequestWindows()
+        for second in range(0, 4 * 3600, 7):
+            windows.record(float(second), 200, 1.0)
+
+        assert sum(bucket is not None for bucket in windows.seconds._buckets) <= 60
+        assert sum(bucket is not None for bucket in windows.minutes._buckets) <= 60
+        assert windows.totals("1h", float(4 * 3600))[0] <= 3600 // 7 + 1
+
+    def test_window_span(self):
+        assert window_span_seconds("1m", 1000.5) == pytest.approx(59.5)
+        assert window_span_seconds("5m", 630.0) == pytest.approx(270.0)
+        assert window_span_seconds("1h", 3600.0) == pytest.approx(3540.0)
+
+
+@pytest.mark.asyncio
+async def test_metrics_summary_for_a_window():
+    """/api/metrics?window=1m reports the requests of the last minute"""
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for _ in range(3):
+            assert (await ac.get("/")).status_code == 200
+        summary = (await ac.get("/api/metrics?window=1m")).json()
+        invalid = await ac.get("/api/metrics?window=2d")
+
+    assert summary["window"] == "1m"
+    assert 0 < summary["window_seconds"] <= 60
+    endpoint = summary["endpoints"]["GET /"]
+    assert endpoint["request_count"] >= 3
+    assert endpoint["rps"] == pytest.approx(endpoint["request_count"] / summary["window_seconds"])
+    assert endpoint["response_time_ms"]["p50"] <= endpoint["response_time_ms"]["max"]
+    assert summary["total_requests"] >= endpoint["request_count"]
+    assert invalid.status_code == 400
+
+
+class TestTopK:
+    """Test suite for TopK"""
+
+    def test_counts_are_exact_below_capacity(self):
+        top = TopK(3)
+        for key in ["a", "b", "a", "c", "a", "b"]:
+            top.add(key)
+
+        assert top.top() == [
+            {"key": "a", "count": 3, "error": 0},
+            {"key": "b", "count": 2, "error": 0},
+            {"key": "c", "count": 1, "error": 0},
+        ]
+
+    def test_heavy_hitters_survive_a_long_tail(self):
+        """Memory stays at capacity; frequent keys are kept with bounded overcounts"""
+        top = TopK(5)
+        for index in range(10000):
+            top.add("busy" if index % 4 == 0 else f"agent-{index}")
+
+        entries = top.top()
+        assert len(entries) == 5
+        assert entries[0]["key"] == "busy"
+        assert entries[0]["count"] - entries[0]["error"] <= 2500 <= entries[0]["count"]
+        assert top.total == 10000
+
+
+class TestRouteTemplateKeys:
+    """Request metrics are keyed by route template, not by URL"""
+
+    @pytest.mark.asyncio
+    async def test_path_parameters_share_one_key(self, client):
+        before = dict(metrics_collector.request_counts)
+        for agent_id in ["agent-a", "agent-b", "agent-c", "agent-a"]:
+            await client.get(f"/api/deployments/pending/{agent_id}")
+
+        after = metrics_collector.request_counts
+        key = "GET /api/deployments/pending/{agent_id}"
+        assert after[key] - before.get(key, 0) == 4
+        assert not any("agent-a" in endpoint for endpoint in after)
+
+    @pytest.mark.asyncio
+    async def test_unknown_urls_share_one_key(self, client):
+        before = metrics_collector.request_counts.get("GET <unmatched>", 0)
+        for number in range(3):
+            assert (await client.get(f"/no/such/path/{number}")).status_code == 404
+
+        assert metrics_collector.request_counts["GET <unmatched>"] - before == 3
+        assert not any("/no/such/path" in endpoint for endpoint in metrics_collector.request_counts)
+
+    @pytest.mark.asyncio
+    async def test_pending_metrics_list_busiest_agents(self, client, monkeypatch):
+        monkeypatch.setitem(metrics_collector.agent_requests, "GET /api/deployments/pending/{agent_id}", TopK(20))
+        for agent_id in ["agent-a"] * 3 + ["agent-b"]:
+            await client.get(f"/api/deployments/pending/{agent_id}")
+
+        metrics = (await client.get("/api/metrics/pending-deployments?top_agents=1")).json()
+
+        assert metrics["total_requests"] >= 4
+        assert metrics["top_agents"] == [{"agent_id": "agent-a", "requests": 3, "error": 0}]
+
+
+def _instrumented_app(metrics_enabled=True, access_log_enabled=True):
+    """Small app behind RequestInstrumentationMiddleware"""
+    instrumented = FastAPI()
+
+    @instrumented.get("/instrumented/ok/{agent_id}")
+    async def ok(agent_id: str):
+        return {"agent_id": agent_id}
+
+    @instrumented.get("/instrumented/missing")
+    async def missing():
+        raise HTTPException(status_code=404, detail="missing")
+
+    @instrumented.get("/instrumented/crash")
+    async def crash():
+        raise RuntimeError("boom")
+
+    instrumented.add_middleware(
+        RequestInstrumentationMiddleware,
+        metrics_enabled=metrics_enabled,
+        access_log_enabled=access_log_enabled,
+    )
+    return instrumented
+
+
+class TestRequestInstrumentation:
+    """One middleware times each request for the metrics and the access log"""
+
+    @pytest.mark.asyncio
+    async def test_metrics_and_access_log(self, caplog):
+        key = "GET /instrumented/ok/{agent_id}"
+        before = metrics_collector.request_counts.get(key, 0)
+        with caplog.at_level("INFO", logger="master_backend.requests"):
+            async with AsyncClient(app=_instrumented_app(), base_url="http://test") as ac:
+                assert (await ac.get("/instrumented/ok/agent-1")).status_code == 200
+
+        assert metrics_collector.request_counts[key] - before == 1
+        assert metrics_collector.agent_requests[key].top(1)[0]["key"] == "agent-1"
+        lines = [record.getMessage() for record in caplog.records if record.name == "master_backend.requests"]
+        assert len(lines) == 1
+        assert lines[0].startswith("GET /instrumented/ok/agent-1 - Client: 127.0.0.1 - Status: 200 - Time: ")
+
+    @pytest.mark.asyncio
+    async def test_status_codes_are_captured(self):
+        key = "GET /instrumented/missing"
+        before = metrics_collector.error_counts[key].get("404", 0)
+        async with AsyncClient(app=_instrumented_app(), base_url="http://test") as ac:
+            assert (await ac.get("/instrumented/missing")).status_code == 404
+
+        assert metrics_collector.error_counts[key]["404"] - before == 1
+
+    @pytest.mark.asyncio
+    async def test_unhandled_exception_counts_as_500(self, caplog):
+        key = "GET /instrumented/crash"
+        before = metrics_collector.error_counts[key].get("500", 0)
+        with caplog.at_level("INFO", logger="master_backend.requests"):
+            async with AsyncClient(app=_instrumented_app(), base_url="http://test") as ac:
+                with pytest.raises(RuntimeError):
+                    await ac.get("/instrumented/crash")
+
+        assert metrics_collector.error_counts[key]["500"] - before == 1
+        errors = [record for record in caplog.records if record.name == "master_backend.requests"]
+        assert [record.levelname for record in errors] == ["ERROR"]
+        assert "Error: boom" in errors[0].getMessage()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("metrics_enabled,access_log_enabled", [(True, False), (False, True), (False, False)])
+    async def test_metrics_and_log_switch_independently(self, caplog, metrics_enabled, access_log_enabled):
+        key = "GET /instrumented/ok/{agent_id}"
+        before = metrics_collector.request_counts.get(key, 0)
+        with caplog.at_level("INFO", logger="master_backend.requests"):
+            instrumented = _instrumented_app(metrics_enabled, access_log_enabled)
+            async with AsyncClient(app=instrumented, base_url="http://test") as ac:
+                assert (await ac.get("/instrumented/ok/agent-2")).status_code == 200
+
+        logged = [record for record in caplog.records if record.name == "master_backend.requests"]
+        assert metrics_collector.request_counts.get(key, 0) - before == (1 if metrics_enabled else 0)
+        assert len(logged) == (1 if access_log_enabled else 0)
+
+
+def _parse_exposition(text):
+    """{(name, labels): value} of a text exposition, checking every family has HELP and TYPE"""
+    samples = {}
+    typed = set()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            typed.add(line.split()[2])
+            continue
+        if line.startswith("#") or not line:
+            continue
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        family = name
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[:-len(suffix)] in typed:
+                family = name[:-len(suffix)]
+        assert family in typed, line
+        samples[(name, "{" + labels if labels else "")] = float(value)
+    return samples
+
+
+class TestPrometheusExposition:
+    """GET /metrics in the Prometheus text format"""
+
+    @pytest.mark.asyncio
+    async def test_request_counters_and_histograms(self, client):
+        for _ in range(3):
+            await client.get("/api/deployments/pending/agent-a")
+
+        response = await client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        samples = _parse_exposition(response.text)
+        labels = '{method="GET",route="/api/deployments/pending/{agent_id}"'
+        count = samples[("master_http_requests_total", labels + "}")]
+        assert count >= 3
+        assert samples[("master_http_request_duration_seconds_count", labels + "}")] == count
+        buckets = [
+            value for (name, series), value in samples.items()
+            if name == "master_http_request_duration_seconds_bucket" and series.startswith(labels + ",")
+        ]
+        assert buckets == sorted(buckets)
+        assert samples[("master_http_request_duration_seconds_bucket", labels + ',le="+Inf"}')] == count
+
+    @pytest.mark.asyncio
+    async def test_deployment_and_runtime_gauges(self, client):
+        async with TestSessionLocal() as session:
+            session.add(AgentDB(id="agent-1", name="Agent", platform="windows", version="1.0.0", last_seen=datetime.now()))
+            for index, status in enumerate([DeploymentStatusEnum.PENDING] * 2 + [DeploymentStatusEnum.IN_PROGRESS]):
+                session.add(DeploymentDB(
+                    id=f"deploy-{index}", agent_id="agent-1", release_ids=["r"], release_tags=["v1"], status=status,
+                    created_at=datetime.now(),
+                ))
+            await session.commit()
+
+        samples = _parse_exposition((await client.get("/metrics")).text)
+
+        assert samples[("master_deployments", '{status="pending"}')] == 2
+        assert samples[("master_deployments", '{status="in_progress"}')] == 1
+        assert ("master_heartbeats_received_total", "") in samples
+        assert ("master_event_loop_lag_seconds_count", "") in samples
+        assert samples[("master_process_start_time_seconds", "")] <= time.time()
+
+    def test_idle_routes_reuse_rendered_lines(self):
+        """A route without new requests is not rendered again"""
+        histogram = LatencyHistogram()
+        histogram.record(12.0)
+        collected = {
+            "request_counts": {"GET /idle": 1, "GET /busy": 1},
+            "response_times": {"GET /idle": histogram, "GET /busy": LatencyHistogram()},
+            "error_counts": {"GET /busy": {"500": 1}},
+        }
+        exposition = PrometheusExposition()
+        exposition.render(collected, [])
+        idle_lines = exposition._route_cache["GET /idle"]
+        collected["request_counts"]["GET /busy"] = 2
+
+        second = exposition.render(collected, [])
+
+        assert exposition._route_cache["GET /idle"] is idle_lines
+        assert 'master_http_requests_total{method="GET",route="/busy"} 2' in second
+        assert 'master_http_request_errors_total{method="GET",route="/busy",status="500"} 1' in second
+
+    def test_label_values_are_escaped(self):
+        collected = {
+            "request_counts": {'GET /a"b\\c': 1},
+            "response_times": {'GET /a"b\\c': LatencyHistogram()},
+            "error_counts": {},
+        }
+        text = PrometheusExposition().render(collected, [])
+
+        assert 'route="/a\\"b\\\\c"' in text
+
+
+@pytest.mark.asyncio
+async def test_event_loop_lag_is_measured():
+    """A blocking call shows up as lag of the probe"""
+    monitor = EventLoopLagMonitor(interval_seconds=0.01)
+    monitor.start()
+    await asyncio.sleep(0.02)
+    time.sleep(0.1)  # Block the loop
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    assert monitor.histogram.max_ms >= 50
+    assert monitor.get_stats()["samples"] >= 2
@@ -0,0 +1,259 @@
+"""
+Unit tests for the release catalog
+Tests the sync into release_versions, catalog-backed version endpoints and deployment tag resolution
+"""
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, ReleaseDB, ReleaseVersionDB, AgentStatusEnum
+from github_releases import CachedReleases, GitHubAPIError
+from release_catalog import ReleaseCatalogSync
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+class FakeReleaseCache:
+    """Stands in for GitHubReleaseCache; release lists per owner/repo, counting refreshes"""
+
+    def __init__(self):
+        self.repositories = {
+            ("acme", "firmware"): [
+                {
+                    "tag_name": "v1.1.0",
+                    "name": "Firmware 1.1.0",
+                    "published_at": "2024-02-01T00:00:00Z",
+                    "html_url": "https://github.com/acme/firmware/releases/tag/v1.1.0",
+                    "assets": [{
+                        "id": 11,
+                        "name": "firmware-1.1.0.exe",
+                        "size": 1024,
+                        "content_type": "application/octet-stream",
+                        "updated_at": "2024-02-01T00:00:00Z",
+                        "browser_download_url": "https://github.com/acme/firmware/releases/download/v1.1.0/firmware-1.1.0.exe",
+                        "download_count": 42,
+                        "uploader": {"login": "someone"},
+                    }],
+                },
+                {"tag_name": "v1.0.0", "name": "Firmware 1.0.0", "published_at": "2024-01-01T00:00:00Z"},
+            ],
+        }
+        self.refreshes = []
+        self.complete = True  # False to answer like a list cut at GITHUB_RELEASES_MAX_PAGES
+
+    async def refresh_releases(self, owner, repo, token=None, priority=None):
+        self.refreshes.append((owner, repo))
+        if (owner, repo) not in self.repositories:
+            raise GitHubAPIError(404, "GitHub repository not found")
+        releases = self.repositories[(owner, repo)]
+        return CachedReleases(
+            releases=releases,
+            pages=[releases],
+            etags=[None],
+            fetched_at=0,
+            pages_checked_at=0,
+            complete=self.complete,
+        )
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """An agent, a release repository with versions, one without, and one that does not exist"""
+    async with TestSessionLocal() as session:
+        session.add(AgentDB(
+            id="agent-1",
+            name="PC-01",
+            platform="windows",
+            version="1.0.0",
+            status=AgentStatusEnum.ONLINE,
+            last_seen=datetime.now(),
+        ))
+        for release_id, url in [
+            ("firmware", "https://github.com/acme/firmware/releases/"),
+            ("missing", "https://github.com/acme/missing"),
+        ]:
+            session.add(ReleaseDB(
+                id=release_id,
+                tag_name=release_id,
+                name=release_id,
+                version="",
+                release_date=datetime.now(),
+                download_url=url,
+            ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def catalog(test_data, monkeypatch):
+    catalog = ReleaseCatalogSync(
+        interval_seconds=3600,
+        concurrency=2,
+        cache=FakeReleaseCache(),
+        session_factory=TestSessionLocal,
+    )
+    monkeypatch.setattr("routers.releases.release_catalog", catalog)
+    return catalog
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(catalog):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _catalog_rows(release_id):
+    async with TestSessionLocal() as session:
+        result = await session.execute(
+            select(ReleaseVersionDB)
+            .where(ReleaseVersionDB.release_id == release_id)
+            .order_by(ReleaseVersionDB.tag)
+        )
+        return result.scalars().all()
+
+
+class TestReleaseCatalogSync:
+    """Test suite for ReleaseCatalogSync"""
+
+    @pytest.mark.asyncio
+    async def test_sync_stores_slim_versions(self, catalog):
+        """Every repository is synced; failures of one do not stop the others"""
+        stored = await catalog.sync()
+        assert stored == 2
+
+        rows = await _catalog_rows("firmware")
+        assert [row.tag for row in rows] == ["v1.0.0", "v1.1.0"]
+        assert rows[1].published_at == datetime(2024, 2, 1)
+        assert rows[1].assets == [{
+            "id": 11,
+            "name": "firmware-1.1.0.exe",
+            "size": 1024,
+            "content_type": "application/octet-stream",
+            "updated_at": "2024-02-01T00:00:00Z",
+            "browser_download_url": "https://github.com/acme/firmware/releases/download/v1.1.0/firmware-1.1.0.exe",
+        }]
+
+        stats = catalog.get_stats()
+        assert stats["repositories_synced"] == 1
+        assert stats["repository_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_sync_drops_deleted_versions(self, catalog):
+        """Versions GitHub no longer lists are removed"""
+        await catalog.sync()
+        catalog.cache.repositories[("acme", "firmware")].pop()
+        await catalog.sync()
+        assert [row.tag for row in await _catalog_rows("firmware")] == ["v1.1.0"]
+
+    @pytest.mark.asyncio
+    async def test_truncated_list_keeps_older_versions(self, catalog):
+        """Tags missing from a list cut at the page cap are not deleted"""
+        await catalog.sync()
+        catalog.cache.repositories[("acme", "firmware")].pop()
+        catalog.cache.complete = False
+        await catalog.sync()
+
+        assert [row.tag for row in await _catalog_rows("firmware")] == ["v1.0.0", "v1.1.0"]
+        assert catalog.get_stats()["truncated_syncs"] == 1
+
+
+class TestCatalogEndpoints:
+    """Test suite for catalog-backed version endpoints"""
+
+    @pytest.mark.asyncio
+    async def test_versions_are_read_from_catalog(self, client, catalog):
+        """After the first listing, versions come from the database"""
+        for _ in range(2):
+            response = await client.get("/api/releases/firmware/versions")
+            assert response.status_code == 200
+            versions = response.json()
+            assert [version["tag_name"] for version in versions] == ["v1.1.0", "v1.0.0"]
+            assert versions[0]["published_at"] == "2024-02-01T00:00:00Z"
+        assert catalog.cache.refreshes == [("acme", "firmware")]
+
+        await client.get("/api/releases/firmware/versions?refresh=true")
+        assert len(catalog.cache.refreshes) == 2
+
+    @pytest.mark.asyncio
+    async def test_versions_of_missing_repository(self, client):
+        """GitHub errors of the on-demand sync keep their status code"""
+        response = await client.get("/api/releases/missing/versions")
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_single_version(self, client, catalog):
+        """Agents look up one tag; unknown tags trigger one sync and then 404"""
+        await catalog.sync()
+        response = await client.get("/api/releases/firmware/versions/v1.1.0")
+        assert response.status_code == 200
+        assert response.json()["assets"][0]["name"] == "firmware-1.1.0.exe"
+        assert len(catalog.cache.refreshes) == 2  # Both repositories, by the full sync
+
+        response = await client.get("/api/releases/firmware/versions/v9.9.9")
+        assert response.status_code == 404
+        assert len(catalog.cache.refreshes) == 3
+
+    @pytest.mark.asyncio
+    async def test_deployment_defaults_to_newest_version(self, client, catalog):
+        """Without a selected version the newest catalog version is deployed"""
+        await catalog.sync()
+        response = await client.post("/api/deployments", json={
+            "agent_id": "agent-1",
+            "release_ids": ["firmware", "missing"],
+        })
+        assert response.status_code == 200
+        # The uncatalogued release falls back to its tag_name
+        assert response.json()["release_tags"] == ["v1.1.0", "missing"]
+
+    @pytest.mark.asyncio
+    async def test_deployment_rejects_unknown_version(self, client, catalog):
+        """Selected versions of catalogued releases must exist"""
+        await catalog.sync()
+        response = await client.post("/api/deployments", json={
+            "agent_id": "agent-1",
+            "release_ids": ["firmware"],
+            "release_versions": ["v0.1.0"],
+        })
+        assert response.status_code == 400
@@ -0,0 +1,172 @@
+"""
+Unit tests for the fleet version matrix
+Tests that successful deployments maintain agent_installed_releases
+"""
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, ReleaseDB, AgentStatusEnum, AgentInstalledReleaseDB
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """Create a Windows PC, a Mac and two releases"""
+    async with TestSessionLocal() as session:
+        for agent_id, name, platform in [("agent-1", "PC-01", "windows"), ("agent-2", "MAC-01", "macos")]:
+            session.add(AgentDB(
+                id=agent_id,
+                name=name,
+                platform=platform,
+                version="1.0.0",
+                status=AgentStatusEnum.ONLINE,
+                last_seen=datetime.now(),
+            ))
+        for release_id in ["firmware", "tools"]:
+            session.add(ReleaseDB(
+                id=release_id,
+                tag_name=release_id,
+                name=release_id,
+                version="",
+                release_date=datetime.now(),
+                download_url=f"https://github.com/test/{release_id}/releases/",
+            ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(setup_database, test_data):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _deploy(client, agent_id, release_ids, tags, status="success"):
+    """Create a deployment, let the agent claim it and report the result"""
+    response = await client.post("/api/deployments/rollouts", json={
+        "target": {"agent_ids": [agent_id]},
+        "release_ids": release_ids,
+        "release_versions": tags,
+    })
+    deployment_id = response.json()["deployments"][0]["deployment_id"]
+    await client.get(f"/api/deployments/pending/{agent_id}")
+    response = await client.post(f"/api/deployments/{deployment_id}/complete", json={"status": status})
+    assert response.status_code == 200
+
+
+
+async def _versions(client, agent_id):
+    """Installed versions of one agent in the release matrix"""
+    response = await client.get("/api/agents/release-matrix")
+    rows = {row["agent_id"]: row for row in response.json()["agents"]}
+    return rows[agent_id]["versions"]
+
+
+class TestReleaseMatrix:
+    """Test suite for GET /api/agents/release-matrix"""
+
+    @pytest.mark.asyncio
+    async def test_matrix_tracks_latest_successful_install(self, client):
+        """Successful deployments update the matrix, failed ones do not"""
+        await _deploy(client, "agent-1", ["firmware", "tools"], ["v1.0.0", "t1"])
+        await _deploy(client, "agent-1", ["firmware"], ["v1.1.0"])
+        await _deploy(client, "agent-1", ["firmware"], ["v2.0.0-broken"], status="failed")
+        await _deploy(client, "agent-2", ["firmware"], ["v1.0.0"])
+
+        response = await client.get("/api/agents/release-matrix")
+        assert response.status_code == 200
+        matrix = response.json()
+        assert matrix["release_ids"] == ["firmware", "tools"]
+
+        rows = {row["agent_id"]: row for row in matrix["agents"]}
+        assert rows["agent-1"]["versions"] == {"firmware": "v1.1.0", "tools": "t1"}
+        assert rows["agent-2"]["versions"] == {"firmware": "v1.0.0"}
+        assert rows["agent-2"]["agent_name"] == "MAC-01"
+
+        async with TestSessionLocal() as session:
+            result = await session.execute(select(AgentInstalledReleaseDB))
+            assert len(result.scalars().all()) == 3
+
+    @pytest.mark.asyncio
+    async def test_out_of_order_completion(self, client):
+        """A late report of an older deployment does not replace a newer install"""
+        deployment_ids = []
+        for tags in [["v1.0.0", "t1"], ["v1.1.0", "t2"]]:
+            response = await client.post("/api/deployments/rollouts", json={
+                "target": {"agent_ids": ["agent-1"]},
+                "release_ids": ["firmware", "tools"],
+                "release_versions": tags,
+            })
+            deployment_ids.append(response.json()["deployments"][0]["deployment_id"])
+
+        for deployment_id in reversed(deployment_ids):
+            response = await client.post(f"/api/deployments/{deployment_id}/complete", json={"status": "success"})
+            assert response.status_code == 200
+
+        assert await _versions(client, "agent-1") == {"firmware": "v1.1.0", "tools": "t2"}
+
+        # A newer deployment still replaces it
+        await _deploy(client, "agent-1", ["firmware"], ["v1.2.0"])
+        assert await _versions(client, "agent-1") == {"firmware": "v1.2.0", "tools": "t2"}
+
+    @pytest.mark.asyncio
+    async def test_matrix_filters(self, client):
+        """The matrix can be narrowed to one release and one platform"""
+        await _deploy(client, "agent-1", ["firmware", "tools"], ["v1.0.0", "t1"])
+        await _deploy(client, "agent-2", ["firmware"], ["v1.0.0"])
+
+        response = await client.get("/api/agents/release-matrix?release_id=tools&platform=windows")
+        matrix = response.json()
+        assert matrix["release_ids"] == ["tools"]
+        assert [row["agent_id"] for row in matrix["agents"]] == ["agent-1"]
+        assert matrix["agents"][0]["versions"] == {"tools": "t1"}
+
+    @pytest.mark.asyncio
+    async def test_agents_without_installs_are_listed(self, client):
+        """Every agent has a row, even with nothing installed"""
+        response = await client.get("/api/agents/release-matrix")
+        assert [row["versions"] for row in response.json()["agents"]] == [{}, {}]
@@ -0,0 +1,171 @@
+"""
+Unit tests for fleet rollouts
+Tests target selection, release validation and bulk deployment creation
+"""
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime, timedelta
+
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, ReleaseDB, AgentStatusEnum
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """Create a small fleet (two online Windows PCs, one stale Windows PC, one Mac) and a release"""
+    fleet = [
+        ("agent-1", "PC-01", "windows", datetime.now()),
+        ("agent-2", "PC-02", "windows", datetime.now()),
+        ("agent-3", "PC-03", "windows", datetime.now() - timedelta(minutes=10)),
+        ("agent-4", "MAC-01", "macos", datetime.now()),
+    ]
+    async with TestSessionLocal() as session:
+        for agent_id, name, platform, last_seen in fleet:
+            session.add(AgentDB(
+                id=agent_id,
+                name=name,
+                platform=platform,
+                version="1.0.0",
+                status=AgentStatusEnum.ONLINE,
+                last_seen=last_seen,
+            ))
+        session.add(ReleaseDB(
+            id="release-1",
+            tag_name="v1.0.0",
+            name="Release 1.0.0",
+            version="1.0.0",
+            release_date=datetime.now(),
+            download_url="https://github.com/test/repo/releases/",
+        ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(setup_database, test_data):
+    """Create test client with overridden database dependency"""
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+class TestRollout:
+    """Test suite for POST /api/deployments/rollouts"""
+
+    @pytest.mark.asyncio
+    async def test_rollout_to_online_platform(self, client):
+        """Selector criteria are combined and one deployment is created per matching agent"""
+        response = await client.post("/api/deployments/rollouts", json={
+            "target": {"platform": "windows", "online_only": True},
+            "release_ids": ["release-1"],
+        })
+        assert response.status_code == 200
+        rollout = response.json()
+        assert rollout["release_tags"] == ["v1.0.0"]
+        assert [item["agent_id"] for item in rollout["deployments"]] == ["agent-1", "agent-2"]
+        assert rollout["missing_agent_ids"] == []
+
+        response = await client.get(f"/api/deployments?rollout_id={rollout['rollout_id']}")
+        deployments = response.json()
+        assert {deployment["id"] for deployment in deployments} == {
+            item["deployment_id"] for item in rollout["deployments"]
+        }
+        assert all(deployment["status"] == "pending" for deployment in deployments)
+        assert all(deployment["rollout_id"] == rollout["rollout_id"] for deployment in deployments)
+
+        # Each agent picks up its own deployment
+        response = await client.get("/api/deployments/pending/agent-2")
+        assert response.json()["rollout_id"] == rollout["rollout_id"]
+
+    @pytest.mark.asyncio
+    async def test_rollout_to_explicit_agents_reports_missing(self, client):
+        """Unknown agents in an explicit list are reported, the rest are deployed"""
+        response = await client.post("/api/deployments/rollouts", json={
+            "target": {"agent_ids": ["agent-4", "agent-missing"]},
+            "release_ids": ["release-1"],
+            "release_versions": ["v0.9.0"],
+        })
+        assert response.status_code == 200
+        rollout = response.json()
+        assert [item["agent_name"] for item in rollout["deployments"]] == ["MAC-01"]
+        assert rollout["missing_agent_ids"] == ["agent-missing"]
+        assert rollout["release_tags"] == ["v0.9.0"]
+
+    @pytest.mark.asyncio
+    async def test_repeated_rollouts_get_distinct_ids(self, client):
+        """Two rollouts in the same second do not collide"""
+        body = {"target": {"agent_ids": ["agent-1"]}, "release_ids": ["release-1"]}
+        first = (await client.post("/api/deployments/rollouts", json=body)).json()
+        second = (await client.post("/api/deployments/rollouts", json=body)).json()
+        assert first["rollout_id"] != second["rollout_id"]
+        assert first["deployments"][0]["deployment_id"] != second["deployments"][0]["deployment_id"]
+
+    @pytest.mark.asyncio
+    async def test_rollout_unknown_release(self, client):
+        """Releases are validated before anything is inserted"""
+        response = await client.post("/api/deployments/rollouts", json={
+            "target": {"platform": "windows"},
+            "release_ids": ["release-1", "release-missing"],
+        })
+        assert response.status_code == 404
+
+        response = await client.get("/api/deployments")
+        assert response.json() == []
+
+    @pytest.mark.asyncio
+    async def test_rollout_requires_selector(self, client):
+        """An empty target is rejected instead of deploying to the whole fleet"""
+        response = await client.post("/api/deployments/rollouts", json={
+            "target": {},
+            "release_ids": ["release-1"],
+        })
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_rollout_without_matching_agents(self, client):
+        """A selector matching no agents returns 404"""
+        response = await client.post("/api/deployments/rollouts", json={
+            "target": {"platform": "linux"},
+            "release_ids": ["release-1"],
+        })
+        assert response.status_code == 404
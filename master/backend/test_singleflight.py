@@ -0,0 +1,252 @@
+"""
+Unit tests for single-flight request coalescing
+Tests sharing of results and errors, cancellation of the leader and coalesced dashboard reads
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from datetime import datetime
+
+import routers.agents
+import routers.releases
+from main import app
+from database import Base, get_db
+from db_models import AgentDB, ReleaseDB, AgentStatusEnum
+from singleflight import SingleFlight
+
+
+# Create in-memory SQLite database for testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+test_engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+
+TestSessionLocal = async_sessionmaker(
+    test_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def override_get_db():
+    """Override database dependency for testing"""
+    async with TestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def setup_database():
+    """Setup test database with tables"""
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with test_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def test_data(setup_database):
+    """Create one agent and one release"""
+    async with TestSessionLocal() as session:
+        session.add(AgentDB(
+            id="agent-1",
+            name="TestAgent1",
+            platform="windows",
+            version="1.0.0",
+            status=AgentStatusEnum.ONLINE,
+            last_seen=datetime.now(),
+        ))
+        session.add(ReleaseDB(
+            id="release-1",
+            tag_name="v1.0.0",
+            name="Release 1.0.0",
+            version="1.0.0",
+            release_date=datetime.now(),
+            download_url="https://github.com/test/repo/releases/",
+        ))
+        await session.commit()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(test_data, monkeypatch):
+    """Test client with a fresh single-flight group"""
+    group = SingleFlight()
+    monkeypatch.setattr("routers.agents.single_flight", group)
+    monkeypatch.setattr("routers.releases.single_flight", group)
+    app.dependency_overrides[get_db] = override_get_db
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac, group
+    app.dependency_overrides.clear()
+
+
+class SlowCall:
+    """Counts executions and holds each one until released"""
+
+    def __init__(self, result="value"):
+        self.result = result
+        self.executions = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.executions += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class TestSingleFlight:
+    """Test suite for SingleFlight"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_execution(self):
+        """Callers arriving while a call runs get its result"""
+        group = SingleFlight()
+        call = SlowCall()
+        callers = [asyncio.create_task(group.do("read", "key", call)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        call.release.set()
+
+        assert await asyncio.gather(*callers) == ["value"] * 5
+        assert call.executions == 1
+        assert group.get_stats() == {
+            "in_flight": 0,
+            "calls": {"read": {"calls": 5, "executions": 1, "coalesced": 4}},
+        }
+
+    @pytest.mark.asyncio
+    async def test_different_keys_do_not_share(self):
+        group = SingleFlight()
+        call = SlowCall()
+        call.release.set()
+
+        await asyncio.gather(group.do("read", "a", call), group.do("read", "b", call))
+
+        assert call.executions == 2
+
+    @pytest.mark.asyncio
+    async def test_results_are_not_cached(self):
+        """A call that has finished runs again for the next caller"""
+        group = SingleFlight()
+        call = SlowCall()
+        call.release.set()
+
+        await group.do("read", "key", call)
+        await group.do("read", "key", call)
+
+        assert call.executions == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_are_shared(self):
+        group = SingleFlight()
+        call = SlowCall(result=ValueError("boom"))
+        callers = [asyncio.create_task(group.do("read", "key", call)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        call.release.set()
+
+        results = await asyncio.gather(*callers, return_exceptions=True)
+
+        assert [str(result) for result in results] == ["boom"] * 3
+        assert call.executions == 1
+
+    @pytest.mark.asyncio
+    async def test_followers_rerun_when_leader_is_cancelled(self):
+        """The call is cancelled with its leader; a follower runs it again instead of failing"""
+        group = SingleFlight()
+        call = SlowCall()
+        leader = asyncio.create_task(group.do("read", "key", call))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(group.do("read", "key", call))
+        await asyncio.sleep(0.01)
+
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        call.release.set()
+
+        assert await follower == "value"
+        assert call.executions == 2
+        assert group.get_stats()["calls"]["read"]["coalesced"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_follower_does_not_cancel_the_call(self):
+        group = SingleFlight()
+        call = SlowCall()
+        leader = asyncio.create_task(group.do("read", "key", call))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(group.do("read", "key", call))
+        await asyncio.sleep(0.01)
+
+        follower.cancel()
+        await asyncio.gather(follower, return_exceptions=True)
+        call.release.set()
+
+        assert await leader == "value"
+
+
+class TestCoalescedEndpoints:
+    """Dashboard and agent reads through the single-flight group"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_release_reads_share_one_query(self, client, monkeypatch):
+        ac, group = client
+        load_release = routers.releases._load_release
+        gate = asyncio.Event()
+        loads = []
+
+        async def slow_load_release(db, release_id):
+            loads.append(release_id)
+            await gate.wait()
+            return await load_release(db, release_id)
+
+        monkeypatch.setattr("routers.releases._load_release", slow_load_release)
+        requests = [asyncio.create_task(ac.get("/api/releases/release-1")) for _ in range(4)]
+        await asyncio.sleep(0.1)
+        gate.set()
+        responses = await asyncio.gather(*requests)
+
+        assert [response.status_code for response in responses] == [200] * 4
+        assert {response.json()["tag_name"] for response in responses} == {"v1.0.0"}
+        assert loads == ["release-1"]
+        assert group.get_stats()["calls"]["get_release"] == {"calls": 4, "executions": 1, "coalesced": 3}
+
+    @pytest.mark.asyncio
+    async def test_missing_release_is_404_for_every_caller(self, client):
+        ac, group = client
+        responses = await asyncio.gather(*(ac.get("/api/releases/missing") for _ in range(3)))
+
+        assert [response.status_code for response in responses] == [404] * 3
+
+    @pytest.mark.asyncio
+    async def test_write_starts_a_new_flight(self, client, monkeypatch):
+        """A read after a write never joins a read that started before it"""
+        ac, group = client
+        list_agents = routers.agents._list_agents
+        gate = asyncio.Event()
+
+        async def slow_list_agents(db):
+            await gate.wait()
+            return await list_agents(db)
+
+        monkeypatch.setattr("routers.agents._list_agents", slow_list_agents)
+        before = asyncio.create_task(ac.get("/api/agents"))
+        await asyncio.sleep(0.1)
+        response = await ac.put("/api/agents/agent-1", json={"name": "Renamed"})
+        assert response.status_code == 200
+        after = asyncio.create_task(ac.get("/api/agents"))
+        await asyncio.sleep(0.1)
+        gate.set()
+        await before
+
+        assert (await after).json()[0]["name"] == "Renamed"
+        assert group.get_stats()["calls"]["get_agents"] == {"calls": 2, "executions": 2, "coalesced": 0}
@@ -0,0 +1,41 @@
+"""
+Top-K counters
+Bounded heavy-hitter counting (Space-Saving) for per-agent metric drill-down
+"""
+
+from typing import Dict, List, Optional
+
+
+class TopK:
+    """
+    Approximate counts of the most frequent keys in at most `capacity` entries (Space-Saving).
+    - A key that is not tracked replaces the least counted one and inherits its count;
+      that inherited part is reported as `error`, so count - error <= true count <= count
+    - Every key whose true count is above total / capacity is guaranteed to be tracked
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.total = 0
+        self._entries: Dict[str, List[int]] = {}  # key -> [count, error]
+
+    def add(self, key: str, amount: int = 1):
+        self.total += amount
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[0] += amount
+            return
+        if len(self._entries) < self.capacity:
+            self._entries[key] = [amount, 0]
+            return
+        victim = min(self._entries, key=lambda candidate: self._entries[candidate][0])
+        floor = self._entries.pop(victim)[0]
+        self._entries[key] = [floor + amount, floor]
+
+    def top(self, limit: Optional[int] = None) -> List[Dict]:
+        """Tracked keys, most counted first"""
+        ranked = sorted(self._entries.items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            {"key": key, "count": count, "error": error}
+            for key, (count, error) in ranked[:limit]
+        ]
@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo } from 'react'
+import { useState, useEffect, useMemo, useRef } from 'react'
 import {
   useReactTable,
   getCoreRowModel,
@@ -50,6 +50,8 @@ function App() {
   const [releases, setReleases] = useState([])
   const [agents, setAgents] = useState([])
   const [deployments, setDeployments] = useState([])
+  const [deploymentsCursor, setDeploymentsCursor] = useState(null) // X-Next-Cursor of the oldest loaded page
+  const olderDeploymentsLoaded = useRef(false) // ref: read by the 5s refresh interval
   const [releaseModalOpen, setReleaseModalOpen] = useState(false)
   const [deploymentModalOpen, setDeploymentModalOpen] = useState(false)
   const [selectedReleases, setSelectedReleases] = useState([])
@@ -227,12 +229,39 @@ function App() {
   async function loadDeployments() {
     try {
       const response = await axios.get(`${API_BASE}/deployments/history`)
-      setDeployments(response.data)
+      const firstPage = response.data
+      const oldest = firstPage[firstPage.length - 1]
+      // Refresh the first page but keep older pages loaded with "Load more"
+      setDeployments((previous) => [
+        ...firstPage,
+        ...(oldest
+          ? previous.filter(
+              (d) => d.created_at < oldest.created_at || (d.created_at === oldest.created_at && d.id < oldest.id)
+            )
+          : []),
+      ])
+      if (!olderDeploymentsLoaded.current) {
+        setDeploymentsCursor(response.headers['x-next-cursor'] || null)
+      }
     } catch (error) {
       console.error('Failed to load deployments:', error)
     }
   }
 
+  async function loadMoreDeployments() {
+    if (!deploymentsCursor) return
+    try {
+      const response = await axios.get(`${API_BASE}/deployments/history`, {
+        params: { cursor: deploymentsCursor },
+      })
+      setDeployments((previous) => [...previous, ...response.data])
+      setDeploymentsCursor(response.headers['x-next-cursor'] || null)
+      olderDeploymentsLoaded.current = true
+    } catch (error) {
+      console.error('Failed to load more deployments:', error)
+    }
+  }
+
   async function createRelease(e) {
     e.preventDefault()
     try {
@@ -1241,6 +1270,13 @@ function App() {
                       </TableBody>
                       </Table>
                     )}
+                    {deploymentsCursor && (
+                      <div className="flex justify-center pt-4">
+                        <Button variant="outline" onClick={loadMoreDeployments}>
+                          Load more
+                        </Button>
+                      </div>
+                    )}
                   </CardContent>
                 </Card>
               )}